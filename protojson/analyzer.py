@@ -0,0 +1,233 @@
+"""
+Measures how much of a PbLite encoding is filler.
+
+A PbLite list for a message has an index for every tag number from 0 up
+to the highest tag, so index 0 and every unused tag number hold filler.
+For each message type, L{analyze} reports:
+
+	- C{length}: the length of the PbLite list;
+	- C{fillerSlots}: how many of those indices are not fields;
+	- C{wastedBytes}: how many bytes of JSON text those indices take up
+	  in every encoded message of that type;
+	- C{renumbering}: the tag changes that would make the list dense.
+
+If it is given a sample of real messages, it also reports how often each
+type actually occurs in them, and how much filler (including, with
+C{omitUnset}, unset fields) their encodings actually contain.
+
+Note that renumbering tags changes the protobuf wire format and the
+PbLite format, so every client and server must be updated at once.
+
+Run it on a C{_pb2} module with::
+
+	python -m protojson.analyzer protojson.alltypes_pb2
+"""
+
+import sys
+
+try:
+	from json import dumps
+except ImportError:
+	# Python 2.4 and 2.5
+	from simplejson import dumps
+
+from google.protobuf.descriptor import Descriptor
+
+from protojson.pbliteserializer import KIND_MESSAGE, PbLiteSerializer, _getPlan
+
+_postImportVars = vars().keys()
+
+
+class TypeReport(object):
+	"""
+	The filler statistics for one message type.  The C{sample*}
+	attributes are totals over all sample messages, and are C{None} if
+	there were no samples.
+	"""
+	__slots__ = (
+		'fullName', 'length', 'fieldCount', 'fillerSlots', 'wastedBytes',
+		'renumbering', 'sampleInstances', 'sampleFillerSlots',
+		'sampleWastedBytes')
+
+	def __init__(self, plan, fillerBytes):
+		self.fullName = plan.descriptor.full_name
+		self.length = plan.length
+		self.fieldCount = len(plan.fields)
+		self.fillerSlots = plan.length - len(plan.fields)
+		self.wastedBytes = self.fillerSlots * fillerBytes
+		self.renumbering = suggestRenumbering(plan)
+		self.sampleInstances = None
+		self.sampleFillerSlots = None
+		self.sampleWastedBytes = None
+
+
+	def __repr__(self):
+		return '<%s %s length=%d fillerSlots=%d wastedBytes=%d>' % (
+			self.__class__.__name__, self.fullName, self.length,
+			self.fillerSlots, self.wastedBytes)
+
+
+
+def suggestRenumbering(plan):
+	"""
+	Returns a C{list} of C{(fieldName, oldTag, newTag)} that would give
+	the message type of L{_MessagePlan} C{plan} tags 1 through n, keeping
+	the fields in the same order.  Fields whose tags wouldn't change are
+	left out.
+	"""
+	renumbering = []
+	for newTag, fieldPlan in enumerate(plan.fields):
+		newTag += 1
+		if fieldPlan[0] != newTag:
+			renumbering.append((fieldPlan[1], fieldPlan[0], newTag))
+	return renumbering
+
+
+def _getPlans(descriptors):
+	"""
+	Returns the L{_MessagePlan}s for C{descriptors} and every message
+	type reachable from them, in the order they were found.
+	"""
+	plans = []
+	seen = set()
+	stack = [_getPlan(descriptor) for descriptor in reversed(descriptors)]
+	while stack:
+		plan = stack.pop()
+		if plan in seen:
+			continue
+		seen.add(plan)
+		plans.append(plan)
+		for fieldPlan in reversed(plan.fields):
+			if fieldPlan[2] == KIND_MESSAGE:
+				stack.append(fieldPlan[5])
+	return plans
+
+
+def _getModuleDescriptors(module):
+	"""
+	Returns the Descriptors of the top-level message classes in C{_pb2}
+	module C{module}, sorted by name.
+	"""
+	descriptors = []
+	for name in sorted(vars(module)):
+		descriptor = getattr(getattr(module, name), 'DESCRIPTOR', None)
+		if isinstance(descriptor, Descriptor) and descriptor.containing_type is None:
+			descriptors.append(descriptor)
+	return descriptors
+
+
+def _countSampleFiller(plan, data, serializer, reports):
+	fillerValue = serializer.fillerValue
+	omitUnset = serializer.omitUnset
+	stack = [(plan, data)]
+	pop = stack.pop
+	push = stack.append
+	while stack:
+		plan, data = pop()
+		report = reports[plan]
+		report.sampleInstances += 1
+		length = len(data)
+		filler = length
+		for tag, name, kind, repeated, enumValues, childPlan, field in plan.fields:
+			if tag >= length:
+				break
+			value = data[tag]
+			if omitUnset and value is fillerValue:
+				# An unset field
+				continue
+			filler -= 1
+			if kind != KIND_MESSAGE:
+				continue
+			if repeated:
+				for child in value:
+					push((childPlan, child))
+			else:
+				push((childPlan, value))
+		report.sampleFillerSlots += filler
+
+
+def analyze(types, samples=None, serializer=None):
+	"""
+	Returns a C{list} of L{TypeReport}s, one for each message type in
+	C{types} and each message type reachable from them.
+
+	C{types} is a L{google.protobuf.descriptor.Descriptor}, a C{list} of
+	them, or a C{_pb2} module (meaning all of its message types).
+
+	C{samples} is an optional iterable of Messages of those types.  They
+	are serialized with C{serializer} (a default L{PbLiteSerializer} if
+	C{None}), and every index that isn't a field is counted, as is every
+	field left unset by C{omitUnset}.
+	"""
+	if serializer is None:
+		serializer = PbLiteSerializer()
+	if isinstance(types, Descriptor):
+		descriptors = [types]
+	elif hasattr(types, '__file__'):
+		descriptors = _getModuleDescriptors(types)
+	else:
+		descriptors = list(types)
+	fillerBytes = len(dumps(serializer.fillerValue)) + len(',')
+	plans = _getPlans(descriptors)
+	reports = {}
+	for plan in plans:
+		reports[plan] = TypeReport(plan, fillerBytes)
+	if samples is not None:
+		for report in reports.itervalues():
+			report.sampleInstances = 0
+			report.sampleFillerSlots = 0
+		for message in samples:
+			plan = _getPlan(message.DESCRIPTOR)
+			if plan not in reports:
+				raise ValueError("Sample %r is not one of the analyzed "
+					"types" % (message,))
+			_countSampleFiller(
+				plan, serializer.serialize(message), serializer, reports)
+		for report in reports.itervalues():
+			report.sampleWastedBytes = report.sampleFillerSlots * fillerBytes
+	return [reports[plan] for plan in plans]
+
+
+def formatReports(reports, worst=5):
+	"""
+	Returns a C{str} table of L{TypeReport}s C{reports}, worst first,
+	with suggested renumberings for the C{worst} worst.
+	"""
+	if reports and reports[0].sampleWastedBytes is not None:
+		key = lambda report: report.sampleWastedBytes
+	else:
+		key = lambda report: report.wastedBytes
+	reports = sorted(reports, key=key, reverse=True)
+	lines = ['%-40s %7s %7s %7s %13s %13s' % (
+		'message type', 'length', 'fields', 'filler', 'wasted bytes',
+		'sample waste')]
+	for report in reports:
+		if report.sampleWastedBytes is None:
+			sampleWaste = '-'
+		else:
+			sampleWaste = str(report.sampleWastedBytes)
+		lines.append('%-40s %7d %7d %7d %13d %13s' % (
+			report.fullName, report.length, report.fieldCount,
+			report.fillerSlots, report.wastedBytes, sampleWaste))
+	for report in reports[:worst]:
+		if not report.renumbering or not key(report):
+			continue
+		lines.append('')
+		lines.append('Suggested renumbering for %s:' % (report.fullName,))
+		for name, oldTag, newTag in report.renumbering:
+			lines.append('\t%s = %d -> %d' % (name, oldTag, newTag))
+	return '\n'.join(lines)
+
+
+def main(argv):
+	if len(argv) != 1:
+		print >>sys.stderr, "Usage: %s MODULE_pb2" % (sys.argv[0],)
+		return 2
+	moduleName = argv[0]
+	__import__(moduleName)
+	print formatReports(analyze(sys.modules[moduleName]))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
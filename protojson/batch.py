@@ -0,0 +1,127 @@
+"""
+Serializes and deserializes batches of messages of one type across the
+processes of a C{multiprocessing.Pool}.
+
+Messages are shipped between processes as binary protobuf, which is
+much smaller and faster to pickle than Message objects; PbLite lists are
+shipped as-is.  The batch is split into chunks, one task per chunk, and
+the results are returned in the original order.
+
+Use this through the C{pool} argument of
+L{protojson.pbliteserializer.PbLiteSerializer.serializeMany} and
+L{protojson.pbliteserializer.PbLiteSerializer.deserializeMany}.
+
+The serializer is pickled into the worker processes, so anything it
+updates there is lost.  A serializer with C{metrics} is therefore
+rejected with C{ValueError}, and the workers get a copy without the
+C{cache} (whose entries would stay in the workers, and which is costly
+to pickle).
+"""
+
+import copy
+import sys
+
+_postImportVars = vars().keys()
+
+
+def _getClassPath(messageClass):
+	"""
+	Returns C{(moduleName, attributePath)} for a generated message class,
+	which (unlike the class itself, when it is nested) can be pickled.
+	"""
+	descriptor = messageClass.DESCRIPTOR
+	fullName = descriptor.full_name
+	package = getattr(getattr(descriptor, 'file', None), 'package', '')
+	if package and fullName.startswith(package + '.'):
+		fullName = fullName[len(package) + 1:]
+	return (messageClass.__module__, fullName)
+
+
+def _getClass(classPath):
+	moduleName, attributePath = classPath
+	__import__(moduleName)
+	obj = sys.modules[moduleName]
+	for name in attributePath.split('.'):
+		obj = getattr(obj, name)
+	return obj
+
+
+def _getWorkerSerializer(serializer):
+	"""
+	Returns the serializer to ship to the worker processes in place of
+	C{serializer}, or raises C{ValueError} if C{serializer} can't be
+	used in them.
+	"""
+	if serializer.metrics is not None:
+		raise ValueError("A serializer with metrics can't be used with a "
+			"pool, because the workers' metrics would be lost")
+	if serializer.cache is not None:
+		serializer = copy.copy(serializer)
+		serializer.cache = None
+	return serializer
+
+
+def _chunks(items, chunkSize):
+	chunk = []
+	for item in items:
+		chunk.append(item)
+		if len(chunk) >= chunkSize:
+			yield chunk
+			chunk = []
+	if chunk:
+		yield chunk
+
+
+def _serializeChunk(args):
+	serializer, classPath, encodedMessages = args
+	messageClass = _getClass(classPath)
+	messages = []
+	for encoded in encodedMessages:
+		message = messageClass()
+		message.MergeFromString(encoded)
+		messages.append(message)
+	return serializer.serializeMany(messages)
+
+
+def _deserializeChunk(args):
+	serializer, classPath, lists = args
+	messages = serializer.deserializeMany(_getClass(classPath), lists)
+	return [message.SerializePartialToString() for message in messages]
+
+
+def serializeMany(serializer, messages, pool, chunkSize):
+	"""
+	Returns a C{list} of PbLite lists, one for each message in
+	C{messages}, serialized by C{serializer} in the processes of
+	C{pool}.  All of the messages must be of the same type.
+	"""
+	serializer = _getWorkerSerializer(serializer)
+	messages = list(messages)
+	if not messages:
+		return []
+	classPath = _getClassPath(messages[0].__class__)
+	tasks = ((serializer, classPath,
+		[message.SerializePartialToString() for message in chunk])
+		for chunk in _chunks(messages, chunkSize))
+	serialized = []
+	for result in pool.imap(_serializeChunk, tasks):
+		serialized.extend(result)
+	return serialized
+
+
+def deserializeMany(serializer, messageClass, lists, pool, chunkSize):
+	"""
+	Returns a C{list} of C{messageClass} instances, one for each PbLite
+	list in C{lists}, deserialized by C{serializer} in the processes of
+	C{pool}.  If any list is invalid, raises L{PbDecodeError}.
+	"""
+	serializer = _getWorkerSerializer(serializer)
+	classPath = _getClassPath(messageClass)
+	tasks = ((serializer, classPath, chunk) for chunk in _chunks(lists, chunkSize))
+	messages = []
+	for result in pool.imap(_deserializeChunk, tasks):
+		for encoded in result:
+			message = messageClass()
+			message.MergeFromString(encoded)
+			messages.append(message)
+	return messages
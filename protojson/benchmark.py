@@ -0,0 +1,354 @@
+"""
+Benchmarks for L{protojson.pbliteserializer}.
+
+Times serialize, deserialize, and round-trip (both) for several message
+shapes, with the generic serializer, the specialized
+(C{specialize=True}) serializer unless the shape needs C{omitUnset}
+(which specialized code doesn't support), and for some shapes also a
+serializer with a L{protojson.memo.SubMessageCache} (C{cached}):
+
+	- C{wide}: a L{TestAllTypes} with every singular field populated;
+	- C{deep}: a L{Nested} nested C{DEEP_DEPTH} levels deep (with
+	  C{omitUnset=True}, the only way to serialize a recursive type, so
+	  there is no specialized case), whose nested levels are cached by
+	  C{value};
+	- C{repeatedScalars}: a L{TestAllTypes} with large repeated numeric
+	  fields;
+	- C{repeatedMessages}: a L{TestAllTypes} with many repeated
+	  NestedMessages and RepeatedGroups;
+	- C{sparse}: a L{Sparse}, whose tags go up to 2000.
+
+For each benchmark, reports operations per second, the number of
+GC-tracked objects one operation leaves allocated (mostly its output),
+and the peak memory one operation allocates.  The peak memory needs the
+C{tracemalloc} module (Python 3.4 and later); without it, such as on
+Python 2, it is not measured and is reported as C{None} (C{-} in the
+table).
+
+Run it from the top of the source tree, like run_tests.py::
+
+	python protojson/benchmark.py [--quick] [--save FILE] [--compare FILE]
+
+C{--save} writes the results to a JSON file, and C{--compare} reports
+each benchmark's speed relative to such a file, exiting with status 1 if
+any benchmark is more than C{--tolerance} slower.
+"""
+
+import gc
+import os
+import sys
+import time
+import optparse
+
+try:
+	import json
+except ImportError:
+	# Python 2.4 and 2.5
+	import simplejson as json
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+
+_postImportVars = vars().keys()
+
+
+DEEP_DEPTH = 64
+REPEATED_LENGTH = 10000
+REPEATED_MESSAGES = 2000
+
+
+def _getWide():
+	from protojson.alltypes_pb2 import TestAllTypes
+	message = TestAllTypes()
+	message.optional_int32 = -1
+	message.optional_int64 = -2**40
+	message.optional_uint32 = 2**31
+	message.optional_uint64 = 2**63
+	message.optional_sint32 = -3
+	message.optional_sint64 = -4
+	message.optional_fixed32 = 5
+	message.optional_fixed64 = 6
+	message.optional_sfixed32 = -7
+	message.optional_sfixed64 = -8
+	message.optional_float = 0.25
+	message.optional_double = 1e100
+	message.optional_bool = True
+	message.optional_string = u'wide'
+	message.optional_bytes = 'bytes'
+	message.optionalgroup.a = 9
+	message.optional_nested_message.b = 10
+	message.optional_nested_enum = 2
+	message.repeated_string.extend([u'a', u'b', u'c'])
+	message.repeated_nested_enum.extend([1, 2, 3])
+	return message
+
+
+def _getDeep():
+	from protojson.benchmark_pb2 import Nested
+	message = Nested()
+	level = message
+	for n in xrange(DEEP_DEPTH):
+		level.value = n
+		level.name = u'level'
+		level = level.child
+	return message
+
+
+def _getRepeatedScalars():
+	from protojson.alltypes_pb2 import TestAllTypes
+	message = TestAllTypes()
+	message.repeated_int32.extend(xrange(REPEATED_LENGTH))
+	message.repeated_double.extend(n * 0.5 for n in xrange(REPEATED_LENGTH))
+	message.repeated_bool.extend(n % 2 == 0 for n in xrange(REPEATED_LENGTH))
+	return message
+
+
+def _getRepeatedMessages():
+	from protojson.alltypes_pb2 import TestAllTypes
+	message = TestAllTypes()
+	for n in xrange(REPEATED_MESSAGES):
+		message.repeated_nested_message.add().b = n
+	for n in xrange(REPEATED_MESSAGES // 4):
+		message.repeatedgroup.add().a.extend([n, n + 1])
+	return message
+
+
+def _getSparse():
+	from protojson.benchmark_pb2 import Sparse
+	message = Sparse()
+	message.low = 1
+	message.label = u'sparse'
+	message.ratio = 0.5
+	message.values.extend(xrange(10))
+	return message
+
+
+def _getDeepKey(message):
+	# In _getDeep's message, a level's value identifies everything under
+	# it, like an id would.
+	return message.value
+
+
+# (name, function that returns the message, omitUnset, keyFunction for a
+# cached serializer or None)
+SHAPES = (
+	('wide', _getWide, False, None),
+	('deep', _getDeep, True, _getDeepKey),
+	('repeatedScalars', _getRepeatedScalars, False, None),
+	('repeatedMessages', _getRepeatedMessages, False, None),
+	('sparse', _getSparse, False, None),
+)
+
+
+def _getSerializers(omitUnset, keyFunction):
+	from protojson.pbliteserializer import PbLiteSerializer
+	serializers = [('generic', PbLiteSerializer(omitUnset=omitUnset))]
+	if not omitUnset:
+		# With omitUnset, specialize would fall back to the generic code.
+		serializers.append(('specialized', PbLiteSerializer(specialize=True)))
+	if keyFunction is not None:
+		from protojson.memo import SubMessageCache
+		serializers.append(('cached', PbLiteSerializer(
+			omitUnset=omitUnset, cache=SubMessageCache(keyFunction))))
+	return serializers
+
+
+def getCases():
+	"""
+	Returns a C{list} of C{(name, operation)} for every benchmark, where
+	C{operation} is a function that does the work once.  The messages and
+	lists are built before this returns.
+	"""
+	cases = []
+	for shapeName, getMessage, omitUnset, keyFunction in SHAPES:
+		message = getMessage()
+		messageClass = message.__class__
+		for serializerName, serializer in _getSerializers(omitUnset, keyFunction):
+			serialized = serializer.serialize(message)
+			prefix = '%s/%s/' % (shapeName, serializerName)
+
+			def serialize(serializer=serializer, message=message):
+				return serializer.serialize(message)
+
+			def deserialize(serializer=serializer, serialized=serialized,
+			messageClass=messageClass):
+				decoded = messageClass()
+				serializer.deserialize(decoded, serialized)
+				return decoded
+
+			def roundTrip(serializer=serializer, message=message,
+			messageClass=messageClass):
+				decoded = messageClass()
+				serializer.deserialize(decoded, serializer.serialize(message))
+				return decoded
+
+			cases.append((prefix + 'serialize', serialize))
+			cases.append((prefix + 'deserialize', deserialize))
+			cases.append((prefix + 'roundTrip', roundTrip))
+	return cases
+
+
+def _timeOperation(operation, minTime, repeat):
+	"""
+	Returns the best operations per second over C{repeat} runs of at
+	least C{minTime} seconds each.
+	"""
+	best = 0.0
+	for n in xrange(repeat):
+		count = 0
+		start = time.time()
+		while True:
+			operation()
+			count += 1
+			elapsed = time.time() - start
+			if elapsed >= minTime:
+				break
+		best = max(best, count / max(elapsed, 1e-9))
+	return best
+
+
+def _countAllocations(operation):
+	"""
+	Returns the number of GC-tracked objects that one run of C{operation}
+	allocated and did not free.
+	"""
+	gc.collect()
+	enabled = gc.isenabled()
+	gc.disable()
+	try:
+		before = gc.get_count()[0]
+		result = operation()
+		allocations = gc.get_count()[0] - before
+		del result
+	finally:
+		if enabled:
+			gc.enable()
+	return allocations
+
+
+def _getPeakMemory(operation):
+	"""
+	Returns the peak number of bytes allocated during one run of
+	C{operation}, or C{None} if C{tracemalloc} isn't available.
+	"""
+	if tracemalloc is None:
+		return None
+	gc.collect()
+	tracemalloc.start()
+	try:
+		result = operation()
+		peak = tracemalloc.get_traced_memory()[1]
+		del result
+	finally:
+		tracemalloc.stop()
+	return peak
+
+
+def runBenchmarks(cases, minTime=0.2, repeat=3):
+	"""
+	Runs each of C{cases} (see L{getCases}) and returns a C{dict} mapping
+	the name of each to a C{dict} with keys C{'opsPerSec'},
+	C{'allocations'}, and C{'peakBytes'}.
+	"""
+	results = {}
+	for name, operation in cases:
+		# Warm up caches (plans, specialized functions).
+		operation()
+		results[name] = {
+			'opsPerSec': _timeOperation(operation, minTime, repeat),
+			'allocations': _countAllocations(operation),
+			'peakBytes': _getPeakMemory(operation),
+		}
+	return results
+
+
+def compareResults(baseline, results, tolerance=0.1):
+	"""
+	Returns a C{list} of C{(name, ratio)} for every benchmark in both
+	C{baseline} and C{results} (as returned by L{runBenchmarks}), where
+	C{ratio} is the current speed divided by the baseline speed, and a
+	C{list} of the names of those slower than C{1 - tolerance}.
+	"""
+	ratios = []
+	regressions = []
+	for name in sorted(results):
+		if name not in baseline:
+			continue
+		ratio = results[name]['opsPerSec'] / baseline[name]['opsPerSec']
+		ratios.append((name, ratio))
+		if ratio < 1 - tolerance:
+			regressions.append(name)
+	return ratios, regressions
+
+
+def formatResults(results, ratios=None):
+	"""
+	Returns a C{str} table of C{results}, with C{ratios} from
+	L{compareResults} if given.
+	"""
+	ratios = dict(ratios or ())
+	lines = ['%-45s %12s %12s %12s %8s' % (
+		'benchmark', 'ops/sec', 'allocations', 'peak bytes', 'vs base')]
+	for name in sorted(results):
+		result = results[name]
+		peakBytes = result['peakBytes']
+		ratio = ratios.get(name)
+		lines.append('%-45s %12.1f %12d %12s %8s' % (
+			name, result['opsPerSec'], result['allocations'],
+			peakBytes is None and '-' or peakBytes,
+			ratio is None and '-' or '%.2fx' % (ratio,)))
+	return '\n'.join(lines)
+
+
+def main(argv):
+	parser = optparse.OptionParser(usage="%prog [options]")
+	parser.add_option('--quick', action='store_true', default=False,
+		help="Run each benchmark only briefly")
+	parser.add_option('--save', metavar='FILE',
+		help="Save the results to FILE as a baseline")
+	parser.add_option('--compare', metavar='FILE',
+		help="Compare the results to the baseline in FILE")
+	parser.add_option('--tolerance', type='float', default=0.1,
+		help="Fail --compare if a benchmark is slower by more than this "
+			"fraction [default: %default]")
+	options, args = parser.parse_args(argv)
+	if options.quick:
+		results = runBenchmarks(getCases(), minTime=0.02, repeat=1)
+	else:
+		results = runBenchmarks(getCases())
+	ratios, regressions = None, []
+	if options.compare:
+		f = open(options.compare, 'rb')
+		try:
+			baseline = json.load(f)
+		finally:
+			f.close()
+		ratios, regressions = compareResults(
+			baseline, results, options.tolerance)
+	print formatResults(results, ratios)
+	if options.save:
+		f = open(options.save, 'wb')
+		try:
+			json.dump(results, f, indent=1, sort_keys=True)
+		finally:
+			f.close()
+	if regressions:
+		print
+		print "Slower than the baseline by more than %.0f%%:" % (
+			options.tolerance * 100,)
+		for name in regressions:
+			print "\t" + name
+		return 1
+	return 0
+
+
+def _parent(path):
+	return os.path.dirname(path)
+
+
+if __name__ == '__main__':
+	packageParentDir = _parent(_parent(os.path.abspath(__file__)))
+	sys.path.insert(0, packageParentDir)
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,124 @@
+# Written by hand for benchmark.proto, in the form that protoc 2.x
+# generates (protoc 3 and later generate modules that protobuf 2.x can't
+# load).  Keep it in sync with benchmark.proto, or replace it with the
+# output of protoc 2.x.
+
+from google.protobuf import descriptor
+from google.protobuf import message
+from google.protobuf import reflection
+from google.protobuf import descriptor_pb2
+# @@protoc_insertion_point(imports)
+
+
+
+DESCRIPTOR = descriptor.FileDescriptor(
+  name='benchmark.proto',
+  package='',
+  serialized_pb='\n\x0f\x62\x65nchmark.proto\"=\n\x06Nested\x12\r\n\x05value\x18\x01 \x01(\x05\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\x16\n\x05\x63hild\x18\x03 \x01(\x0b\x32\x07.Nested\"E\n\x06Sparse\x12\x0b\n\x03low\x18\x01 \x01(\x05\x12\r\n\x05label\x18\x64 \x01(\t\x12\x0e\n\x05ratio\x18\xe8\x07 \x01(\x01\x12\x0f\n\x06values\x18\xd0\x0f \x03(\x05')
+
+
+
+_NESTED = descriptor.Descriptor(
+  name='Nested',
+  full_name='Nested',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    descriptor.FieldDescriptor(
+      name='value', full_name='Nested.value', index=0,
+      number=1, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    descriptor.FieldDescriptor(
+      name='name', full_name='Nested.name', index=1,
+      number=2, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=unicode("", "utf-8"),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    descriptor.FieldDescriptor(
+      name='child', full_name='Nested.child', index=2,
+      number=3, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  extension_ranges=[],
+  serialized_start=19,
+  serialized_end=80,
+)
+
+_SPARSE = descriptor.Descriptor(
+  name='Sparse',
+  full_name='Sparse',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    descriptor.FieldDescriptor(
+      name='low', full_name='Sparse.low', index=0,
+      number=1, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    descriptor.FieldDescriptor(
+      name='label', full_name='Sparse.label', index=1,
+      number=100, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=unicode("", "utf-8"),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    descriptor.FieldDescriptor(
+      name='ratio', full_name='Sparse.ratio', index=2,
+      number=1000, type=1, cpp_type=5, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    descriptor.FieldDescriptor(
+      name='values', full_name='Sparse.values', index=3,
+      number=2000, type=5, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  extension_ranges=[],
+  serialized_start=82,
+  serialized_end=151,
+)
+
+_NESTED.fields_by_name['child'].message_type = _NESTED
+
+class Nested(message.Message):
+  __metaclass__ = reflection.GeneratedProtocolMessageType
+  DESCRIPTOR = _NESTED
+  
+  # @@protoc_insertion_point(class_scope:Nested)
+
+class Sparse(message.Message):
+  __metaclass__ = reflection.GeneratedProtocolMessageType
+  DESCRIPTOR = _SPARSE
+  
+  # @@protoc_insertion_point(class_scope:Sparse)
+
+# @@protoc_insertion_point(module_scope)
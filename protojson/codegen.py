@@ -0,0 +1,296 @@
+"""
+Generates specialized serialize/deserialize functions for message types.
+
+For each message type, this module writes the source of a straight-line
+Python function that accesses every field by name and does exactly the
+conversion that field needs, then compiles it.  The generated functions
+produce the same PbLite lists and raise the same exceptions as the
+generic L{protojson.pbliteserializer.PbLiteSerializer} code, but do not
+loop over fields or branch on field types at runtime.
+
+Use them through C{PbLiteSerializer(specialize=True)}.
+"""
+
+import keyword
+import re
+import threading
+
+from protojson.error import PbDecodeError
+from protojson.pbliteserializer import (
+	KIND_BOOL, KIND_ENUM, KIND_MESSAGE, TYPE_BYTES, _convertBools,
+	_convertToBool, _decodeBase64, _encodeBase64, _ensureValidEnums,
+	_getIterator, _getList, _getPlan)
+
+_postImportVars = vars().keys()
+
+
+_identifierRe = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _canSpecialize(name):
+	"""
+	Returns C{True} if field C{name} can be written as C{message.name}.
+	"""
+	return bool(_identifierRe.match(name)) and not keyword.iskeyword(name)
+
+
+def _raiseMissing(message, data, plan):
+	for fieldPlan in plan.fields:
+		tag = fieldPlan[0]
+		try:
+			data[tag]
+		except IndexError:
+			raise PbDecodeError("For message %r expected index "
+				"%r but it was missing." % (message, tag))
+
+
+def _raiseBadEnum(field):
+	raise PbDecodeError("Expected a valid value for "
+		"%r, but didn't get one." % (field,))
+
+
+class _Generator(object):
+	"""
+	Generates and compiles the functions for one message type and all of
+	the types reachable from it.  All generated functions live in one
+	shared namespace and refer to each other by name, so that recursive
+	message types work.
+	"""
+
+	def __init__(self, namespace, names):
+		self.namespace = namespace
+		self.names = names
+		self.reserved = set()
+		for serializeName, deserializeName in names.itervalues():
+			self.reserved.add(serializeName)
+			self.reserved.add(deserializeName)
+		self.pending = []
+
+
+	def _uniqueName(self, prefix, plan):
+		base = prefix + re.sub(r'[^A-Za-z0-9_]', '_', plan.descriptor.full_name)
+		name = base
+		n = 1
+		while name in self.namespace or name in self.reserved:
+			n += 1
+			name = '%s_%d' % (base, n)
+		self.reserved.add(name)
+		return name
+
+
+	def _constant(self, obj):
+		name = '_c%d' % (len(self.namespace),)
+		self.namespace[name] = obj
+		return name
+
+
+	def functionNames(self, plan):
+		"""
+		Returns C{(serializeName, deserializeName)} for C{plan}, reserving
+		the names and queueing the type for generation if necessary.
+		"""
+		try:
+			return self.names[plan]
+		except KeyError:
+			pass
+		for fieldPlan in plan.fields:
+			if not _canSpecialize(fieldPlan[1]):
+				raise _CannotSpecialize(plan)
+		names = (
+			self._uniqueName('serialize_', plan),
+			self._uniqueName('deserialize_', plan))
+		self.names[plan] = names
+		self.pending.append(plan)
+		return names
+
+
+	def _serializeSource(self, plan, functionName):
+		slots = ['filler'] * plan.length
+		for tag, name, kind, repeated, enumValues, childPlan, field in plan.fields:
+			access = 'message.' + name
+			if kind == KIND_MESSAGE:
+				childName = self.functionNames(childPlan)[0]
+				if repeated:
+					expr = '[%s(c, filler, b64) for c in %s]' % (childName, access)
+				else:
+					expr = '%s(%s, filler, b64)' % (childName, access)
+			elif kind == KIND_BOOL:
+				# Booleans are serialized in numeric form.
+				if repeated:
+					expr = '[c and 1 or 0 for c in %s]' % (access,)
+				else:
+					expr = '%s and 1 or 0' % (access,)
+			elif field.type == TYPE_BYTES:
+				if repeated:
+					expr = 'map(_encodeBase64, %s) if b64 else list(%s)' % (
+						access, access)
+				else:
+					expr = '_encodeBase64(%s) if b64 else %s' % (access, access)
+			else:
+				if repeated:
+					expr = 'list(%s)' % (access,)
+				else:
+					expr = access
+			slots[tag] = expr
+		lines = ['def %s(message, filler, b64=False):' % (functionName,)]
+		lines.append('\treturn [')
+		for expr in slots:
+			lines.append('\t\t%s,' % (expr,))
+		lines.append('\t]')
+		return '\n'.join(lines)
+
+
+	def _deserializeSource(self, plan, functionName):
+		lines = ['def %s(message, data, b64=False):' % (functionName,)]
+		if plan.fields:
+			lines.append('\tif len(data) < %d:' % (plan.length,))
+			lines.append('\t\t_raiseMissing(message, data, %s)' % (
+				self._constant(plan),))
+		# Consecutive non-message fields share one try block; Message
+		# fields are deserialized outside of it, because nested errors
+		# must propagate unchanged.
+		inTry = False
+		for tag, name, kind, repeated, enumValues, childPlan, field in plan.fields:
+			access = 'message.' + name
+			if kind == KIND_MESSAGE:
+				if inTry:
+					lines.append('\texcept (TypeError, ValueError), e:')
+					lines.append('\t\traise PbDecodeError(str(e))')
+					inTry = False
+				childName = self.functionNames(childPlan)[1]
+				if repeated:
+					lines.append('\tadd = %s.add' % (access,))
+					lines.append('\tfor subdata in _getIterator(data[%d]):' % (tag,))
+					lines.append('\t\t%s(add(), subdata, b64)' % (childName,))
+				else:
+					lines.append('\t%s(%s, data[%d], b64)' % (childName, access, tag))
+				continue
+			if not inTry:
+				lines.append('\ttry:')
+				inTry = True
+			if kind == KIND_ENUM:
+				enums = self._constant(enumValues)
+				fieldName = self._constant(field)
+			if repeated:
+				if kind == KIND_BOOL:
+					lines.append('\t\t%s.extend(_convertBools(_getList(data[%d])))' % (
+						access, tag))
+				elif kind == KIND_ENUM:
+					lines.append('\t\tvalues = _getList(data[%d])' % (tag,))
+					lines.append('\t\t_ensureValidEnums(%s, %s, values)' % (
+						fieldName, enums))
+					lines.append('\t\t%s.extend(values)' % (access,))
+				elif field.type == TYPE_BYTES:
+					lines.append('\t\tvalues = _getList(data[%d])' % (tag,))
+					lines.append('\t\t%s.extend(map(_decodeBase64, values) '
+						'if b64 else values)' % (access,))
+				else:
+					lines.append('\t\t%s.extend(_getList(data[%d]))' % (access, tag))
+			else:
+				if kind == KIND_BOOL:
+					lines.append('\t\t%s = _convertToBool(data[%d])' % (access, tag))
+				elif kind == KIND_ENUM:
+					lines.append('\t\tv = data[%d]' % (tag,))
+					lines.append('\t\tif v not in %s:' % (enums,))
+					lines.append('\t\t\t_raiseBadEnum(%s)' % (fieldName,))
+					lines.append('\t\t%s = v' % (access,))
+				elif field.type == TYPE_BYTES:
+					lines.append('\t\tv = data[%d]' % (tag,))
+					lines.append('\t\t%s = _decodeBase64(v) if b64 else v' % (access,))
+				else:
+					lines.append('\t\t%s = data[%d]' % (access, tag))
+		if inTry:
+			lines.append('\texcept (TypeError, ValueError), e:')
+			lines.append('\t\traise PbDecodeError(str(e))')
+		if len(lines) == 1:
+			lines.append('\tpass')
+		return '\n'.join(lines)
+
+
+	def generate(self, plan):
+		"""
+		Generates and compiles functions for C{plan} and every type
+		reachable from it that doesn't already have them.
+		"""
+		self.functionNames(plan)
+		sources = []
+		while self.pending:
+			pendingPlan = self.pending.pop()
+			serializeName, deserializeName = self.names[pendingPlan]
+			sources.append(self._serializeSource(pendingPlan, serializeName))
+			sources.append(self._deserializeSource(pendingPlan, deserializeName))
+		source = '\n\n'.join(sources) + '\n'
+		code = compile(source, '<protojson.codegen %s>' % (
+			plan.descriptor.full_name,), 'exec')
+		exec code in self.namespace
+
+
+
+class _CannotSpecialize(Exception):
+	"""
+	A message type (or a type reachable from it) cannot be specialized.
+	"""
+
+
+
+_lock = threading.Lock()
+_namespace = {
+	'PbDecodeError': PbDecodeError,
+	'_convertBools': _convertBools,
+	'_convertToBool': _convertToBool,
+	'_decodeBase64': _decodeBase64,
+	'_encodeBase64': _encodeBase64,
+	'_ensureValidEnums': _ensureValidEnums,
+	'_getIterator': _getIterator,
+	'_getList': _getList,
+	'_raiseMissing': _raiseMissing,
+	'_raiseBadEnum': _raiseBadEnum,
+}
+# _MessagePlan -> (serializeName, deserializeName) for every type that has
+# compiled functions in _namespace.
+_names = {}
+
+
+def getFunctions(plan):
+	"""
+	Returns C{(serialize, deserialize)} for L{_MessagePlan} C{plan}, or
+	C{None} if the message type (or a message type reachable from it) can't
+	be specialized.  The result is also stored in C{plan.specialized}
+	(C{False} instead of C{None}).
+
+	C{serialize(message, fillerValue, base64Bytes=False)} returns the
+	PbLite list for C{message}.  C{deserialize(message, data,
+	base64Bytes=False)} mutates C{message} (which must already be cleared)
+	based on C{data}.  C{base64Bytes} has the same meaning as for
+	L{protojson.pbliteserializer.PbLiteSerializer}.
+	"""
+	_lock.acquire()
+	try:
+		if plan.specialized is not None:
+			return plan.specialized or None
+		names = dict(_names)
+		generator = _Generator(_namespace.copy(), names)
+		try:
+			generator.generate(plan)
+		except _CannotSpecialize:
+			plan.specialized = False
+			return None
+		# Publish only after everything compiled.
+		_namespace.update(generator.namespace)
+		_names.update(names)
+		for generatedPlan, (serializeName, deserializeName) in names.iteritems():
+			if generatedPlan.specialized is None:
+				generatedPlan.specialized = (
+					generator.namespace[serializeName],
+					generator.namespace[deserializeName])
+		return plan.specialized
+	finally:
+		_lock.release()
+
+
+def getFunctionsForDescriptor(descriptor):
+	"""
+	Like L{getFunctions}, but takes a
+	L{google.protobuf.descriptor.Descriptor}.
+	"""
+	return getFunctions(_getPlan(descriptor))
@@ -0,0 +1,153 @@
+"""
+Patches between two versions of a message, for sending only what changed.
+
+A patch for a message is a C{dict} that maps the tag number of every
+changed field to:
+
+	- for a singular non-Message field, the new value (in PbLite form),
+	  or C{None} to clear the field;
+	- for a singular Message/Group field, a patch for the nested message,
+	  or C{None} to clear the field;
+	- for a repeated field, a splice C{[start, deleteCount, items]}: the
+	  C{deleteCount} items starting at C{start} are replaced with
+	  C{items} (PbLite values).
+
+For example, C{{1: 5, 18: {1: 2}, 31: [3, 1, []]}} sets field 1 to 5,
+sets field 1 of the message in field 18 to 2, and deletes the fourth
+item of field 31.  An empty C{dict} means nothing changed.  Tags that
+have become C{str}s (as happens to JSON object keys) are accepted.
+
+Patches are made by comparing PbLite lists, so fields are cleared only
+with C{omitUnset}, where unset fields are C{None}.
+"""
+
+from protojson.error import PbDecodeError
+from protojson.pbliteserializer import (
+	KIND_MESSAGE, PbLiteSerializer, _getFieldsByKey, _getItems, _getPlan)
+
+_postImportVars = vars().keys()
+
+
+def _getIndex(data, tag):
+	if tag < len(data):
+		return data[tag]
+	return None
+
+
+def _diffRepeated(old, new):
+	if old is None:
+		old = []
+	if new is None:
+		new = []
+	oldLength = len(old)
+	newLength = len(new)
+	start = 0
+	maxStart = min(oldLength, newLength)
+	while start < maxStart and old[start] == new[start]:
+		start += 1
+	end = 0
+	maxEnd = maxStart - start
+	while end < maxEnd and old[oldLength - end - 1] == new[newLength - end - 1]:
+		end += 1
+	return [start, oldLength - start - end, list(new[start:newLength - end])]
+
+
+def _diffMessage(plan, old, new):
+	patch = {}
+	for tag, name, kind, repeated, enumValues, childPlan, field in plan.fields:
+		oldValue = _getIndex(old, tag)
+		newValue = _getIndex(new, tag)
+		if oldValue == newValue:
+			continue
+		if repeated:
+			patch[tag] = _diffRepeated(oldValue, newValue)
+		elif kind == KIND_MESSAGE and newValue is not None:
+			patch[tag] = _diffMessage(childPlan, oldValue or [], newValue)
+		else:
+			patch[tag] = newValue
+	return patch
+
+
+def makePatch(old, new, serializer=None):
+	"""
+	Returns the patch that turns C{old} into C{new}.
+
+	C{new} is a L{google.protobuf.message.Message}.  C{old} is a Message
+	of the same type, or the PbLite list that C{serializer} (a default
+	L{PbLiteSerializer} if C{None}) made for one.  Pass the list you kept
+	from the last L{PbLiteSerializer.serialize} to avoid serializing the
+	old message again.
+	"""
+	if serializer is None:
+		serializer = PbLiteSerializer()
+	if not isinstance(old, list):
+		if old.DESCRIPTOR is not new.DESCRIPTOR:
+			raise TypeError("Expected a %s message but got a %r" % (
+				new.DESCRIPTOR.full_name, old))
+		old = serializer.serialize(old)
+	return _diffMessage(_getPlan(new.DESCRIPTOR), old, serializer.serialize(new))
+
+
+def _applyRepeated(serializer, message, fieldPlan, splice):
+	tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+	try:
+		start, deleteCount, items = splice
+	except (TypeError, ValueError):
+		raise PbDecodeError("Expected a [start, deleteCount, items] splice "
+			"for %r but found %r" % (field, splice))
+	container = getattr(message, name)
+	if not (isinstance(start, (int, long)) and isinstance(deleteCount, (int, long))
+	and 0 <= start and 0 <= deleteCount and start + deleteCount <= len(container)):
+		raise PbDecodeError("Splice [%r, %r, ...] is out of range for %r, "
+			"which has %d items" % (start, deleteCount, field, len(container)))
+	if kind == KIND_MESSAGE:
+		tail = []
+		for child in container[start + deleteCount:]:
+			copy = child.__class__()
+			copy.CopyFrom(child)
+			tail.append(copy)
+	else:
+		tail = list(container[start + deleteCount:])
+	del container[start:]
+	# Adds (and checks) the new items after the ones we kept.
+	serializer._deserializeMessageField(message, fieldPlan, items)
+	if kind == KIND_MESSAGE:
+		for child in tail:
+			container.add().CopyFrom(child)
+	else:
+		container.extend(tail)
+
+
+def _applyMessage(serializer, plan, message, patch):
+	fieldsByKey = _getFieldsByKey(plan, False)
+	for key, value in _getItems(patch):
+		fieldPlan = fieldsByKey.get(key)
+		if fieldPlan is None:
+			raise PbDecodeError("%s has no field with tag %r" % (
+				plan.descriptor.full_name, key))
+		tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+		if repeated:
+			_applyRepeated(serializer, message, fieldPlan, value)
+		elif value is None:
+			message.ClearField(name)
+		elif kind == KIND_MESSAGE:
+			child = getattr(message, name)
+			child.SetInParent()
+			_applyMessage(serializer, childPlan, child, value)
+		else:
+			serializer._deserializeMessageField(message, fieldPlan, value)
+
+
+def applyPatch(message, patch, serializer=None):
+	"""
+	Applies C{patch} (from L{makePatch}) to
+	L{google.protobuf.message.Message} C{message}, in place.  Values are
+	checked like L{PbLiteSerializer.deserialize} (with C{serializer}, a
+	default L{PbLiteSerializer} if C{None}) would check them.
+
+	If the patch is invalid (or doesn't fit C{message}), raises
+	L{PbDecodeError}, and C{message} may have been partly patched.
+	"""
+	if serializer is None:
+		serializer = PbLiteSerializer()
+	_applyMessage(serializer, _getPlan(message.DESCRIPTOR), message, patch)
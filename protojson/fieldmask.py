@@ -0,0 +1,147 @@
+"""
+Field masks, for serializing or deserializing only some fields of a message.
+
+A field mask is a collection of dotted field paths, like
+C{['optional_int32', 'repeated_nested_message.b']}.  A path through a
+repeated Message field applies to every message in it, and a path that
+ends at a Message field selects all of that message.  Pass one as
+C{PbLiteSerializer.serialize(message, fields=...)} to serialize only
+those fields, or as C{PbLiteSerializer.deserialize(message, data,
+fields=...)} to convert and validate only those fields, without looking
+at the rest of C{data}.
+
+Paths are resolved against the message type once, by L{compileMask};
+L{getMask} keeps the compiled L{FieldMask}s, so passing the same paths
+again costs a C{dict} lookup.  You can also compile a mask yourself and
+pass the L{FieldMask}.
+"""
+
+import threading
+
+from protojson.pbliteserializer import KIND_MESSAGE, _getPlan
+
+_postImportVars = vars().keys()
+
+
+class FieldMask(object):
+	"""
+	A field mask compiled for one message type.
+
+	C{plan} is the L{protojson.pbliteserializer._MessagePlan} of the
+	message type, and C{fields} is a C{list} of C{(fieldPlan, childMask)}
+	for the selected fields, by tag.  C{childMask} is a L{FieldMask} for
+	the selected fields of a nested message, or C{None} if all of the field
+	is selected.
+	"""
+	__slots__ = ('plan', 'fields')
+
+	def __init__(self, plan, fields):
+		self.plan = plan
+		self.fields = fields
+
+
+	def __repr__(self):
+		return '<%s for %s, %d fields>' % (
+			self.__class__.__name__, self.plan.descriptor.full_name,
+			len(self.fields))
+
+
+
+def _compile(plan, paths, prefix):
+	"""
+	C{paths} is a C{list} of C{list}s of field names.
+	"""
+	fieldsByName = {}
+	for fieldPlan in plan.fields:
+		fieldsByName[fieldPlan[1]] = fieldPlan
+	subPaths = {}
+	for path in paths:
+		name = path[0]
+		fieldPlan = fieldsByName.get(name)
+		if fieldPlan is None:
+			raise ValueError("%s has no field %r (in field path %r)" % (
+				plan.descriptor.full_name, name, '.'.join(prefix + path)))
+		if len(path) > 1 and fieldPlan[2] != KIND_MESSAGE:
+			raise ValueError("Field %r of %s is not a message (in field path %r)" % (
+				name, plan.descriptor.full_name, '.'.join(prefix + path)))
+		rest = subPaths.setdefault(name, [])
+		# None means all of the field.
+		if rest is not None:
+			if len(path) == 1:
+				subPaths[name] = None
+			else:
+				rest.append(path[1:])
+	fields = []
+	for fieldPlan in plan.fields:
+		name = fieldPlan[1]
+		if name not in subPaths:
+			continue
+		rest = subPaths[name]
+		if rest is None:
+			fields.append((fieldPlan, None))
+		else:
+			fields.append(
+				(fieldPlan, _compile(fieldPlan[5], rest, prefix + [name])))
+	return FieldMask(plan, fields)
+
+
+def compileMask(descriptor, paths):
+	"""
+	Returns a L{FieldMask} for the message type described by
+	C{descriptor} (a Descriptor or a
+	L{protojson.pbliteserializer._MessagePlan}) that selects the dotted
+	field paths in C{paths}.
+
+	Raises C{ValueError} if a path names a field that doesn't exist, or
+	goes through a field that isn't a Message field.
+	"""
+	if hasattr(descriptor, 'fields_by_name'):
+		plan = _getPlan(descriptor)
+	else:
+		plan = descriptor
+	if isinstance(paths, basestring):
+		raise TypeError("Expected a sequence of field paths, not a string: %r" % (
+			paths,))
+	splitPaths = []
+	for path in paths:
+		if not path:
+			raise ValueError("Empty field path in %r" % (paths,))
+		splitPaths.append(path.split('.'))
+	return _compile(plan, splitPaths, [])
+
+
+# (plan, tuple of paths) -> FieldMask.  Cleared when it reaches
+# _maxMasks, in case callers build paths on the fly.
+_masks = {}
+_maxMasks = 1024
+_masksLock = threading.Lock()
+
+def getMask(descriptor, paths):
+	"""
+	Like L{compileMask}, but returns the same L{FieldMask} for the same
+	C{descriptor} and C{paths}.  If C{paths} is already a L{FieldMask},
+	returns it.
+	"""
+	if hasattr(descriptor, 'fields_by_name'):
+		plan = _getPlan(descriptor)
+	else:
+		plan = descriptor
+	if isinstance(paths, FieldMask):
+		if paths.plan is not plan:
+			raise ValueError("%r is not for %s" % (paths, plan.descriptor.full_name))
+		return paths
+	if isinstance(paths, basestring):
+		# Raises TypeError
+		return compileMask(plan, paths)
+	key = (plan, tuple(paths))
+	mask = _masks.get(key)
+	if mask is None:
+		mask = compileMask(plan, key[1])
+		_masksLock.acquire()
+		try:
+			if len(_masks) >= _maxMasks:
+				_masks.clear()
+			mask = _masks.setdefault(key, mask)
+		finally:
+			_masksLock.release()
+	return mask
@@ -0,0 +1,286 @@
+"""
+Incremental re-serialization of one long-lived message.
+
+An L{IncrementalSerializer} is bound to one message and keeps the PbLite
+list from its last L{IncrementalSerializer.serialize}.  The next call
+re-serializes only the messages (the bound message and nested messages)
+that changed since then, and reuses the lists of all other nested
+messages.  Changing one field deep inside a large message costs about
+as much as serializing the messages on the path to it.
+
+Changes must be reported with L{IncrementalSerializer.markDirty}.
+
+Optionally (C{trackChanges=True}), changes are found with protobuf's own
+change tracking instead: the private "dirty" bit that the pure-Python
+implementation keeps for C{ByteSize}.  Anything else that calls
+C{ByteSize()} on the message or a nested message (C{SerializeToString()},
+C{str()}, and so on) clears those bits, and then changes made before it
+are silently missed, so only use it if nothing else does.
+
+The lists of unchanged nested messages are shared between the results
+of successive calls, so do not mutate the results.
+"""
+
+from protojson.error import PbDecodeError
+from protojson.pbliteserializer import (
+	KIND_BOOL, KIND_MESSAGE, TYPE_BYTES, PbLiteSerializer, _encodeBase64,
+	_getFieldsByDescriptor, _getPlan)
+
+_postImportVars = vars().keys()
+
+
+class _Node(object):
+	"""
+	The serialized form of one message, and the L{_Node}s of its nested
+	messages (by tag; a C{list} of them for a repeated field).
+	"""
+	__slots__ = ('message', 'serialized', 'children')
+
+	def __init__(self, message, serialized, children):
+		self.message = message
+		self.serialized = serialized
+		self.children = children
+
+
+
+class IncrementalSerializer(object):
+	"""
+	Serializes one message again and again, redoing only what changed.
+	"""
+	__slots__ = (
+		'message', 'serializer', 'trackChanges', 'rebuilt', '_root',
+		'_dirty', '_parents')
+
+	def __init__(self, message, serializer=None, trackChanges=False):
+		"""
+		C{message} is the L{google.protobuf.message.Message} to serialize.
+		C{serializer} is the L{PbLiteSerializer} whose options to use (a
+		default one if C{None}); its C{specialize}, C{metrics}, and
+		C{cache} are not used.
+
+		If C{trackChanges} is true, protobuf's change tracking is used
+		instead of L{markDirty}, which needs the pure-Python protobuf
+		implementation; see the module docstring for why any
+		C{SerializeToString()} or C{ByteSize()} call on the message breaks
+		it.  By default, only L{markDirty} is used.
+		"""
+		if serializer is None:
+			serializer = PbLiteSerializer()
+		if trackChanges and not hasattr(message, '_cached_byte_size_dirty'):
+			raise ValueError("trackChanges needs the pure-Python protobuf "
+				"implementation")
+		self.message = message
+		self.serializer = serializer
+		self.trackChanges = trackChanges
+		# The number of messages serialized by the last serialize()
+		self.rebuilt = 0
+		self.reset()
+
+
+	def reset(self):
+		"""
+		Forgets the last result, so that the next L{serialize} serializes
+		everything.
+		"""
+		self._root = None
+		# Without change tracking: the ids of messages marked dirty, and
+		# id(message) -> id(parent message) for every message in the tree
+		self._dirty = set()
+		self._parents = {}
+
+
+	def markDirty(self, message):
+		"""
+		Reports that C{message} (the bound message or a message nested in
+		it) has changed since the last L{serialize}.  For a nested message
+		that wasn't serialized last time (because it was just added, or
+		just set with C{omitUnset}), mark its parent instead.
+		"""
+		if self.trackChanges:
+			# Marks it and its ancestors dirty, as setting a field would.
+			message._Modified()
+			return
+		dirty = self._dirty
+		parents = self._parents
+		key = id(message)
+		while key is not None and key not in dirty:
+			dirty.add(key)
+			key = parents.get(key)
+
+
+	def _isClean(self, node, message):
+		if node is None or node.message is not message:
+			return False
+		if self.trackChanges:
+			return not message._cached_byte_size_dirty
+		return id(message) not in self._dirty
+
+
+	def _listFields(self, plan, message):
+		"""
+		Returns C{(length, [(fieldPlan, value), ...])} for the fields of
+		C{message} that are serialized.
+		"""
+		if not self.serializer.omitUnset:
+			return plan.length, [
+				(fieldPlan, getattr(message, fieldPlan[1])) for fieldPlan in plan.fields]
+		fieldsByDescriptor = _getFieldsByDescriptor(plan)
+		listed = [(fieldsByDescriptor[field], value)
+			for field, value in message.ListFields() if field in fieldsByDescriptor]
+		if not listed:
+			return 0, listed
+		return listed[-1][0][0] + 1, listed
+
+
+	def _refresh(self, plan, message, node):
+		"""
+		Returns the L{_Node} for C{message}, which has the type described
+		by C{plan}.  C{node} is its L{_Node} from the last L{serialize} (or
+		C{None}); it and the nodes under it are reused where they are
+		clean.
+		"""
+		serializer = self.serializer
+		fillerValue = serializer.fillerValue
+		repeatedArrays = serializer.repeatedArrays
+		base64Bytes = serializer.base64Bytes
+		maxDepth = serializer.maxDepth
+		trackChanges = self.trackChanges
+		dirty = self._dirty
+		parents = self._parents
+		# The new node goes in result[0], and its list in resultSerialized[0].
+		result = [None]
+		resultSerialized = [None]
+		# (plan, message, oldNode, parentKey, depth, nodes, serializeds, key):
+		# refresh message, and put its node in nodes[key] and its list in
+		# serializeds[key].  (None, oldChildren, children, ...): every child
+		# of a node is done, so forget the messages that were removed.
+		stack = [(plan, message, node, None, 1, result, resultSerialized, 0)]
+		pop = stack.pop
+		push = stack.append
+		while stack:
+			plan, message, node, parentKey, depth, nodes, serializeds, key = pop()
+			if plan is None:
+				self._forgetRemoved(message, node)
+				continue
+			if not trackChanges:
+				parents[id(message)] = parentKey
+			if self._isClean(node, message):
+				nodes[key] = node
+				serializeds[key] = node.serialized
+				continue
+			if depth > maxDepth:
+				raise PbDecodeError("Message %r is nested more than %d "
+					"deep" % (message, maxDepth))
+			self.rebuilt += 1
+			length, fields = self._listFields(plan, message)
+			serialized = [fillerValue] * length
+			children = {}
+			if node is not None and node.message is message:
+				oldChildren = node.children
+			else:
+				oldChildren = {}
+			nodes[key] = _Node(message, serialized, children)
+			serializeds[key] = serialized
+			if oldChildren and not trackChanges:
+				# Popped after all of the children are done.
+				push((None, oldChildren, children, None, None, None, None, None))
+			messageKey = id(message)
+			for fieldPlan, value in fields:
+				tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+				if kind == KIND_MESSAGE:
+					oldChild = oldChildren.get(tag)
+					if not repeated:
+						push((childPlan, value, oldChild, messageKey, depth + 1,
+							children, serialized, tag))
+						continue
+					childNodes = children[tag] = [None] * len(value)
+					childSerialized = serialized[tag] = [None] * len(value)
+					oldNodes = oldChild or []
+					oldLength = len(oldNodes)
+					oldNodesById = None
+					for n, child in enumerate(value):
+						# Usually, the messages are where they were last time.
+						if n < oldLength and oldNodes[n].message is child:
+							childNode = oldNodes[n]
+						else:
+							if oldNodesById is None:
+								oldNodesById = dict(
+									(id(oldNode.message), oldNode) for oldNode in oldNodes)
+							childNode = oldNodesById.get(id(child))
+						if childNode is not None:
+							# The same check as _isClean, inlined for speed.
+							# If clean, its parent is already in self._parents.
+							if trackChanges:
+								clean = not child._cached_byte_size_dirty
+							else:
+								clean = id(child) not in dirty
+							if clean:
+								childNodes[n] = childNode
+								childSerialized[n] = childNode.serialized
+								continue
+						push((childPlan, child, childNode, messageKey, depth + 1,
+							childNodes, childSerialized, n))
+				elif repeated:
+					if kind == KIND_BOOL:
+						serialized[tag] = [child and 1 or 0 for child in value]
+					elif base64Bytes and field.type == TYPE_BYTES:
+						serialized[tag] = map(_encodeBase64, value)
+					else:
+						serialized[tag] = list(value)
+					if repeatedArrays is not None:
+						serialized[tag] = serializer._packRepeated(field, serialized[tag])
+				elif kind == KIND_BOOL:
+					serialized[tag] = value and 1 or 0
+				elif base64Bytes and field.type == TYPE_BYTES:
+					serialized[tag] = _encodeBase64(value)
+				else:
+					serialized[tag] = value
+		return result[0]
+
+
+	def _forgetRemoved(self, oldChildren, children):
+		"""
+		Removes the messages under the L{_Node}s in C{oldChildren} whose
+		messages are no longer children (in C{children}) from
+		C{self._parents}.
+		"""
+		kept = set()
+		for child in children.itervalues():
+			if isinstance(child, list):
+				kept.update(id(childNode.message) for childNode in child)
+			else:
+				kept.add(id(child.message))
+		parents = self._parents
+		stack = []
+		for child in oldChildren.itervalues():
+			if isinstance(child, list):
+				stack.extend(child)
+			else:
+				stack.append(child)
+		while stack:
+			node = stack.pop()
+			if id(node.message) in kept:
+				# Still in the tree; refreshed separately.
+				continue
+			parents.pop(id(node.message), None)
+			for child in node.children.itervalues():
+				if isinstance(child, list):
+					stack.extend(child)
+				else:
+					stack.append(child)
+
+
+	def serialize(self):
+		"""
+		Returns a C{list}, the serialized form of the bound message, like
+		L{PbLiteSerializer.serialize} would.
+		"""
+		self.rebuilt = 0
+		message = self.message
+		self._root = self._refresh(
+			_getPlan(message.DESCRIPTOR), message, self._root)
+		self._dirty = set()
+		if self.trackChanges:
+			# Clears protobuf's dirty bits.
+			message.ByteSize()
+		return self._root.serialized
@@ -0,0 +1,163 @@
+"""
+Lazy deserialization of PbLite lists, like Closure Library's
+goog.proto2.PbLiteSerializer (which deserializes fields only when they
+are first accessed).
+
+A L{LazyMessage} wraps a PbLite list.  Reading a field converts and
+validates just that field (descending into a nested message only when the
+nested message's own fields are read) and caches the result.  Errors are
+raised by the attribute access that finds them.
+
+Use it through
+L{protojson.pbliteserializer.PbLiteSerializer.deserializeLazy}.
+"""
+
+from protojson.error import PbDecodeError
+from protojson.pbliteserializer import (
+	KIND_MESSAGE, LABEL_REQUIRED, _getFieldChecker, _getIterator)
+
+_postImportVars = vars().keys()
+
+
+# _MessagePlan -> {name: fieldPlan}
+_fieldsByName = {}
+
+
+def _getFieldsByName(plan):
+	try:
+		return _fieldsByName[plan]
+	except KeyError:
+		fieldsByName = _fieldsByName[plan] = dict(
+			(fieldPlan[1], fieldPlan) for fieldPlan in plan.fields)
+		return fieldsByName
+
+
+class LazyMessage(object):
+	"""
+	A read-only view over a PbLite list.  Fields are read as attributes,
+	just like on a L{google.protobuf.message.Message}:
+
+		- a singular scalar field is the validated value, or the field's
+		  default if it is unset (C{None} or missing, with C{omitUnset});
+		- a singular Message/Group field is another L{LazyMessage};
+		- a repeated field is a C{tuple} of values or L{LazyMessage}s.
+
+	The first access of each field raises L{PbDecodeError} if the field's
+	data is invalid (just like L{PbLiteSerializer.deserialize} would), and
+	caches the converted value otherwise.
+	"""
+	__slots__ = ('_plan', '_data', '_omitUnset', '_base64Bytes', '_values')
+
+	def __init__(self, plan, data, omitUnset=False, base64Bytes=False):
+		"""
+		C{plan} is the L{protojson.pbliteserializer._MessagePlan} for the
+		message type.  C{data} is a L{list}.  C{omitUnset} and
+		C{base64Bytes} have the same meaning as for L{PbLiteSerializer}.
+		"""
+		self._plan = plan
+		self._data = data
+		self._omitUnset = omitUnset
+		self._base64Bytes = base64Bytes
+		self._values = {}
+
+
+	def __repr__(self):
+		return '<%s %s at 0x%x>' % (
+			self.__class__.__name__, self._plan.descriptor.full_name, id(self))
+
+
+	@property
+	def DESCRIPTOR(self):
+		return self._plan.descriptor
+
+
+	def _getData(self, fieldPlan):
+		tag = fieldPlan[0]
+		if not isinstance(self._data, (list, tuple)):
+			raise PbDecodeError("Expected a list for message %r but found "
+				"a %r" % (self, type(self._data)))
+		try:
+			return self._data[tag]
+		except IndexError:
+			if self._omitUnset:
+				return None
+			# Raise even if it was an optional field.
+			raise PbDecodeError("For message %r expected index "
+				"%r but it was missing." % (self, tag))
+
+
+	def _convert(self, fieldPlan):
+		tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+		omitUnset = self._omitUnset
+		base64Bytes = self._base64Bytes
+		data = self._getData(fieldPlan)
+		if data is None and omitUnset:
+			if field.label == LABEL_REQUIRED:
+				raise PbDecodeError("Required field %r is missing" % (field,))
+			if repeated:
+				return ()
+			elif kind == KIND_MESSAGE:
+				return LazyMessage(childPlan, [], omitUnset, base64Bytes)
+			return field.default_value
+		if repeated:
+			if kind == KIND_MESSAGE:
+				return tuple(LazyMessage(childPlan, subdata, omitUnset, base64Bytes)
+					for subdata in _getIterator(data))
+			checker = _getFieldChecker(fieldPlan, base64Bytes)
+			return tuple(checker(value) for value in _getIterator(data))
+		elif kind == KIND_MESSAGE:
+			return LazyMessage(childPlan, data, omitUnset, base64Bytes)
+		# Without omitUnset, None is rejected, like deserialize does.
+		return _getFieldChecker(fieldPlan, base64Bytes)(data)
+
+
+	def __getattr__(self, name):
+		# Only called for names that aren't slots or class attributes.
+		try:
+			return self._values[name]
+		except KeyError:
+			pass
+		try:
+			fieldPlan = _getFieldsByName(self._plan)[name]
+		except KeyError:
+			raise AttributeError(name)
+		value = self._values[name] = self._convert(fieldPlan)
+		return value
+
+
+	def __setattr__(self, name, value):
+		if name in LazyMessage.__slots__:
+			object.__setattr__(self, name, value)
+		else:
+			raise AttributeError("%r is read-only" % (self,))
+
+
+	def HasField(self, name):
+		"""
+		Returns C{True} if singular field C{name} has a value, like
+		L{google.protobuf.message.Message.HasField} would after
+		deserializing.  Message/Group fields always have a value, unless
+		C{omitUnset}.
+		"""
+		try:
+			fieldPlan = _getFieldsByName(self._plan)[name]
+		except KeyError:
+			raise ValueError("Protocol message has no %r field." % (name,))
+		if fieldPlan[3]:
+			raise ValueError("Protocol message has no singular %r field." % (name,))
+		if fieldPlan[2] == KIND_MESSAGE and not self._omitUnset:
+			return True
+		return self._getData(fieldPlan) is not None
+
+
+	def toMessage(self, serializer, message):
+		"""
+		Deserializes everything (eagerly, with L{PbLiteSerializer}
+		C{serializer}) into L{google.protobuf.message.Message} C{message},
+		which must be of this view's type.  Returns C{message}.
+		"""
+		if message.DESCRIPTOR is not self._plan.descriptor:
+			raise TypeError("Expected a %s message but got a %r" % (
+				self._plan.descriptor.full_name, message))
+		serializer.deserialize(message, self._data)
+		return message
@@ -0,0 +1,123 @@
+"""
+Memoization of serialized nested messages.
+
+Pass a L{SubMessageCache} as C{PbLiteSerializer(cache=...)} and every
+nested message (of the cached types) is looked up in it before being
+serialized.  Messages are keyed on whatever the caller's C{keyFunction}
+returns for them, typically fields that already identify the content,
+like an id and a version number.  Each lookup costs a C{keyFunction}
+call and a locked C{dict} access, and a hit saves serializing the
+message and everything under it, so cache only types whose messages
+are large and repeat across many serialized messages (user profiles,
+configuration blocks).  A key computed from the message's content
+(C{SerializePartialToString()}, say) costs more than serializing the
+message, so it never pays off.
+
+Cached lists are shared by every serialized message that contains them,
+so do not mutate what L{PbLiteSerializer.serialize} returns.  Use each
+cache with serializers that have the same options.
+"""
+
+import threading
+
+from collections import OrderedDict
+
+_postImportVars = vars().keys()
+
+
+class SubMessageCache(object):
+	"""
+	A size-bounded LRU cache of serialized nested messages.
+
+	C{hits}, C{misses}, and C{evictions} count what happened to lookups
+	since the cache was created or last L{clear}ed.
+	"""
+	__slots__ = (
+		'maxSize', 'types', 'keyFunction', 'hits', 'misses', 'evictions',
+		'_entries', '_lock')
+
+	def __init__(self, keyFunction, maxSize=1024, types=None):
+		"""
+		C{keyFunction} is called with each nested message (of a type in
+		C{types}) and returns a hashable key for its content, or C{None}
+		to not cache it.  Keys only need to be unique per message type.
+		It is called for every nested message of the cached types that
+		isn't inside a cache hit, so it must be cheap.
+
+		C{maxSize} is the number of serialized messages to keep.
+
+		C{types} is C{None} to cache nested messages of every type, or a
+		collection of the full names of the types to cache.
+		"""
+		self.maxSize = maxSize
+		if types is not None:
+			types = frozenset(types)
+		self.types = types
+		self.keyFunction = keyFunction
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+		self.clear()
+
+
+	def __len__(self):
+		return len(self._entries)
+
+
+	def clear(self):
+		"""
+		Removes every entry and resets the counters.
+		"""
+		self._lock.acquire()
+		try:
+			self._entries.clear()
+			self.hits = 0
+			self.misses = 0
+			self.evictions = 0
+		finally:
+			self._lock.release()
+
+
+	def getKey(self, descriptor, message):
+		"""
+		Returns the key for C{message}, which has the type described by
+		C{descriptor}, or C{None} if it shouldn't be cached.
+		"""
+		fullName = descriptor.full_name
+		if self.types is not None and fullName not in self.types:
+			return None
+		key = self.keyFunction(message)
+		if key is None:
+			return None
+		return (fullName, key)
+
+
+	def get(self, key):
+		"""
+		Returns the serialized C{list} for C{key}, or C{None}.
+		"""
+		self._lock.acquire()
+		try:
+			try:
+				serialized = self._entries.pop(key)
+			except KeyError:
+				self.misses += 1
+				return None
+			# Now the most recently used
+			self._entries[key] = serialized
+			self.hits += 1
+			return serialized
+		finally:
+			self._lock.release()
+
+
+	def put(self, key, serialized):
+		self._lock.acquire()
+		try:
+			entries = self._entries
+			entries.pop(key, None)
+			entries[key] = serialized
+			while len(entries) > self.maxSize:
+				entries.popitem(last=False)
+				self.evictions += 1
+		finally:
+			self._lock.release()
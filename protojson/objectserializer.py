@@ -0,0 +1,297 @@
+"""
+Serializers for sparse messages: messages with large and/or
+non-contiguous tag numbers, for which PbLite lists are mostly filler.
+
+L{ObjectSerializer} is a port of Closure Library's
+goog.proto2.ObjectSerializer.  It serializes a message to a C{dict} that
+maps the tag number (or, optionally, the field name) of every populated
+field to its value, for example::
+
+	{1: 3, 4: [[None, 7]], 1000: u'x'}
+
+L{HybridSerializer} writes PbLite lists for all fields with tags up to a
+threshold, followed (only if needed) by a trailing C{dict} with the
+populated fields that have higher tags, for example (threshold 10)::
+
+	[None, 3, (...), {1000: u'x'}]
+
+In both formats, nested messages are serialized in the same format, and
+unpopulated fields are simply left out of the C{dict}s.  Keys that have
+become C{str}s or C{unicode}s (as happens to JSON object keys) are
+accepted when deserializing.
+"""
+
+from protojson.error import PbDecodeError
+from protojson.pbliteserializer import (
+	KIND_BOOL, KIND_MESSAGE, _getFieldsByDescriptor, _getFieldsByKey,
+	_getItems, _getIterator, _getPlan, _setScalarField)
+
+_postImportVars = vars().keys()
+
+
+class ObjectSerializer(object):
+	"""
+	A port of Closure Library's goog.proto2.ObjectSerializer.
+	"""
+	__slots__ = ('keyByName',)
+
+	def __init__(self, keyByName=False):
+		"""
+		If C{keyByName} is true, the C{dict}s are keyed by field name
+		instead of tag number.
+		"""
+		self.keyByName = keyByName
+
+
+	def _serializeValue(self, fieldPlan, value):
+		tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+		if kind == KIND_MESSAGE:
+			if repeated:
+				return [self._serializeMessage(childPlan, child) for child in value]
+			return self._serializeMessage(childPlan, value)
+		elif repeated:
+			return list(value)
+		return value
+
+
+	def _serializeMessage(self, plan, message):
+		fieldsByDescriptor = _getFieldsByDescriptor(plan)
+		keyIndex = self.keyByName and 1 or 0
+		serialized = {}
+		for field, value in message.ListFields():
+			fieldPlan = fieldsByDescriptor.get(field)
+			if fieldPlan is None:
+				# An extension
+				continue
+			serialized[fieldPlan[keyIndex]] = self._serializeValue(fieldPlan, value)
+		return serialized
+
+
+	def serialize(self, message):
+		"""
+		C{message} is a L{google.protobuf.message.Message}.
+
+		Returns a C{dict}, the serialized form of C{message}.
+		"""
+		return self._serializeMessage(_getPlan(message.DESCRIPTOR), message)
+
+
+	def _deserializeMessageField(self, message, fieldPlan, data):
+		tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+		if kind != KIND_MESSAGE:
+			_setScalarField(message, fieldPlan, data)
+		elif repeated:
+			messageField = getattr(message, name)
+			for subdata in _getIterator(data):
+				self._deserializeMessage(childPlan, messageField.add(), subdata)
+		else:
+			child = getattr(message, name)
+			# The field was populated when it was serialized, even if the
+			# nested message is empty.
+			child.SetInParent()
+			self._deserializeMessage(childPlan, child, data)
+
+
+	def _deserializeMessage(self, plan, message, data):
+		fieldsByKey = _getFieldsByKey(plan, self.keyByName)
+		for key, value in _getItems(data):
+			fieldPlan = fieldsByKey.get(key)
+			if fieldPlan is None or value is None:
+				# Unknown fields are ignored, and None means unset.
+				continue
+			self._deserializeMessageField(message, fieldPlan, value)
+
+
+	def deserialize(self, message, data):
+		"""
+		Puts values from C{data} into message C{message}.  The message
+		is mutated, not returned.  Existing values are cleared.
+
+		C{message} is a L{google.protobuf.message.Message}.
+		C{data} is a C{dict}.  Unknown keys are ignored.
+
+		If any part of C{data} is invalid, raises L{PbDecodeError}.  Unlike
+		L{protojson.pbliteserializer.PbLiteSerializer.deserialize},
+		missing fields are not an error, so call C{message.IsInitialized()}
+		if you need required fields.
+		"""
+		message.Clear()
+		self._deserializeMessage(_getPlan(message.DESCRIPTOR), message, data)
+
+
+
+class _HybridPlan(object):
+	"""
+	How L{HybridSerializer} lays out one message type.
+	"""
+	__slots__ = ('denseFields', 'denseLength', 'sparseFields', 'sparseByKey')
+
+	def __init__(self, plan, threshold):
+		self.denseFields = tuple(f for f in plan.fields if f[0] <= threshold)
+		if self.denseFields:
+			self.denseLength = self.denseFields[-1][0] + 1
+		else:
+			self.denseLength = 0
+		self.sparseFields = tuple(f for f in plan.fields if f[0] > threshold)
+		self.sparseByKey = {}
+		for fieldPlan in self.sparseFields:
+			self.sparseByKey[fieldPlan[0]] = fieldPlan
+			self.sparseByKey[str(fieldPlan[0])] = fieldPlan
+
+
+
+# (_MessagePlan, threshold) -> _HybridPlan
+_hybridPlans = {}
+
+
+def _getHybridPlan(plan, threshold):
+	key = (plan, threshold)
+	try:
+		return _hybridPlans[key]
+	except KeyError:
+		hybridPlan = _hybridPlans[key] = _HybridPlan(plan, threshold)
+		return hybridPlan
+
+
+class HybridSerializer(object):
+	"""
+	Serializes messages like
+	L{protojson.pbliteserializer.PbLiteSerializer}, except that populated
+	fields with tags greater than C{threshold} go into a C{dict} at the
+	end of the list, instead of making the list long enough to hold them.
+	Messages whose tags are all <= C{threshold} are serialized exactly
+	like C{PbLiteSerializer} does.
+
+	This is not a C{PbLiteSerializer}, and has none of its other methods
+	or options.
+	"""
+	__slots__ = ('threshold', 'fillerValue')
+
+	def __init__(self, threshold=64, fillerValue=None):
+		"""
+		C{threshold} is the highest tag number that is serialized into
+		the dense part of the list.
+
+		C{fillerValue} is the object to use for unpopulated indices.  The
+		default is C{None}.
+		"""
+		self.threshold = threshold
+		self.fillerValue = fillerValue
+
+
+	def _serializeValue(self, fieldPlan, value):
+		tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+		if kind == KIND_MESSAGE:
+			if repeated:
+				return [self._serializeMessage(childPlan, child) for child in value]
+			return self._serializeMessage(childPlan, value)
+		elif kind == KIND_BOOL:
+			# Booleans are serialized in numeric form.
+			if repeated:
+				return [child and 1 or 0 for child in value]
+			return value and 1 or 0
+		elif repeated:
+			return list(value)
+		return value
+
+
+	def _serializeMessage(self, plan, message):
+		hybridPlan = _getHybridPlan(plan, self.threshold)
+		serialized = [self.fillerValue] * hybridPlan.denseLength
+		for fieldPlan in hybridPlan.denseFields:
+			serialized[fieldPlan[0]] = self._serializeValue(
+				fieldPlan, getattr(message, fieldPlan[1]))
+		if hybridPlan.sparseFields:
+			sparse = {}
+			for fieldPlan in hybridPlan.sparseFields:
+				tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+				if repeated:
+					value = getattr(message, name)
+					if not value:
+						continue
+				elif not message.HasField(name):
+					continue
+				else:
+					value = getattr(message, name)
+				sparse[tag] = self._serializeValue(fieldPlan, value)
+			if sparse:
+				serialized.append(sparse)
+		return serialized
+
+
+	def serialize(self, message):
+		"""
+		C{message} is a L{google.protobuf.message.Message}.
+
+		Returns a C{list}, the serialized form of C{message}.
+		"""
+		return self._serializeMessage(_getPlan(message.DESCRIPTOR), message)
+
+
+	def serializeMany(self, messages):
+		"""
+		Returns a C{list} with the serialized form of each message in
+		iterable C{messages}, in order.
+		"""
+		return [self.serialize(message) for message in messages]
+
+
+	def _deserializeMessageField(self, message, fieldPlan, data):
+		tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+		if kind != KIND_MESSAGE:
+			_setScalarField(message, fieldPlan, data)
+		elif repeated:
+			messageField = getattr(message, name)
+			for subdata in _getIterator(data):
+				self._deserializeMessage(childPlan, messageField.add(), subdata)
+		else:
+			self._deserializeMessage(childPlan, getattr(message, name), data)
+
+
+	def _deserializeMessage(self, plan, message, data):
+		hybridPlan = _getHybridPlan(plan, self.threshold)
+		for fieldPlan in hybridPlan.denseFields:
+			tag = fieldPlan[0]
+			try:
+				subdata = data[tag]
+			except IndexError:
+				# Raise even if it was an optional field.
+				raise PbDecodeError("For message %r expected index "
+					"%r but it was missing." % (message, tag))
+			if isinstance(subdata, dict):
+				raise PbDecodeError("For message %r expected index "
+					"%r but found the trailing dict." % (message, tag))
+			self._deserializeMessageField(message, fieldPlan, subdata)
+		if hybridPlan.sparseFields and data and isinstance(data[-1], dict):
+			sparseByKey = hybridPlan.sparseByKey
+			for key, value in data[-1].iteritems():
+				fieldPlan = sparseByKey.get(key)
+				if fieldPlan is None or value is None:
+					# Unknown fields are ignored, and None means unset.
+					continue
+				self._deserializeMessageField(message, fieldPlan, value)
+
+
+	def deserialize(self, message, data):
+		"""
+		Like L{protojson.pbliteserializer.PbLiteSerializer.deserialize},
+		but fields with tags greater than C{threshold} are read from the
+		trailing C{dict}, if any, and are left unset if they are not in
+		it.
+		"""
+		message.Clear()
+		self._deserializeMessage(_getPlan(message.DESCRIPTOR), message, data)
+
+
+	def deserializeMany(self, messageClass, lists):
+		"""
+		Returns a C{list} of new C{messageClass} instances, one for each
+		list in iterable C{lists}, in order.  If any list is invalid,
+		raises L{PbDecodeError}.
+		"""
+		messages = []
+		for data in lists:
+			message = messageClass()
+			self.deserialize(message, data)
+			messages.append(message)
+		return messages
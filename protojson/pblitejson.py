@@ -0,0 +1,641 @@
+"""
+Encodes protobuf Messages directly to PbLite JSON text, and decodes PbLite
+JSON text directly into protobuf Messages.
+
+The output of L{iterencode} is the same JSON document you would get from
+C{simplejson.dumps(serializer.serialize(message))} (modulo whitespace),
+but the intermediate nested C{list} is never built: the message is walked
+with an explicit stack and JSON text is produced as it goes.
+
+L{PbLiteDecoder} is the reverse: it is fed JSON text in chunks and sets
+fields on the Message as soon as their values have been read, without
+building the nested C{list} that C{simplejson.loads} would return.
+
+Use these through L{protojson.pbliteserializer.PbLiteSerializer}'s
+C{iterencode}, C{serializeToJson}, C{getDecoder}, and
+C{deserializeFromJson} methods.
+"""
+
+import codecs
+import re
+
+try:
+	from json import dumps
+	from json.decoder import scanstring
+	from json.encoder import encode_basestring_ascii
+except ImportError:
+	# Python 2.4 and 2.5
+	from simplejson import dumps
+	from simplejson.decoder import scanstring
+	from simplejson.encoder import encode_basestring_ascii
+
+from protojson.error import PbDecodeError
+from protojson.pbliteserializer import (
+	KIND_BOOL, KIND_ENUM, KIND_MESSAGE, LABEL_REQUIRED, _convertToBool,
+	_decodeBase64, _encodeBase64, _ensureValidEnum, _getFieldsByDescriptor)
+
+from google.protobuf.descriptor import FieldDescriptor
+
+_postImportVars = vars().keys()
+
+
+CPPTYPE_FLOAT = FieldDescriptor.CPPTYPE_FLOAT
+CPPTYPE_DOUBLE = FieldDescriptor.CPPTYPE_DOUBLE
+CPPTYPE_STRING = FieldDescriptor.CPPTYPE_STRING
+TYPE_BYTES = FieldDescriptor.TYPE_BYTES
+
+_INFINITY = float('inf')
+
+
+def _encodeFloat(value):
+	# Same as the json module with allow_nan=True.
+	if value != value:
+		return 'NaN'
+	elif value == _INFINITY:
+		return 'Infinity'
+	elif value == -_INFINITY:
+		return '-Infinity'
+	return repr(value)
+
+
+def _encodeBool(value):
+	# Booleans are serialized in numeric form.
+	return value and '1' or '0'
+
+
+def _getStringEncoder(encoding):
+	"""
+	Returns a function that encodes a C{str} or C{unicode} to an ASCII JSON
+	string literal, decoding C{str}s with C{encoding} first.
+
+	protobuf C{bytes} fields hold C{str}s, and non-UTF-8 C{str}s can't be
+	decoded as UTF-8, so (as with C{simplejson.dumps}) you might need to
+	pass C{encoding='latin-1'}.
+	"""
+	def encodeString(value):
+		if isinstance(value, str):
+			value = value.decode(encoding)
+		return encode_basestring_ascii(value)
+	return encodeString
+
+
+def _encodeBase64String(value):
+	# Base64 has no characters that need escaping.
+	return '"' + _encodeBase64(value) + '"'
+
+
+def _getScalarEncoder(kind, field, encodeString, base64Bytes):
+	if kind == KIND_BOOL:
+		return _encodeBool
+	cppType = field.cpp_type
+	if cppType in (CPPTYPE_FLOAT, CPPTYPE_DOUBLE):
+		return _encodeFloat
+	elif cppType == CPPTYPE_STRING:
+		if base64Bytes and field.type == TYPE_BYTES:
+			return _encodeBase64String
+		return encodeString
+	else:
+		# ints, longs, and enums
+		return str
+
+
+def _makeSeparators(fields, fillerJson):
+	"""
+	Returns a C{tuple} of the JSON text that goes before each of
+	C{fields} (items from L{_MessagePlan.fields}, sorted by tag) in a
+	PbLite list that has only those fields.  The text after the last
+	field is always ']'.
+	"""
+	separators = []
+	previousTag = -1
+	for fieldPlan in fields:
+		tag = fieldPlan[0]
+		fillers = (fillerJson + ',') * (tag - previousTag - 1)
+		if previousTag == -1:
+			separators.append('[' + fillers)
+		else:
+			separators.append(',' + fillers)
+		previousTag = tag
+	return tuple(separators)
+
+
+# (plan, fillerJson) -> _makeSeparators for all of plan.fields
+_separators = {}
+
+
+def _getSeparators(plan, fillerJson):
+	key = (plan, fillerJson)
+	try:
+		return _separators[key]
+	except KeyError:
+		separators = _separators[key] = _makeSeparators(plan.fields, fillerJson)
+		return separators
+
+
+def iterencode(plan, message, fillerValue=None, encoding='utf-8', bufferSize=512,
+base64Bytes=False, omitUnset=False, maxDepth=None):
+	"""
+	Yields C{str} chunks of ASCII JSON text which together are the PbLite
+	serialization of C{message}, of the type described by C{plan}.
+
+	C{fillerValue} is the object to use for unpopulated indices.
+	C{encoding} is used to decode C{str} values (usually from C{bytes}
+	fields).  About C{bufferSize} JSON fragments are joined into each
+	chunk.  If C{base64Bytes} is true, C{bytes} fields are written as
+	base64 strings instead.  If C{omitUnset} is true, only populated
+	fields are written, as L{PbLiteSerializer} does with C{omitUnset}.
+
+	If C{maxDepth} is not C{None}, messages nested deeper than that
+	(counting C{message} as 1) raise L{PbDecodeError}.
+	"""
+	fillerJson = dumps(fillerValue)
+	encodeString = _getStringEncoder(encoding)
+	# FieldDescriptor -> encoder
+	scalarEncoders = {}
+
+	def getFields(plan, obj):
+		"""
+		Returns C{(fields, separators)} for the fields of C{obj} to write.
+		"""
+		if not omitUnset:
+			return plan.fields, _getSeparators(plan, fillerJson)
+		fieldsByDescriptor = _getFieldsByDescriptor(plan)
+		# ListFields is sorted by tag, and includes extensions.
+		fields = tuple(fieldsByDescriptor[field]
+			for field, value in obj.ListFields() if field in fieldsByDescriptor)
+		return fields, _makeSeparators(fields, fillerJson)
+
+	def pushMessage(plan, obj, depth):
+		"""
+		Pushes a frame for message C{obj}, or writes it if it is empty.
+		"""
+		if maxDepth is not None and depth > maxDepth:
+			raise PbDecodeError("Message %r is nested more than %d "
+				"deep" % (obj, maxDepth))
+		fields, separators = getFields(plan, obj)
+		if fields:
+			stack.append([fields, obj, 0, separators, depth])
+		else:
+			append('[]')
+
+	parts = []
+	append = parts.append
+	# Each frame is a list.  Message frames are [fields to write, message,
+	# index of the next field, separators, depth].  Repeated-message frames
+	# are [childPlan, iterator over the children, whether a child was
+	# written, None, depth of the children] and the children are separated
+	# by commas.
+	stack = []
+	pushMessage(plan, message, 1)
+	while stack:
+		if len(parts) >= bufferSize:
+			yield ''.join(parts)
+			del parts[:]
+		frame = stack[-1]
+		fields, obj, index, separators, depth = frame
+		if separators is None:
+			# Repeated message frame
+			for child in obj:
+				if index:
+					append(',')
+				index = frame[2] = 1
+				pushMessage(fields, child, depth)
+				if stack[-1] is not frame:
+					break
+			else:
+				append(']')
+				stack.pop()
+			continue
+
+		nFields = len(fields)
+		while index < nFields:
+			tag, name, kind, repeated, enumValues, childPlan, field = fields[index]
+			append(separators[index])
+			index += 1
+			value = getattr(obj, name)
+			if kind == KIND_MESSAGE:
+				frame[2] = index
+				if repeated:
+					append('[')
+					stack.append([childPlan, iter(value), 0, None, depth + 1])
+					break
+				pushMessage(childPlan, value, depth + 1)
+				if stack[-1] is not frame:
+					break
+				continue
+			try:
+				encode = scalarEncoders[field]
+			except KeyError:
+				encode = scalarEncoders[field] = _getScalarEncoder(
+					kind, field, encodeString, base64Bytes)
+			if repeated:
+				append('[' + ','.join(map(encode, value)) + ']')
+			else:
+				append(encode(value))
+		else:
+			append(']')
+			stack.pop()
+
+	if parts:
+		yield ''.join(parts)
+
+
+
+# What the decoder expects next.
+_EXPECT_VALUE = 0
+_EXPECT_VALUE_OR_END = 1 # right after a '['
+_EXPECT_COMMA_OR_END = 2
+_EXPECT_KEY = 3
+_EXPECT_KEY_OR_END = 4 # right after a '{'
+_EXPECT_COLON = 5
+_EXPECT_NOTHING = 6 # the top-level value is done
+
+# Kinds of decoder stack frames.
+_FRAME_MESSAGE = 0
+_FRAME_REPEATED = 1
+_FRAME_REPEATED_MESSAGE = 2
+_FRAME_SKIP_ARRAY = 3
+_FRAME_SKIP_OBJECT = 4
+
+_whitespaceRe = re.compile(r'[ \t\n\r]*')
+_numberRe = re.compile(r'-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?')
+_numberCharsRe = re.compile(r'[-+.eE0-9]*')
+_endOfStringRe = re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL)
+_literals = {
+	u'true': True,
+	u'false': False,
+	u'null': None,
+	u'NaN': float('nan'),
+	u'Infinity': _INFINITY,
+	u'-Infinity': -_INFINITY,
+}
+
+# _MessagePlan -> {tag: fieldPlan}
+_fieldsByTag = {}
+
+
+def _getFieldsByTag(plan):
+	try:
+		return _fieldsByTag[plan]
+	except KeyError:
+		fieldsByTag = _fieldsByTag[plan] = dict(
+			(fieldPlan[0], fieldPlan) for fieldPlan in plan.fields)
+		return fieldsByTag
+
+
+class PbLiteDecoder(object):
+	"""
+	An incremental decoder which populates a protobuf Message from PbLite
+	JSON text.  Call L{feed} with each chunk of text, then L{close}.
+
+	Values are validated exactly like
+	L{protojson.pbliteserializer.PbLiteSerializer.deserialize} validates
+	the result of C{json.loads}.  Any problem raises L{PbDecodeError} as
+	soon as it is seen, with the character offset of the problem in its
+	message; after that, the decoder can't be used.
+	"""
+	__slots__ = (
+		'message', '_plan', '_encoding', '_omitUnset', '_base64Bytes',
+		'_maxDepth', '_depth', '_decoder', '_buffer',
+		'_offset', '_expect', '_stack', '_failed')
+
+	def __init__(self, plan, message, encoding='utf-8', omitUnset=False,
+	base64Bytes=False, maxDepth=100):
+		"""
+		C{plan} is the L{protojson.pbliteserializer._MessagePlan} for
+		C{message}, a L{google.protobuf.message.Message}, which is cleared
+		now and populated while text is fed.
+
+		C{str} chunks are decoded as UTF-8.  Strings for C{bytes} fields are
+		encoded with C{encoding}, the reverse of what L{iterencode} does.
+
+		C{omitUnset}, C{base64Bytes}, and C{maxDepth} have the same
+		meaning as for L{PbLiteSerializer}.
+		"""
+		message.Clear()
+		self.message = message
+		self._plan = plan
+		self._encoding = encoding
+		self._omitUnset = omitUnset
+		self._base64Bytes = base64Bytes
+		self._maxDepth = maxDepth
+		# The number of _FRAME_MESSAGEs on self._stack
+		self._depth = 0
+		self._decoder = codecs.getincrementaldecoder('utf-8')()
+		self._buffer = u''
+		# The offset of self._buffer[0] in the whole text.
+		self._offset = 0
+		self._expect = _EXPECT_VALUE
+		self._stack = []
+		self._failed = False
+
+
+	def _error(self, pos, reason):
+		self._failed = True
+		raise PbDecodeError("%s at offset %d" % (reason, self._offset + pos))
+
+
+	def _pushMessage(self, plan, message):
+		"""
+		Pushes a L{_FRAME_MESSAGE} for C{message}.  Returns an error
+		reason or C{None}.
+		"""
+		self._depth += 1
+		if self._depth > self._maxDepth:
+			return "Message %r is nested more than %d deep" % (
+				message, self._maxDepth)
+		self._stack.append([_FRAME_MESSAGE, plan, message, 0])
+		return None
+
+
+	def _beginArray(self):
+		"""
+		Handles a '[' where a value was expected.  Returns an error
+		reason or C{None}.
+		"""
+		stack = self._stack
+		if not stack:
+			return self._pushMessage(self._plan, self.message)
+		frame = stack[-1]
+		frameKind = frame[0]
+		if frameKind == _FRAME_MESSAGE:
+			fieldPlan = _getFieldsByTag(frame[1]).get(frame[3])
+			frame[3] += 1
+			if fieldPlan is None:
+				stack.append([_FRAME_SKIP_ARRAY])
+				return None
+			tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+			if repeated:
+				if kind == KIND_MESSAGE:
+					stack.append([_FRAME_REPEATED_MESSAGE, childPlan,
+						getattr(frame[2], name)])
+				else:
+					stack.append([_FRAME_REPEATED, fieldPlan,
+						getattr(frame[2], name)])
+			elif kind == KIND_MESSAGE:
+				child = getattr(frame[2], name)
+				if self._omitUnset:
+					# Populated even if the nested message is empty.
+					child.SetInParent()
+				return self._pushMessage(childPlan, child)
+			else:
+				return "Expected a value for %r but found a list" % (field,)
+		elif frameKind == _FRAME_REPEATED_MESSAGE:
+			return self._pushMessage(frame[1], frame[2].add())
+		elif frameKind == _FRAME_REPEATED:
+			return "Expected a value for %r but found a list" % (frame[1][6],)
+		else:
+			stack.append([_FRAME_SKIP_ARRAY])
+		return None
+
+
+	def _beginObject(self):
+		stack = self._stack
+		if stack:
+			frame = stack[-1]
+			if frame[0] == _FRAME_MESSAGE:
+				if frame[3] not in _getFieldsByTag(frame[1]):
+					frame[3] += 1
+					stack.append([_FRAME_SKIP_OBJECT])
+					return None
+			elif frame[0] in (_FRAME_SKIP_ARRAY, _FRAME_SKIP_OBJECT):
+				stack.append([_FRAME_SKIP_OBJECT])
+				return None
+		return "Expected a list or value but found an object"
+
+
+	def _endArray(self):
+		frame = self._stack.pop()
+		if frame[0] == _FRAME_MESSAGE:
+			self._depth -= 1
+			plan = frame[1]
+			if frame[3] < plan.length:
+				for fieldPlan in plan.fields:
+					if fieldPlan[0] >= frame[3]:
+						if self._omitUnset:
+							if fieldPlan[6].label != LABEL_REQUIRED:
+								continue
+							return ("For message %r required field at "
+								"index %r was missing." % (frame[2], fieldPlan[0]))
+						# Raise even if it was an optional field.
+						return ("For message %r expected index "
+							"%r but it was missing." % (frame[2], fieldPlan[0]))
+		return None
+
+
+	def _value(self, value):
+		"""
+		Handles a scalar C{value} where a value was expected.  Returns an
+		error reason or C{None}.
+		"""
+		stack = self._stack
+		if not stack:
+			return "Expected a list but found a %r" % (type(value),)
+		frame = stack[-1]
+		frameKind = frame[0]
+		if frameKind == _FRAME_MESSAGE:
+			fieldPlan = _getFieldsByTag(frame[1]).get(frame[3])
+			frame[3] += 1
+			if fieldPlan is None:
+				return None
+			tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+			if value is None and self._omitUnset:
+				if field.label == LABEL_REQUIRED:
+					return ("For message %r required field at "
+						"index %r was missing." % (frame[2], tag))
+				return None
+			if repeated or kind == KIND_MESSAGE:
+				return ("Expected an iterable object but "
+					"found a %r" % (type(value),))
+			if kind == KIND_BOOL:
+				value = _convertToBool(value)
+			elif kind == KIND_ENUM:
+				_ensureValidEnum(field, enumValues, value)
+			elif field.type == TYPE_BYTES and value is not None:
+				if self._base64Bytes:
+					value = _decodeBase64(value)
+				elif isinstance(value, unicode):
+					value = value.encode(self._encoding)
+			try:
+				setattr(frame[2], name, value)
+			except (TypeError, ValueError), e:
+				return str(e)
+		elif frameKind == _FRAME_REPEATED:
+			tag, name, kind, repeated, enumValues, childPlan, field = frame[1]
+			if kind == KIND_BOOL:
+				value = _convertToBool(value)
+			elif kind == KIND_ENUM:
+				_ensureValidEnum(field, enumValues, value)
+			elif field.type == TYPE_BYTES and value is not None:
+				if self._base64Bytes:
+					value = _decodeBase64(value)
+				elif isinstance(value, unicode):
+					value = value.encode(self._encoding)
+			try:
+				frame[2].append(value)
+			except (TypeError, ValueError), e:
+				return str(e)
+		elif frameKind == _FRAME_REPEATED_MESSAGE:
+			return ("Expected an iterable object but "
+				"found a %r" % (type(value),))
+		return None
+
+
+	def _afterValue(self):
+		if self._stack:
+			return _EXPECT_COMMA_OR_END
+		return _EXPECT_NOTHING
+
+
+	def _parse(self, final):
+		buf = self._buffer
+		n = len(buf)
+		pos = 0
+		expect = self._expect
+		stack = self._stack
+		while True:
+			pos = _whitespaceRe.match(buf, pos).end()
+			if pos == n:
+				break
+			# Errors are reported at the start of the token.
+			start = pos
+			c = buf[pos]
+			if expect == _EXPECT_NOTHING:
+				self._error(pos, "Expected end of input")
+			try:
+				if c == '[':
+					if expect not in (_EXPECT_VALUE, _EXPECT_VALUE_OR_END):
+						self._error(pos, "Unexpected '['")
+					reason = self._beginArray()
+					expect = _EXPECT_VALUE_OR_END
+					pos += 1
+				elif c == '{':
+					if expect not in (_EXPECT_VALUE, _EXPECT_VALUE_OR_END):
+						self._error(pos, "Unexpected '{'")
+					reason = self._beginObject()
+					expect = _EXPECT_KEY_OR_END
+					pos += 1
+				elif c == ']':
+					if expect not in (_EXPECT_COMMA_OR_END, _EXPECT_VALUE_OR_END) \
+					or stack[-1][0] == _FRAME_SKIP_OBJECT:
+						self._error(pos, "Unexpected ']'")
+					reason = self._endArray()
+					expect = self._afterValue()
+					pos += 1
+				elif c == '}':
+					if expect not in (_EXPECT_COMMA_OR_END, _EXPECT_KEY_OR_END) \
+					or stack[-1][0] != _FRAME_SKIP_OBJECT:
+						self._error(pos, "Unexpected '}'")
+					stack.pop()
+					reason = None
+					expect = self._afterValue()
+					pos += 1
+				elif c == ',':
+					if expect != _EXPECT_COMMA_OR_END:
+						self._error(pos, "Unexpected ','")
+					if stack[-1][0] == _FRAME_SKIP_OBJECT:
+						expect = _EXPECT_KEY
+					else:
+						expect = _EXPECT_VALUE
+					reason = None
+					pos += 1
+				elif c == ':':
+					if expect != _EXPECT_COLON:
+						self._error(pos, "Unexpected ':'")
+					expect = _EXPECT_VALUE
+					reason = None
+					pos += 1
+				elif c == '"':
+					match = _endOfStringRe.match(buf, pos + 1)
+					if match is None:
+						if final:
+							self._error(pos, "Unterminated string")
+						break
+					try:
+						value, end = scanstring(buf[pos:match.end()], 1)
+					except ValueError, e:
+						self._error(pos, str(e))
+					if expect in (_EXPECT_KEY, _EXPECT_KEY_OR_END):
+						expect = _EXPECT_COLON
+						reason = None
+					elif expect in (_EXPECT_VALUE, _EXPECT_VALUE_OR_END):
+						reason = self._value(value)
+						expect = self._afterValue()
+					else:
+						self._error(pos, "Unexpected string")
+					pos = match.end()
+				else:
+					if expect not in (_EXPECT_VALUE, _EXPECT_VALUE_OR_END):
+						self._error(pos, "Unexpected %r" % (c,))
+					if not final and _numberCharsRe.match(buf, pos).end() == n:
+						# The number might not be complete.
+						break
+					match = _numberRe.match(buf, pos)
+					if match is not None:
+						end = match.end()
+						fraction, exponent = match.groups()
+						text = match.group()
+						if fraction or exponent:
+							value = float(text)
+						else:
+							value = int(text)
+					else:
+						for literal, value in _literals.iteritems():
+							if buf.startswith(literal, pos):
+								end = pos + len(literal)
+								break
+						else:
+							rest = buf[pos:]
+							if not final and [literal for literal in _literals
+							if literal.startswith(rest)]:
+								break
+							self._error(pos, "Invalid JSON value")
+					reason = self._value(value)
+					expect = self._afterValue()
+					pos = end
+			except PbDecodeError, e:
+				if self._failed:
+					raise
+				self._error(start, str(e))
+			except UnicodeError, e:
+				self._error(start, str(e))
+			if reason is not None:
+				self._error(start, reason)
+
+		self._expect = expect
+		self._buffer = buf[pos:]
+		self._offset += pos
+
+
+	def feed(self, data):
+		"""
+		Decodes the next chunk of JSON text, C{data}, a C{str} or
+		C{unicode}.  Fields whose values are complete are set on the
+		message.
+		"""
+		if self._failed:
+			raise PbDecodeError("This decoder has already failed")
+		if isinstance(data, str):
+			try:
+				data = self._decoder.decode(data)
+			except UnicodeDecodeError, e:
+				self._error(len(self._buffer), str(e))
+		self._buffer += data
+		self._parse(False)
+
+
+	def close(self):
+		"""
+		Signals the end of the text, and returns the populated message.
+		Raises L{PbDecodeError} if the text was incomplete.
+		"""
+		if self._failed:
+			raise PbDecodeError("This decoder has already failed")
+		try:
+			self._buffer += self._decoder.decode('', True)
+		except UnicodeDecodeError, e:
+			self._error(len(self._buffer), str(e))
+		self._parse(True)
+		if self._expect != _EXPECT_NOTHING:
+			self._error(len(self._buffer), "Unexpected end of input")
+		return self.message
@@ -20,9 +20,12 @@ populated messages with tag numbers that are not continuous (and/or are very
 large) will have many (empty) spots and thus, are inefficient.
 """
 
+import array
+import binascii
 import sys
 
 from protojson.error import PbDecodeError
+from protojson.metrics import timer
 
 from google.protobuf.descriptor import FieldDescriptor
 
@@ -33,10 +36,30 @@ TYPE_BOOL = FieldDescriptor.TYPE_BOOL
 TYPE_MESSAGE = FieldDescriptor.TYPE_MESSAGE
 TYPE_GROUP = FieldDescriptor.TYPE_GROUP
 TYPE_ENUM = FieldDescriptor.TYPE_ENUM
+TYPE_STRING = FieldDescriptor.TYPE_STRING
+TYPE_BYTES = FieldDescriptor.TYPE_BYTES
 LABEL_REPEATED = FieldDescriptor.LABEL_REPEATED
+LABEL_REQUIRED = FieldDescriptor.LABEL_REQUIRED
+
+CPPTYPE_INT32 = FieldDescriptor.CPPTYPE_INT32
+CPPTYPE_INT64 = FieldDescriptor.CPPTYPE_INT64
+CPPTYPE_UINT32 = FieldDescriptor.CPPTYPE_UINT32
+CPPTYPE_UINT64 = FieldDescriptor.CPPTYPE_UINT64
+CPPTYPE_DOUBLE = FieldDescriptor.CPPTYPE_DOUBLE
+CPPTYPE_FLOAT = FieldDescriptor.CPPTYPE_FLOAT
+CPPTYPE_ENUM = FieldDescriptor.CPPTYPE_ENUM
+CPPTYPE_STRING = FieldDescriptor.CPPTYPE_STRING
+CPPTYPE_BOOL = FieldDescriptor.CPPTYPE_BOOL
 
 MESSAGE_OR_GROUP = (TYPE_MESSAGE, TYPE_GROUP)
 
+# The kinds of fields in a L{_MessagePlan}.  Everything that isn't a bool,
+# an enum, or a Message/Group is passed through unchanged.
+KIND_SCALAR = 0
+KIND_BOOL = 1
+KIND_ENUM = 2
+KIND_MESSAGE = 3
+
 
 def _convertToBool(obj):
 	if obj not in (0, 1):
@@ -45,17 +68,174 @@ def _convertToBool(obj):
 	return (obj == 1)
 
 
-def _ensureValidEnum(field, obj):
+def _ensureValidEnum(field, enumValues, obj):
 	# Protocol Buffers' Python module (as of 2010-07-18) allows setting
 	# an enum field to an invalid value.  This can lead to all sorts of
 	# terrible bugs.  Here we dig into the field and check if the value is
 	# allowed.  I filed a bug to get this fixed in protobuf:
 	# http://web.archive.org/web/20130727145204/http://code.google.com/p/protobuf/issues/detail?id=206
-	if obj not in field.enum_type.values_by_number:
+	try:
+		valid = obj in enumValues
+	except TypeError:
+		# An unhashable value
+		valid = False
+	if not valid:
 		raise PbDecodeError("Expected a valid value for "
 			"%r, but didn't get one." % (field,))
 
 
+_BOOL_VALUES = frozenset([0, 1])
+
+
+def _convertBools(values):
+	"""
+	Like L{_convertToBool}, but for a whole C{list} of values.
+	"""
+	try:
+		valid = _BOOL_VALUES.issuperset(values)
+	except TypeError:
+		# An unhashable value
+		valid = False
+	if not valid:
+		for value in values:
+			_convertToBool(value)
+	return [value == 1 for value in values]
+
+
+def _ensureValidEnums(field, enumValues, values):
+	"""
+	Like L{_ensureValidEnum}, but for a whole C{list} of values.
+	"""
+	try:
+		valid = enumValues.issuperset(values)
+	except TypeError:
+		# An unhashable value
+		valid = False
+	if not valid:
+		raise PbDecodeError("Expected valid values for "
+			"%r, but didn't get them." % (field,))
+
+
+def _getIntChecker(minimum, maximum, normalize):
+	def checkInt(obj):
+		if not isinstance(obj, (int, long)):
+			raise PbDecodeError("Expected an int or long but "
+				"found a %r" % (type(obj),))
+		if not minimum <= obj <= maximum:
+			raise PbDecodeError("Value out of range: %d" % (obj,))
+		return normalize(obj)
+	return checkInt
+
+
+def _checkFloat(obj):
+	if not isinstance(obj, (float, int, long)):
+		raise PbDecodeError("Expected a float, int, or long but "
+			"found a %r" % (type(obj),))
+	return obj
+
+
+def _checkString(obj):
+	# Like protobuf, accept unicode, and str only if it is ASCII.
+	if isinstance(obj, unicode):
+		return obj
+	if not isinstance(obj, str):
+		raise PbDecodeError("Expected a unicode or str but "
+			"found a %r" % (type(obj),))
+	try:
+		return obj.decode('ascii')
+	except UnicodeDecodeError:
+		raise PbDecodeError("Expected an ASCII str but found %.1024r" % (obj,))
+
+
+def _checkBytes(obj):
+	if not isinstance(obj, str):
+		raise PbDecodeError("Expected a str but "
+			"found a %r" % (type(obj),))
+	return obj
+
+
+def _encodeBase64(value):
+	# b2a_base64 appends a newline.
+	return binascii.b2a_base64(value)[:-1]
+
+
+def _decodeBase64(obj):
+	"""
+	Returns the C{str} encoded by base64 C{str} or C{unicode} C{obj}, or
+	raises L{PbDecodeError}.
+	"""
+	if isinstance(obj, unicode):
+		try:
+			obj = obj.encode('ascii')
+		except UnicodeEncodeError:
+			raise PbDecodeError("Expected a base64 string but found %.1024r" % (obj,))
+	elif not isinstance(obj, str):
+		raise PbDecodeError("Expected a base64 unicode or str but "
+			"found a %r" % (type(obj),))
+	try:
+		return binascii.a2b_base64(obj)
+	except binascii.Error, e:
+		raise PbDecodeError("Expected a base64 string but found "
+			"%.1024r (%s)" % (obj, e))
+
+
+_checkers = {
+	CPPTYPE_INT32: _getIntChecker(-2**31, 2**31 - 1, int),
+	CPPTYPE_INT64: _getIntChecker(-2**63, 2**63 - 1, long),
+	CPPTYPE_UINT32: _getIntChecker(0, 2**32 - 1, int),
+	CPPTYPE_UINT64: _getIntChecker(0, 2**64 - 1, long),
+	CPPTYPE_DOUBLE: _checkFloat,
+	CPPTYPE_FLOAT: _checkFloat,
+	CPPTYPE_ENUM: _getIntChecker(-2**31, 2**31 - 1, int),
+}
+
+
+def _getChecker(fieldPlan, base64Bytes=False):
+	"""
+	Returns a function that takes a deserialized value for the
+	non-Message field C{fieldPlan} (an item from L{_MessagePlan.fields})
+	and returns what protobuf would store for it, or raises
+	L{PbDecodeError} if protobuf (or our own bool and enum checks) would
+	reject the value.  This is for code that validates PbLite data
+	without setting it on a Message.  If C{base64Bytes} is true, values
+	for C{bytes} fields are base64 strings, as with L{PbLiteSerializer}'s
+	C{base64Bytes}.
+	"""
+	tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+	if kind == KIND_BOOL:
+		return _convertToBool
+	elif kind == KIND_ENUM:
+		checkInt = _checkers[CPPTYPE_ENUM]
+		def checkEnum(obj):
+			obj = checkInt(obj)
+			_ensureValidEnum(field, enumValues, obj)
+			return obj
+		return checkEnum
+	elif field.cpp_type == CPPTYPE_STRING:
+		if field.type == TYPE_STRING:
+			return _checkString
+		elif base64Bytes:
+			return _decodeBase64
+		return _checkBytes
+	return _checkers[field.cpp_type]
+
+
+# (FieldDescriptor, base64Bytes) -> checker from _getChecker
+_fieldCheckers = {}
+
+
+def _getFieldChecker(fieldPlan, base64Bytes=False):
+	"""
+	Like L{_getChecker}, but returns the same function each time.
+	"""
+	key = (fieldPlan[6], base64Bytes)
+	try:
+		return _fieldCheckers[key]
+	except KeyError:
+		checker = _fieldCheckers[key] = _getChecker(fieldPlan, base64Bytes)
+		return checker
+
+
 def _getIterator(obj):
 	"""
 	Returns C{obj.__iter__()} or raises a L{PbDecodeError}.
@@ -67,127 +247,1018 @@ def _getIterator(obj):
 			"found a %r" % (type(obj),))
 
 
+def _getItems(obj):
+	"""
+	Returns C{obj.iteritems()} or raises a L{PbDecodeError}.
+	"""
+	try:
+		return obj.iteritems()
+	except (TypeError, AttributeError):
+		raise PbDecodeError("Expected a dict but "
+			"found a %r" % (type(obj),))
+
+
+def _getList(obj):
+	"""
+	Returns a C{list} of the items in C{obj}, or raises a L{PbDecodeError}
+	if it isn't iterable.  C{array.array}s and NumPy arrays are converted
+	with their C{tolist}, which gives Python numbers.
+	"""
+	if obj.__class__ is list:
+		return obj
+	tolist = getattr(obj, 'tolist', None)
+	if tolist is not None:
+		return tolist()
+	return list(_getIterator(obj))
+
+
+def _setScalarField(message, fieldPlan, data, base64Bytes=False):
+	"""
+	Validates C{data} for the non-Message field described by C{fieldPlan}
+	(a C{list} of values for a repeated field) and puts it into
+	L{google.protobuf.message.Message} C{message}, or raises
+	L{PbDecodeError}.  C{base64Bytes} has the same meaning as for
+	L{PbLiteSerializer}.
+	"""
+	tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+	if repeated:
+		# Validate and add the whole list at once.
+		values = _getList(data)
+		if kind == KIND_BOOL:
+			values = _convertBools(values)
+		elif kind == KIND_ENUM:
+			_ensureValidEnums(field, enumValues, values)
+		elif base64Bytes and field.type == TYPE_BYTES:
+			values = map(_decodeBase64, values)
+		try:
+			getattr(message, name).extend(values)
+		except (TypeError, ValueError), e:
+			raise PbDecodeError(str(e))
+		return
+	if kind == KIND_BOOL:
+		data = _convertToBool(data)
+	elif kind == KIND_ENUM:
+		_ensureValidEnum(field, enumValues, data)
+	elif base64Bytes and field.type == TYPE_BYTES and data is not None:
+		data = _decodeBase64(data)
+	# Because setattr(..., ..., None) for optional fields is okay, we
+	# don't need our own branching here.
+	try:
+		setattr(message, name, data)
+	except (TypeError, ValueError), e:
+		raise PbDecodeError(str(e))
+
+
+def _get64BitTypecode(typecodes):
+	# Use a 64-bit typecode only if this platform has one.
+	for typecode in typecodes:
+		try:
+			if array.array(typecode).itemsize == 8:
+				return typecode
+		except ValueError:
+			# 'q' and 'Q' are new in Python 3.3.
+			pass
+	return None
+
+
+# CPPTYPE -> (array.array typecode or None, NumPy dtype name)
+_arrayTypes = {
+	CPPTYPE_INT32: ('i', 'int32'),
+	CPPTYPE_ENUM: ('i', 'int32'),
+	CPPTYPE_UINT32: ('I', 'uint32'),
+	CPPTYPE_INT64: (_get64BitTypecode('lq'), 'int64'),
+	CPPTYPE_UINT64: (_get64BitTypecode('LQ'), 'uint64'),
+	# Python floats are doubles, even for float fields.
+	CPPTYPE_FLOAT: ('d', 'float64'),
+	CPPTYPE_DOUBLE: ('d', 'float64'),
+	# Booleans are serialized in numeric form.
+	CPPTYPE_BOOL: ('b', 'int8'),
+}
+
+
+class _MessagePlan(object):
+	"""
+	Everything the serializer needs to know about a message type, computed
+	once from its L{google.protobuf.descriptor.Descriptor}.
+
+	C{length} is the length of the PbLite list for this message type
+	(the highest tag number + 1, or 0 if there are no fields).
+
+	C{fields} is a C{tuple} of C{(tag, name, kind, repeated, enumValues,
+	childPlan, field)} tuples sorted by tag, where C{kind} is one of the
+	C{KIND_*} constants, C{enumValues} is a C{frozenset} of valid numbers
+	for enum fields (C{None} otherwise), C{childPlan} is the
+	L{_MessagePlan} for Message/Group fields (C{None} otherwise), and
+	C{field} is the L{google.protobuf.descriptor.FieldDescriptor}.
+
+	C{specialized} is C{None} until L{protojson.codegen} has been asked for
+	this type's generated functions, and then either a C{(serialize,
+	deserialize)} tuple or C{False} if the type can't be specialized.
+	"""
+	__slots__ = ('descriptor', 'length', 'fields', 'specialized')
+
+	def __init__(self, descriptor):
+		self.descriptor = descriptor
+		self.length = 0
+		self.fields = ()
+		self.specialized = None
+
+
+	def __repr__(self):
+		return '<%s for %s>' % (self.__class__.__name__, self.descriptor.full_name)
+
+
+
+# Descriptor -> _MessagePlan.  Plans are never evicted; there is one per
+# message type, and message types are not garbage.
+_plans = {}
+
+
+def _buildPlan(descriptor, building):
+	plan = _MessagePlan(descriptor)
+	# Register before building the children, so that recursive message
+	# types refer to the plan that is being built.
+	building[descriptor] = plan
+	fields = []
+	for tag, field in sorted(descriptor.fields_by_number.iteritems()):
+		enumValues = None
+		childPlan = None
+		if field.type == TYPE_BOOL:
+			kind = KIND_BOOL
+		elif field.type == TYPE_ENUM:
+			kind = KIND_ENUM
+			enumValues = frozenset(field.enum_type.values_by_number)
+		elif field.type in MESSAGE_OR_GROUP:
+			kind = KIND_MESSAGE
+			childDescriptor = field.message_type
+			childPlan = _plans.get(childDescriptor) or building.get(childDescriptor)
+			if childPlan is None:
+				childPlan = _buildPlan(childDescriptor, building)
+		else:
+			kind = KIND_SCALAR
+		repeated = (field.label == LABEL_REPEATED)
+		fields.append((tag, field.name, kind, repeated, enumValues, childPlan, field))
+	if fields:
+		plan.length = fields[-1][0] + 1
+	plan.fields = tuple(fields)
+	return plan
+
+
+# _MessagePlan -> {FieldDescriptor: fieldPlan}
+_fieldsByDescriptor = {}
+
+
+def _getFieldsByDescriptor(plan):
+	"""
+	Returns a C{dict} mapping each L{FieldDescriptor} in C{plan} to its
+	item in L{_MessagePlan.fields}.
+	"""
+	try:
+		return _fieldsByDescriptor[plan]
+	except KeyError:
+		fieldsByDescriptor = _fieldsByDescriptor[plan] = dict(
+			(fieldPlan[6], fieldPlan) for fieldPlan in plan.fields)
+		return fieldsByDescriptor
+
+
+# (_MessagePlan, keyByName) -> {key: fieldPlan}, with both int and str
+# tags as keys if not keyByName.
+_fieldsByKey = {}
+
+
+def _getFieldsByKey(plan, keyByName):
+	"""
+	Returns a C{dict} mapping the keys of C{plan}'s fields in an object
+	(see L{protojson.objectserializer}) to their items in
+	L{_MessagePlan.fields}: field names if C{keyByName}, and otherwise
+	tags, as both C{int}s and C{str}s.
+	"""
+	cacheKey = (plan, keyByName)
+	try:
+		return _fieldsByKey[cacheKey]
+	except KeyError:
+		pass
+	fieldsByKey = {}
+	for fieldPlan in plan.fields:
+		if keyByName:
+			fieldsByKey[fieldPlan[1]] = fieldPlan
+		else:
+			fieldsByKey[fieldPlan[0]] = fieldPlan
+			fieldsByKey[str(fieldPlan[0])] = fieldPlan
+	_fieldsByKey[cacheKey] = fieldsByKey
+	return fieldsByKey
+
+
+def _getSpecialized(plan):
+	"""
+	Returns C{(serialize, deserialize)} generated by L{protojson.codegen}
+	for C{plan}, or C{None} if the type can't be specialized.
+	"""
+	specialized = plan.specialized
+	if specialized is None:
+		# Imported here because protojson.codegen imports this module.
+		from protojson import codegen
+		specialized = codegen.getFunctions(plan)
+	return specialized or None
+
+
+# _MessagePlan -> the deepest nesting of its messages, or None if it is
+# unbounded
+_nestings = {}
+
+
+def _getNesting(plan, visiting=None):
+	"""
+	Returns the deepest message nesting (1 for a message with no Message
+	fields) that a message of the type described by C{plan} can have, or
+	C{None} if it is unbounded because of a recursive message type.
+	"""
+	try:
+		return _nestings[plan]
+	except KeyError:
+		pass
+	if visiting is None:
+		visiting = set()
+	elif plan in visiting:
+		return None
+	visiting.add(plan)
+	nesting = 1
+	for fieldPlan in plan.fields:
+		if fieldPlan[2] == KIND_MESSAGE:
+			childNesting = _getNesting(fieldPlan[5], visiting)
+			if childNesting is None:
+				nesting = None
+				break
+			nesting = max(nesting, childNesting + 1)
+	visiting.discard(plan)
+	_nestings[plan] = nesting
+	return nesting
+
+
+def _getPlan(descriptor):
+	"""
+	Returns the L{_MessagePlan} for L{google.protobuf.descriptor.Descriptor}
+	C{descriptor}, building (and caching) it if necessary.
+	"""
+	try:
+		return _plans[descriptor]
+	except KeyError:
+		pass
+	# Plans are published only after they are completely built, so that
+	# other threads never see a half-built plan.  If two threads race to
+	# build the same plans, both results are equivalent.
+	building = {}
+	plan = _buildPlan(descriptor, building)
+	_plans.update(building)
+	return plan
+
+
 class PbLiteSerializer(object):
 	"""
-	A port of Closure Library's goog.proto2.PbLiteSerializer, but without
-	the laziness.
+	A port of Closure Library's goog.proto2.PbLiteSerializer.  Deserializing
+	is eager unless you use L{deserializeLazy}.
 	"""
-	__slots__ = ('fillerValue',)
+	__slots__ = (
+		'fillerValue', 'specialize', 'omitUnset', 'repeatedArrays', 'metrics',
+		'cache', 'maxDepth', 'base64Bytes')
 
-	def __init__(self, fillerValue=None):
+	def __init__(self, fillerValue=None, specialize=False, omitUnset=False,
+	repeatedArrays=None, metrics=None, cache=None, maxDepth=100,
+	base64Bytes=False):
 		"""
 		C{fillerValue} is the object to use for unpopulated indices.  The
 		default is C{None}.
+
+		If C{specialize} is true, serialize and deserialize with functions
+		generated and compiled for each message type by
+		L{protojson.codegen}, falling back to the generic code for message
+		types that can't be specialized.  The results are the same either
+		way.
+
+		If C{omitUnset} is true, only populated fields are serialized:
+		unset fields (including empty repeated fields) get C{fillerValue},
+		and the list ends at the last populated field.  When deserializing,
+		C{None} and missing indices mean "unset", but a missing required
+		field is still an error.  Use this with a C{fillerValue} of C{None}.
+
+		If C{repeatedArrays} is C{'array'} or C{'numpy'}, repeated numeric
+		and bool fields are serialized as C{array.array}s or NumPy arrays
+		instead of C{list}s.  These are compact, but can't be passed to
+		C{simplejson.dumps}.  The deserializer accepts them regardless of
+		this setting.
+
+		If C{metrics} is not C{None}, every message that L{serialize},
+		L{deserialize}, L{serializeMany}, L{deserializeMany},
+		L{serializeInSteps}, or L{deserializeInSteps} handles is timed,
+		counted, and reported to it; see L{protojson.metrics}.  The counts
+		are taken by the generic code, so C{specialize} is not used with
+		C{metrics}.
+
+		If C{cache} is a L{protojson.memo.SubMessageCache}, nested messages
+		are serialized only if they aren't in it.
+
+		C{maxDepth} is the deepest message nesting (counting the top-level
+		message as 1) that is serialized or deserialized; deeper messages
+		raise L{PbDecodeError}.  Nested messages are handled with an
+		explicit stack, not recursion, so this can be more than Python's
+		recursion limit.
+
+		If C{base64Bytes} is true, C{bytes} fields are serialized as base64
+		strings, and deserialized from them.  Unlike raw C{str}s, these
+		are always valid JSON strings, and they don't need a
+		C{'latin-1'} encoding that turns each byte >= 0x80 into a 6-byte
+		C{\\u00XX} escape.
 		"""
+		if repeatedArrays not in (None, 'array', 'numpy'):
+			raise ValueError("repeatedArrays must be None, 'array', "
+				"or 'numpy', not %r" % (repeatedArrays,))
 		self.fillerValue = fillerValue
+		self.specialize = specialize
+		self.omitUnset = omitUnset
+		self.repeatedArrays = repeatedArrays
+		self.metrics = metrics
+		self.cache = cache
+		self.maxDepth = maxDepth
+		self.base64Bytes = base64Bytes
 
 
-	def _getSerializedValue(self, field, value):
+	def _getSpecializedFunctions(self, plan):
 		"""
-		Returns the serialized form of the given value for the given field
-		if the field is a Message or Group and returns the value unchanged
-		otherwise (except serialize BOOLs as ints).
+		Returns C{plan}'s L{protojson.codegen} functions, or C{None} if
+		they can't be used (with this serializer's options, or at all).
 		"""
-		if field.type == TYPE_BOOL:
-			# Booleans are serialized in numeric form.
+		if (self.specialize and not self.omitUnset and
+		self.repeatedArrays is None and self.cache is None and
+		self.metrics is None):
+			# The generated functions recurse, so use them only if they
+			# can't go deeper than maxDepth.
+			nesting = _getNesting(plan)
+			if nesting is not None and nesting <= self.maxDepth:
+				return _getSpecialized(plan)
+		return None
+
+
+	def _packRepeated(self, field, values):
+		"""
+		Returns C{list} C{values} as an array of the type selected by
+		C{self.repeatedArrays}, if the field is numeric or bool.
+		"""
+		try:
+			typecode, dtype = _arrayTypes[field.cpp_type]
+		except KeyError:
+			return values
+		if self.repeatedArrays == 'numpy':
+			import numpy
+			return numpy.array(values, dtype=dtype)
+		elif typecode is None:
+			return values
+		return array.array(typecode, values)
+
+
+	def _serializeMessage(self, plan, message, counts=None, depth=1):
+		"""
+		Returns a C{list}, the serialized form of C{message}, which has
+		the type described by L{_MessagePlan} C{plan}.
+
+		If C{counts} is not C{None}, it is a C{list} C{[elements, depth]}
+		(see L{protojson.metrics}), which is updated for this message.
+		C{depth} is the nesting depth of C{message}.
+		"""
+		for serialized in self._serializeSteps(plan, message, None, counts, depth):
+			pass
+		return serialized
+
+
+	def _serializeSteps(self, plan, message, stepSize, counts=None, depth=1):
+		"""
+		Like L{_serializeMessage}, but a generator that yields C{None}
+		after every C{stepSize} field values or so (never, if C{stepSize}
+		is C{None}), and finally yields the serialized C{list}.
+		"""
+		fillerValue = self.fillerValue
+		omitUnset = self.omitUnset
+		repeatedArrays = self.repeatedArrays
+		cache = self.cache
+		maxDepth = self.maxDepth
+		base64Bytes = self.base64Bytes
+		counting = counts is not None
+		elements = deepest = 0
+		# The serialized form of message goes in result[0].
+		result = [None]
+		# (plan, message, list, index, depth): serialize message and put it
+		# in list[index].  (None, key, serialized, None, None): put the
+		# finished serialized message in the cache under key.
+		stack = [(plan, message, result, 0, depth)]
+		pop = stack.pop
+		push = stack.append
+		work = 0
+		while stack:
+			plan, message, parent, index, depth = pop()
+			if plan is None:
+				cache.put(message, parent)
+				continue
+			if depth > maxDepth:
+				raise PbDecodeError("Message %r is nested more than %d "
+					"deep" % (message, maxDepth))
+			key = None
+			if cache is not None and depth > 1:
+				key = cache.getKey(plan.descriptor, message)
+				if key is not None:
+					serialized = cache.get(key)
+					if serialized is not None:
+						parent[index] = serialized
+						continue
+			if omitUnset:
+				fieldsByDescriptor = _getFieldsByDescriptor(plan)
+				# ListFields is sorted by tag, and includes extensions.
+				listed = [(fieldsByDescriptor[field], value)
+					for field, value in message.ListFields() if field in fieldsByDescriptor]
+				if listed:
+					serialized = [fillerValue] * (listed[-1][0][0] + 1)
+				else:
+					serialized = []
+			else:
+				listed = [(fieldPlan, getattr(message, fieldPlan[1]))
+					for fieldPlan in plan.fields]
+				serialized = [fillerValue] * plan.length
+			parent[index] = serialized
+			work += len(listed)
+			if counting:
+				# A nested message from the cache counts as one value.
+				if depth > deepest:
+					deepest = depth
+				for fieldPlan, value in listed:
+					if fieldPlan[3]:
+						elements += len(value)
+					else:
+						elements += 1
+			if key is not None:
+				# Popped after all of the nested messages are done.
+				push((None, key, serialized, None, None))
+			# Nested messages are pushed last first, so that they are
+			# serialized in order (which matters to the cache).
+			for fieldPlan, value in reversed(listed):
+				tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+				if repeated:
+					if kind == KIND_MESSAGE:
+						children = serialized[tag] = list(value)
+						depth1 = depth + 1
+						for n in xrange(len(children) - 1, -1, -1):
+							push((childPlan, children[n], children, n, depth1))
+						continue
+					elif kind == KIND_BOOL:
+						# Booleans are serialized in numeric form.
+						serialized[tag] = [child and 1 or 0 for child in value]
+					elif base64Bytes and field.type == TYPE_BYTES:
+						serialized[tag] = map(_encodeBase64, value)
+					else:
+						serialized[tag] = list(value)
+					work += len(serialized[tag])
+					if repeatedArrays is not None:
+						serialized[tag] = self._packRepeated(field, serialized[tag])
+				else:
+					if kind == KIND_MESSAGE:
+						push((childPlan, value, serialized, tag, depth + 1))
+					elif kind == KIND_BOOL:
+						serialized[tag] = value and 1 or 0
+					elif base64Bytes and field.type == TYPE_BYTES:
+						serialized[tag] = _encodeBase64(value)
+					else:
+						serialized[tag] = value
+			if stepSize is not None and work >= stepSize:
+				work = 0
+				yield None
+		if counting:
+			counts[0] += elements
+			if deepest > counts[1]:
+				counts[1] = deepest
+		yield result[0]
+
+
+	def _serializeField(self, fieldPlan, value, counts=None, depth=1):
+		"""
+		Returns the serialized form of C{value}, the value of the field
+		described by C{fieldPlan} (an item from L{_MessagePlan.fields}) of
+		a message at nesting C{depth}.  C{counts} is updated for the
+		nested messages in it, as by L{_serializeMessage}.
+		"""
+		tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+		if repeated:
+			if kind == KIND_MESSAGE:
+				return [self._serializeMessage(childPlan, child, counts, depth + 1)
+					for child in value]
+			elif kind == KIND_BOOL:
+				values = [child and 1 or 0 for child in value]
+			elif self.base64Bytes and field.type == TYPE_BYTES:
+				values = map(_encodeBase64, value)
+			else:
+				values = list(value)
+			if self.repeatedArrays is not None:
+				values = self._packRepeated(field, values)
+			return values
+		if kind == KIND_MESSAGE:
+			return self._serializeMessage(childPlan, value, counts, depth + 1)
+		elif kind == KIND_BOOL:
 			return value and 1 or 0
-		elif field.type in MESSAGE_OR_GROUP:
-			return self.serialize(value)
+		elif self.base64Bytes and field.type == TYPE_BYTES:
+			return _encodeBase64(value)
+		return value
+
+
+	def _serializeMasked(self, mask, message, counts=None, depth=1):
+		"""
+		Like L{_serializeMessage}, but only for the fields selected by
+		L{protojson.fieldmask.FieldMask} C{mask}.
+		"""
+		omitUnset = self.omitUnset
+		fields = mask.fields
+		if omitUnset:
+			fields = [(fieldPlan, childMask) for fieldPlan, childMask in fields
+				if (fieldPlan[3] and len(getattr(message, fieldPlan[1])))
+				or (not fieldPlan[3] and message.HasField(fieldPlan[1]))]
+			if not fields:
+				return []
+			length = fields[-1][0][0] + 1
 		else:
-			return value
+			length = mask.plan.length
+		serialized = [self.fillerValue] * length
+		if counts is not None and depth > counts[1]:
+			counts[1] = depth
+		for fieldPlan, childMask in fields:
+			tag = fieldPlan[0]
+			value = getattr(message, fieldPlan[1])
+			if counts is not None:
+				if fieldPlan[3]:
+					counts[0] += len(value)
+				else:
+					counts[0] += 1
+			if childMask is None:
+				serialized[tag] = self._serializeField(fieldPlan, value, counts, depth)
+			elif fieldPlan[3]:
+				serialized[tag] = [self._serializeMasked(childMask, child, counts, depth + 1)
+					for child in value]
+			else:
+				serialized[tag] = self._serializeMasked(
+					childMask, value, counts, depth + 1)
+		return serialized
 
 
-	def serialize(self, message):
+	def serialize(self, message, fields=None):
 		"""
 		C{message} is a L{google.protobuf.message.Message}.
 
 		Returns a C{list}, the serialized form of C{message}.
+
+		If C{fields} is not C{None}, only those fields are serialized, and
+		every other index gets C{fillerValue}.  C{fields} is a
+		L{protojson.fieldmask.FieldMask} or a sequence of dotted field
+		paths like C{'repeated_nested_message.b'}; see
+		L{protojson.fieldmask}.
 		"""
-		keys = message.DESCRIPTOR.fields_by_number.keys()
-		if not keys:
-			serialized = []
-		else:
-			maxFieldNumber = max(keys)
-			serialized = [self.fillerValue] * (maxFieldNumber + 1)
-
-			for tag, field in message.DESCRIPTOR.fields_by_number.iteritems():
-				value = getattr(message, field.name)
-				if field.label == LABEL_REPEATED:
-					serializedChild = []
-					for child in getattr(message, field.name):
-						serializedChild.append(self._getSerializedValue(field, child))
-					serialized[tag] = serializedChild
-				else:
-					serialized[tag] = self._getSerializedValue(field, value)
+		plan = _getPlan(message.DESCRIPTOR)
+		if fields is not None:
+			# Imported here because protojson.fieldmask imports this module.
+			from protojson.fieldmask import getMask
+			mask = getMask(plan, fields)
+			if self.metrics is not None:
+				return self._measureCall(
+					'serialize', plan, self._serializeMasked, (mask, message))
+			return self._serializeMasked(mask, message)
+		if self.metrics is not None:
+			return self._measureCall(
+				'serialize', plan, self._serializeMessage, (plan, message))
+		specialized = self._getSpecializedFunctions(plan)
+		if specialized is not None:
+			return specialized[0](message, self.fillerValue, self.base64Bytes)
+		return self._serializeMessage(plan, message)
+
+
+	def _measureCall(self, operation, plan, function, args):
+		"""
+		Returns C{function(*args + (counts,))}, which does C{operation}
+		(C{'serialize'} or C{'deserialize'}) for a message of the type
+		described by C{plan}, and reports it to C{self.metrics}.
+		C{counts} is a C{[elements, depth]} C{list} for the function to
+		update.  Every exception counts as a failure.
+		"""
+		counts = [0, 0]
+		start = timer()
+		try:
+			result = function(*(args + (counts,)))
+		except Exception:
+			self.metrics.record(operation, plan.descriptor.full_name,
+				timer() - start, 0, 0, True)
+			raise
+		self.metrics.record(operation, plan.descriptor.full_name,
+			timer() - start, counts[0], counts[1], False)
+		return result
+
+
+	def _measureSteps(self, operation, plan, steps, counts):
+		"""
+		Yields what generator C{steps} yields, and reports C{operation} to
+		C{self.metrics} (like L{_measureCall}) when it is done.  Only the
+		time spent in C{steps} is counted.  C{counts} is the
+		C{[elements, depth]} C{list} that C{steps} updates.
+		"""
+		seconds = 0.0
+		while 1:
+			start = timer()
+			try:
+				step = steps.next()
+			except StopIteration:
+				seconds += timer() - start
+				break
+			except Exception:
+				self.metrics.record(operation, plan.descriptor.full_name,
+					seconds + timer() - start, 0, 0, True)
+				raise
+			seconds += timer() - start
+			yield step
+		self.metrics.record(operation, plan.descriptor.full_name,
+			seconds, counts[0], counts[1], False)
+
+
+	def _getSerializeFunction(self, plan):
+		"""
+		Returns a function that takes a message of the type described by
+		C{plan} and returns its serialized form.
+		"""
+		if self.metrics is not None:
+			measureCall = self._measureCall
+			serializeMessage = self._serializeMessage
+			return lambda message: measureCall(
+				'serialize', plan, serializeMessage, (plan, message))
+		specialized = self._getSpecializedFunctions(plan)
+		if specialized is not None:
+			serializeSpecialized = specialized[0]
+			fillerValue = self.fillerValue
+			base64Bytes = self.base64Bytes
+			return lambda message: serializeSpecialized(
+				message, fillerValue, base64Bytes)
+		serializeMessage = self._serializeMessage
+		return lambda message: serializeMessage(plan, message)
+
 
+	def serializeMany(self, messages, pool=None, chunkSize=1000):
+		"""
+		C{messages} is an iterable of L{google.protobuf.message.Message}s.
+
+		Returns a C{list} with the serialized form of each message, in
+		order.  This is faster than calling L{serialize} in a loop.
+
+		If C{pool} is a C{multiprocessing.Pool}, the work is split into
+		chunks of C{chunkSize} messages and done in its processes; see
+		L{protojson.batch}.  All of the messages must then be of the same
+		type, and this serializer must be picklable and have no
+		C{metrics}; its C{cache} is not used.
+		"""
+		if pool is not None:
+			from protojson import batch
+			return batch.serializeMany(self, messages, pool, chunkSize)
+		serialized = []
+		append = serialized.append
+		descriptor = None
+		for message in messages:
+			if message.DESCRIPTOR is not descriptor:
+				descriptor = message.DESCRIPTOR
+				serializeOne = self._getSerializeFunction(_getPlan(descriptor))
+			append(serializeOne(message))
 		return serialized
 
 
-	def _deserializeMessageField(self, message, field, data):
+	def iterencode(self, message, encoding='utf-8', bufferSize=512):
 		"""
-		Mutates C{message} based on C{data} and C{field}.
+		C{message} is a L{google.protobuf.message.Message}.
+
+		Yields C{str} chunks of ASCII JSON text which together are the JSON
+		encoding of C{self.serialize(message)}, without building the
+		serialized C{list}.  C{str} values (from C{bytes} fields) are decoded
+		with C{encoding}; pass C{'latin-1'} if your C{bytes} are not UTF-8.
+		About C{bufferSize} JSON fragments are joined into each chunk.
+		"""
+		# Imported here because protojson.pblitejson imports this module.
+		from protojson import pblitejson
+		return pblitejson.iterencode(_getPlan(message.DESCRIPTOR), message,
+			self.fillerValue, encoding, bufferSize, self.base64Bytes,
+			self.omitUnset, self.maxDepth)
+
 
+	def serializeToJson(self, message, encoding='utf-8'):
+		"""
 		C{message} is a L{google.protobuf.message.Message}.
-		C{field} is a L{google.protobuf.descriptor.FieldDescriptor}.
+
+		Returns a C{str}, the JSON encoding of C{self.serialize(message)}.
+		See L{iterencode}.
+		"""
+		return ''.join(self.iterencode(message, encoding, 4096))
+
+
+	def getDecoder(self, message, encoding='utf-8'):
+		"""
+		C{message} is a L{google.protobuf.message.Message}.  It is cleared.
+
+		Returns a L{protojson.pblitejson.PbLiteDecoder}, which populates
+		C{message} from PbLite JSON text fed to it in chunks, without
+		building the C{list} that C{simplejson.loads} would return.
+		Strings for C{bytes} fields are encoded with C{encoding}, the
+		reverse of L{iterencode}.
+		"""
+		# Imported here because protojson.pblitejson imports this module.
+		from protojson import pblitejson
+		return pblitejson.PbLiteDecoder(_getPlan(message.DESCRIPTOR), message,
+			encoding, self.omitUnset, self.base64Bytes, self.maxDepth)
+
+
+	def deserializeFromJson(self, message, text, encoding='utf-8'):
+		"""
+		Like L{deserialize}, but C{text} is a C{str} or C{unicode} of
+		PbLite JSON text.  Every problem (including invalid JSON) raises
+		L{PbDecodeError}.
+		"""
+		decoder = self.getDecoder(message, encoding)
+		decoder.feed(text)
+		decoder.close()
+
+
+	def deserializeLazy(self, descriptor, data):
+		"""
+		Returns a L{protojson.lazy.LazyMessage}, a read-only message-like
+		view over PbLite list C{data} for the message type described by
+		L{google.protobuf.descriptor.Descriptor} C{descriptor}.  Nothing is
+		converted or validated until it is accessed, and then each field
+		is converted and validated like L{deserialize} would, once.
+		"""
+		# Imported here because protojson.lazy imports this module.
+		from protojson.lazy import LazyMessage
+		return LazyMessage(
+			_getPlan(descriptor), data, self.omitUnset, self.base64Bytes)
+
+
+	def deserializeRecord(self, descriptor, data):
+		"""
+		Returns a read-only record for PbLite list C{data}, of the message
+		type described by L{google.protobuf.descriptor.Descriptor}
+		C{descriptor}: an instance of a C{__slots__} class with an
+		attribute for each field.  This is much lighter than a Message.
+		C{data} is validated like L{deserialize} would.  See
+		L{protojson.records}.
+		"""
+		# Imported here because protojson.records imports this module.
+		from protojson.records import toRecord
+		return toRecord(_getPlan(descriptor), data, self.omitUnset,
+			self.base64Bytes, self.maxDepth)
+
+
+	def validate(self, descriptor, data, allErrors=False):
+		"""
+		Checks PbLite list C{data} for the message type described by
+		L{google.protobuf.descriptor.Descriptor} C{descriptor}, without
+		creating a Message.
+
+		Returns C{None} if L{deserialize} would accept C{data}, or else a
+		L{PbDecodeError} describing the first problem.  If C{allErrors} is
+		true, returns a (possibly empty) C{list} of L{PbDecodeError}s for
+		every problem instead.  See L{protojson.validator}.
+		"""
+		# Imported here because protojson.validator imports this module.
+		from protojson import validator
+		errors = validator.iterErrors(_getPlan(descriptor), data,
+			self.omitUnset, self.maxDepth, self.base64Bytes)
+		if allErrors:
+			return list(errors)
+		for error in errors:
+			return error
+		return None
+
+
+	def _deserializeMessageField(self, message, fieldPlan, data, counts=None,
+	depth=1):
+		"""
+		Mutates C{message} based on C{data} and C{fieldPlan}.
+
+		C{message} is a L{google.protobuf.message.Message}, at nesting
+		C{depth}.
+		C{fieldPlan} is an item from L{_MessagePlan.fields}.
 		C{data} is a L{list}, L{int}, L{long}, L{float}, L{bool}, L{str},
 			L{unicode}, or L{NoneType}.
+		C{counts} is updated for the nested messages in C{data}, as by
+			L{_deserializeMessage}.
 		"""
-		isBool = (field.type == TYPE_BOOL)
-		isEnum = (field.type == TYPE_ENUM)
-		if field.label == LABEL_REPEATED:
-			messageField = getattr(message, field.name)
-			if field.type not in MESSAGE_OR_GROUP:
-				for value in _getIterator(data):
-					if isBool:
-						value = _convertToBool(value)
-					elif isEnum:
-						_ensureValidEnum(field, value)
-					try:
-						messageField.append(value)
-					except (TypeError, ValueError), e:
-						raise PbDecodeError(str(e))
-			else:
-				for subdata in _getIterator(data):
-					self._deserializeMessage(messageField.add(), subdata)
+		tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+		if kind != KIND_MESSAGE:
+			_setScalarField(message, fieldPlan, data, self.base64Bytes)
+		elif repeated:
+			messageField = getattr(message, name)
+			for subdata in _getIterator(data):
+				self._deserializeMessage(
+					childPlan, messageField.add(), subdata, counts, depth + 1)
 		else:
-			if field.type not in MESSAGE_OR_GROUP:
-				if isBool:
-					data = _convertToBool(data)
-				elif isEnum:
-					_ensureValidEnum(field, data)
-				# Because setattr(..., ..., None) for optional fields is
-				# okay, we don't need our own branching here.
-				try:
-					setattr(message, field.name, data)
-				except (TypeError, ValueError), e:
-					raise PbDecodeError(str(e))
-			else:
-				# On "singular fields", we can just grab a child and set
-				# properties on it.  Setting a field on the child will cause
-				# the child's field to exist in the parent.  See:
-				# https://code.google.com/apis/protocolbuffers/docs/reference/python-generated.html#fields
-				messageField = getattr(message, field.name)
-				self._deserializeMessage(messageField, data)
+			# On "singular fields", we can just grab a child and set
+			# properties on it.  Setting a field on the child will cause
+			# the child's field to exist in the parent.  See:
+			# https://code.google.com/apis/protocolbuffers/docs/reference/python-generated.html#fields
+			messageField = getattr(message, name)
+			self._deserializeMessage(childPlan, messageField, data, counts, depth + 1)
 
 
-	def _deserializeMessage(self, message, data):
+	def _deserializeMessage(self, plan, message, data, counts=None, depth=1):
 		"""
 		Mutates C{message} based on C{data}.
 
-		C{message} is a L{google.protobuf.message.Message}.
+		C{plan} is the L{_MessagePlan} for C{message}'s type.
+		C{message} is a L{google.protobuf.message.Message}, at nesting
+			C{depth}.
 		C{data} is a L{list}.
+		C{counts}, if not C{None}, is a C{list} C{[elements, depth]} (see
+			L{protojson.metrics}), which is updated for C{data}.
 		"""
-		for tag, field in message.DESCRIPTOR.fields_by_number.iteritems():
-			try:
+		for step in self._deserializeSteps(plan, message, data, None, counts, depth):
+			pass
+
+
+	def _deserializeSteps(self, plan, message, data, stepSize, counts=None,
+	depth=1):
+		"""
+		Like L{_deserializeMessage}, but a generator that yields C{None}
+		after every C{stepSize} field values or so (never, if C{stepSize}
+		is C{None}).
+		"""
+		omitUnset = self.omitUnset
+		maxDepth = self.maxDepth
+		deserializeField = self._deserializeMessageField
+		counting = counts is not None
+		elements = deepest = 0
+		stack = [(plan, message, data, depth)]
+		pop = stack.pop
+		push = stack.append
+		work = 0
+		while stack:
+			plan, message, data, depth = pop()
+			if depth > maxDepth:
+				raise PbDecodeError("Message %r is nested more than %d "
+					"deep" % (message, maxDepth))
+			if counting and depth > deepest:
+				deepest = depth
+			if not isinstance(data, (list, tuple)):
+				# Like indexing, raises TypeError if data has no length.
+				len(data)
+				# A string or dict is not a message, even with omitUnset.
+				raise PbDecodeError("Expected a list for message %r but found "
+					"a %r" % (message, type(data)))
+			length = len(data)
+			work += length
+			for fieldPlan in plan.fields:
+				tag = fieldPlan[0]
+				if tag < length:
+					subdata = data[tag]
+				elif omitUnset:
+					subdata = None
+				else:
+					# Raise even if it was an optional field.
+					raise PbDecodeError("For message %r expected index "
+						"%r but it was missing." % (message, tag))
+				if omitUnset and subdata is None:
+					if fieldPlan[6].label == LABEL_REQUIRED:
+						raise PbDecodeError("For message %r required field at "
+							"index %r was missing." % (message, tag))
+					continue
+				if fieldPlan[2] != KIND_MESSAGE:
+					deserializeField(message, fieldPlan, subdata)
+					if not fieldPlan[3]:
+						if counting:
+							elements += 1
+					elif stepSize is not None or counting:
+						added = len(getattr(message, fieldPlan[1]))
+						work += added
+						elements += added
+				elif fieldPlan[3]:
+					messageField = getattr(message, fieldPlan[1])
+					add = messageField.add
+					childPlan = fieldPlan[5]
+					for childData in _getIterator(subdata):
+						push((childPlan, add(), childData, depth + 1))
+					if counting:
+						elements += len(messageField)
+				else:
+					# On "singular fields", we can just grab a child and set
+					# properties on it.  Setting a field on the child will
+					# cause the child's field to exist in the parent.  See:
+					# https://code.google.com/apis/protocolbuffers/docs/reference/python-generated.html#fields
+					child = getattr(message, fieldPlan[1])
+					if omitUnset:
+						# Populated even if the nested message is empty.
+						child.SetInParent()
+					push((fieldPlan[5], child, subdata, depth + 1))
+					if counting:
+						elements += 1
+			if stepSize is not None and work >= stepSize:
+				work = 0
+				yield None
+		if counting:
+			counts[0] += elements
+			if deepest > counts[1]:
+				counts[1] = deepest
+
+
+	def _deserializeMasked(self, mask, message, data, counts=None, depth=1):
+		"""
+		Like L{_deserializeMessage}, but only for the fields selected by
+		L{protojson.fieldmask.FieldMask} C{mask}.  The other indices of
+		C{data} are not looked at.
+		"""
+		omitUnset = self.omitUnset
+		if not isinstance(data, (list, tuple)):
+			raise PbDecodeError("Expected a list for message %r but found "
+				"a %r" % (message, type(data)))
+		length = len(data)
+		if counts is not None and depth > counts[1]:
+			counts[1] = depth
+		for fieldPlan, childMask in mask.fields:
+			tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+			if tag < length:
 				subdata = data[tag]
-			except IndexError:
-				# Raise even if it was an optional field.
+			elif omitUnset:
+				subdata = None
+			else:
 				raise PbDecodeError("For message %r expected index "
 					"%r but it was missing." % (message, tag))
-			self._deserializeMessageField(message, field, subdata)
+			if omitUnset and subdata is None:
+				if field.label == LABEL_REQUIRED:
+					raise PbDecodeError("For message %r required field at "
+						"index %r was missing." % (message, tag))
+				continue
+			if childMask is None:
+				if omitUnset and kind == KIND_MESSAGE and not repeated:
+					getattr(message, name).SetInParent()
+				self._deserializeMessageField(
+					message, fieldPlan, subdata, counts, depth)
+			elif repeated:
+				messageField = getattr(message, name)
+				for child in _getIterator(subdata):
+					self._deserializeMasked(
+						childMask, messageField.add(), child, counts, depth + 1)
+			else:
+				messageField = getattr(message, name)
+				messageField.SetInParent()
+				self._deserializeMasked(
+					childMask, messageField, subdata, counts, depth + 1)
+			if counts is not None:
+				if repeated:
+					counts[0] += len(getattr(message, name))
+				else:
+					counts[0] += 1
 
 
-	def deserialize(self, message, data):
+	def _getDeserializeFunction(self, plan):
+		"""
+		Returns a function that takes an empty message of the type
+		described by C{plan} and the data to put into it.
+		"""
+		if self.metrics is not None:
+			measureCall = self._measureCall
+			deserializeMessage = self._deserializeMessage
+			return lambda message, data: measureCall(
+				'deserialize', plan, deserializeMessage, (plan, message, data))
+		specialized = self._getSpecializedFunctions(plan)
+		if specialized is not None:
+			deserializeSpecialized = specialized[1]
+			if not self.base64Bytes:
+				return deserializeSpecialized
+			return lambda message, data: deserializeSpecialized(message, data, True)
+		deserializeMessage = self._deserializeMessage
+		return lambda message, data: deserializeMessage(plan, message, data)
+
+
+	def deserializeMany(self, messageClass, lists, pool=None, chunkSize=1000):
+		"""
+		C{messageClass} is a generated L{google.protobuf.message.Message}
+		subclass.  C{lists} is an iterable of PbLite lists.
+
+		Returns a C{list} of new C{messageClass} instances, one for each
+		list, in order.  This is faster than calling L{deserialize} in a
+		loop.  If any list is invalid, raises L{PbDecodeError}.
+
+		If C{pool} is a C{multiprocessing.Pool}, the work is split into
+		chunks of C{chunkSize} lists and done in its processes; see
+		L{protojson.batch}.  This serializer must then have no
+		C{metrics}.
+		"""
+		if pool is not None:
+			from protojson import batch
+			return batch.deserializeMany(self, messageClass, lists, pool, chunkSize)
+		deserializeOne = self._getDeserializeFunction(
+			_getPlan(messageClass.DESCRIPTOR))
+		messages = []
+		append = messages.append
+		for data in lists:
+			message = messageClass()
+			deserializeOne(message, data)
+			append(message)
+		return messages
+
+
+	def deserialize(self, message, data, fields=None):
 		"""
 		Puts values from C{data} into message C{message}.  The message
 		is mutated, not returned.  Existing values are cleared.
@@ -196,12 +1267,77 @@ class PbLiteSerializer(object):
 		C{data} is a L{list}.  Unneeded values are ignored (fillerValue
 			is not used).
 
-		If any part of C{data} is invalid, raises L{PbDecodeError}.
+		If any part of C{data} is invalid, raises L{PbDecodeError}.  Missing
+		indices are invalid unless C{omitUnset} is true.
 
 		Note that the deserializer is forgiving when it comes to bool fields -
 		it will accept 1, 1.0, True, 0, 0.0, -0.0, and False.
+
+		If C{fields} is not C{None}, only those fields are converted and
+		validated, and the rest of C{data} is ignored (so C{message} may be
+		missing required fields).  C{fields} is a
+		L{protojson.fieldmask.FieldMask} or a sequence of dotted field
+		paths; see L{protojson.fieldmask}.
 		"""
 		message.Clear()
-		self._deserializeMessage(message, data)
+		plan = _getPlan(message.DESCRIPTOR)
+		if fields is not None:
+			# Imported here because protojson.fieldmask imports this module.
+			from protojson.fieldmask import getMask
+			mask = getMask(plan, fields)
+			if self.metrics is not None:
+				self._measureCall(
+					'deserialize', plan, self._deserializeMasked, (mask, message, data))
+			else:
+				self._deserializeMasked(mask, message, data)
+			return
+		if self.metrics is not None:
+			self._measureCall(
+				'deserialize', plan, self._deserializeMessage, (plan, message, data))
+			return
+		specialized = self._getSpecializedFunctions(plan)
+		if specialized is not None:
+			specialized[1](message, data, self.base64Bytes)
+			return
+		self._deserializeMessage(plan, message, data)
 		# We know it's initialized (has every field) because we iterated
 		# over the fields, not the serialized data.
+
+
+	def serializeInSteps(self, message, stepSize=1000):
+		"""
+		Returns an iterator that serializes C{message} like L{serialize},
+		doing about C{stepSize} field values (counting every item of a
+		repeated field) of work each time it is advanced, so that an event
+		loop can do other work in between.  It yields C{None} until the
+		last item, which is the serialized C{list}::
+
+			for serialized in serializer.serializeInSteps(message):
+				if serialized is None:
+					yieldToEventLoop()
+
+		C{message} must not be changed until the iterator is exhausted.
+		The non-Message fields of one message are always done in one step.
+		"""
+		plan = _getPlan(message.DESCRIPTOR)
+		if self.metrics is not None:
+			counts = [0, 0]
+			return self._measureSteps('serialize', plan,
+				self._serializeSteps(plan, message, stepSize, counts), counts)
+		return self._serializeSteps(plan, message, stepSize)
+
+
+	def deserializeInSteps(self, message, data, stepSize=1000):
+		"""
+		Returns an iterator that deserializes C{data} into C{message} like
+		L{deserialize}, doing about C{stepSize} field values of work each
+		time it is advanced (see L{serializeInSteps}).  It yields only
+		C{None}s; C{message} is complete when the iterator is exhausted.
+		"""
+		message.Clear()
+		plan = _getPlan(message.DESCRIPTOR)
+		if self.metrics is not None:
+			counts = [0, 0]
+			return self._measureSteps('deserialize', plan,
+				self._deserializeSteps(plan, message, data, stepSize, counts), counts)
+		return self._deserializeSteps(plan, message, data, stepSize)
@@ -0,0 +1,190 @@
+"""
+Deserialization of PbLite lists into lightweight read-only records.
+
+For read-only work over many messages, L{toRecord} converts a PbLite list
+into an instance of a C{__slots__} class generated for its message type
+(see L{getRecordClass}), instead of a L{google.protobuf.message.Message}.
+Records take a fraction of the memory of Messages and are faster to
+build, but have none of their methods.
+
+Records have an attribute for every field, with the field's name:
+
+	- a singular scalar field is the validated value, or the field's
+	  default if it is unset (which can only happen with C{omitUnset});
+	- a singular Message/Group field is another record, or C{None} if it
+	  is unset (which can only happen with C{omitUnset});
+	- a repeated field is a C{tuple} of values or records.
+
+Everything is converted and validated up front, like
+L{protojson.pbliteserializer.PbLiteSerializer.deserialize} does.  Use it
+through L{protojson.pbliteserializer.PbLiteSerializer.deserializeRecord}.
+"""
+
+import threading
+
+from protojson.error import PbDecodeError
+from protojson.pbliteserializer import (
+	KIND_BOOL, KIND_MESSAGE, LABEL_REQUIRED, _convertBools, _getFieldChecker,
+	_getList)
+
+_postImportVars = vars().keys()
+
+
+class Record(object):
+	"""
+	The base class of the record classes made by L{getRecordClass}.
+	C{DESCRIPTOR} is the L{google.protobuf.descriptor.Descriptor} of the
+	record's message type.
+	"""
+	__slots__ = ()
+	DESCRIPTOR = None
+
+	def __repr__(self):
+		return '<%s %s at 0x%x>' % (
+			self.__class__.__name__, self.DESCRIPTOR.full_name, id(self))
+
+
+	def __setattr__(self, name, value):
+		raise AttributeError("%r is read-only" % (self,))
+
+
+	def __delattr__(self, name):
+		raise AttributeError("%r is read-only" % (self,))
+
+
+	def _values(self):
+		return tuple(getattr(self, name) for name in self.__slots__)
+
+
+	def __eq__(self, other):
+		if other.__class__ is not self.__class__:
+			return NotImplemented
+		return self._values() == other._values()
+
+
+	def __ne__(self, other):
+		if other.__class__ is not self.__class__:
+			return NotImplemented
+		return self._values() != other._values()
+
+
+	def __hash__(self):
+		return hash(self._values())
+
+
+
+# _MessagePlan -> (record class, ((fieldPlan, setter), ...)), where setter
+# sets the field's slot on a record.
+_recordTypes = {}
+_recordTypesLock = threading.Lock()
+
+
+def _getRecordType(plan):
+	try:
+		return _recordTypes[plan]
+	except KeyError:
+		pass
+	_recordTypesLock.acquire()
+	try:
+		# Another thread might have made it; there must be only one class
+		# per message type.
+		recordType = _recordTypes.get(plan)
+		if recordType is None:
+			descriptor = plan.descriptor
+			recordClass = type(str(descriptor.name), (Record,), {
+				'__slots__': tuple(fieldPlan[1] for fieldPlan in plan.fields),
+				'__module__': __name__,
+				'DESCRIPTOR': descriptor})
+			# Record.__setattr__ refuses, so set the slots directly.
+			setters = tuple((fieldPlan, getattr(recordClass, fieldPlan[1]).__set__)
+				for fieldPlan in plan.fields)
+			recordType = _recordTypes[plan] = (recordClass, setters)
+		return recordType
+	finally:
+		_recordTypesLock.release()
+
+
+def getRecordClass(plan):
+	"""
+	Returns the record class (a L{Record} subclass with a slot for each
+	field) for the message type of
+	L{protojson.pbliteserializer._MessagePlan} C{plan}.  There is one
+	class per message type.
+	"""
+	return _getRecordType(plan)[0]
+
+
+def toRecord(plan, data, omitUnset=False, base64Bytes=False, maxDepth=100):
+	"""
+	Returns a record (see L{getRecordClass}) for PbLite list C{data}, of
+	the message type of L{protojson.pbliteserializer._MessagePlan}
+	C{plan}, or raises L{PbDecodeError} for anything that
+	L{PbLiteSerializer.deserialize} would reject.  C{omitUnset},
+	C{base64Bytes}, and C{maxDepth} have the same meaning as for
+	L{PbLiteSerializer}.
+	"""
+	result = [None]
+	# (plan, data, setter, target, depth): convert data and pass it to
+	# setter(target, record).  (None, records, setter, target, None): the
+	# records of a repeated field are done; set them as a tuple.
+	stack = [(plan, data, result.__setitem__, 0, 1)]
+	pop = stack.pop
+	push = stack.append
+	while stack:
+		plan, data, setParent, target, depth = pop()
+		if plan is None:
+			setParent(target, tuple(data))
+			continue
+		if depth > maxDepth:
+			raise PbDecodeError("Message %s is nested more than %d "
+				"deep" % (plan.descriptor.full_name, maxDepth))
+		if not isinstance(data, (list, tuple)):
+			raise PbDecodeError("Expected a list for message %s but found "
+				"a %r" % (plan.descriptor.full_name, type(data)))
+		length = len(data)
+		recordClass, setters = _getRecordType(plan)
+		record = recordClass.__new__(recordClass)
+		setParent(target, record)
+		for fieldPlan, setter in setters:
+			tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+			if tag < length:
+				subdata = data[tag]
+			elif omitUnset:
+				subdata = None
+			else:
+				# Raise even if it was an optional field.
+				raise PbDecodeError("For message %s expected index "
+					"%r but it was missing." % (plan.descriptor.full_name, tag))
+			# Without omitUnset, None is invalid for every field, and
+			# the checks below reject it like deserialize does.
+			if subdata is None and omitUnset:
+				if field.label == LABEL_REQUIRED:
+					raise PbDecodeError("Required field %r is missing" % (field,))
+				if repeated:
+					setter(record, ())
+				elif kind == KIND_MESSAGE:
+					setter(record, None)
+				else:
+					setter(record, field.default_value)
+				continue
+			if kind == KIND_MESSAGE:
+				if repeated:
+					childData = _getList(subdata)
+					children = [None] * len(childData)
+					# Popped after all of the children are done.
+					push((None, children, setter, record, None))
+					setChild = children.__setitem__
+					depth1 = depth + 1
+					for n in xrange(len(childData) - 1, -1, -1):
+						push((childPlan, childData[n], setChild, n, depth1))
+				else:
+					push((childPlan, subdata, setter, record, depth + 1))
+			elif repeated:
+				values = _getList(subdata)
+				if kind == KIND_BOOL:
+					setter(record, tuple(_convertBools(values)))
+				else:
+					setter(record, tuple(map(_getFieldChecker(fieldPlan, base64Bytes), values)))
+			else:
+				setter(record, _getFieldChecker(fieldPlan, base64Bytes)(subdata))
+	return result[0]
@@ -9,6 +9,37 @@ def getSuite():
 	suite = unittest.TestLoader().loadTestsFromNames([
 		'protojson.test_pbliteserializer.PbLiteSerializeTests',
 		'protojson.test_pbliteserializer.PbLiteDeserializeTests',
+		'protojson.test_pbliteserializer.MessagePlanTests',
+		'protojson.test_pbliteserializer.OmitUnsetTests',
+		'protojson.test_pbliteserializer.RepeatedArrayTests',
+		'protojson.test_pbliteserializer.MaxDepthTests',
+		'protojson.test_pbliteserializer.InStepsTests',
+		'protojson.test_pbliteserializer.Base64BytesTests',
+		'protojson.test_codegen.SpecializedSerializeTests',
+		'protojson.test_codegen.SpecializedDeserializeTests',
+		'protojson.test_pblitejson.IterencodeTests',
+		'protojson.test_pblitejson.JsonDeserializeTests',
+		'protojson.test_pblitejson.ChunkedJsonDeserializeTests',
+		'protojson.test_pblitejson.PbLiteDecoderTests',
+		'protojson.test_lazy.LazyMessageTests',
+		'protojson.test_records.RecordTests',
+		'protojson.test_objectserializer.ObjectSerializerTests',
+		'protojson.test_objectserializer.HybridSerializerTests',
+		'protojson.test_batch.BatchTests',
+		'protojson.test_batch.PoolBatchTests',
+		'protojson.test_validator.ValidateTests',
+		'protojson.test_benchmark.BenchmarkTests',
+		'protojson.test_metrics.MetricsTests',
+		'protojson.test_analyzer.AnalyzerTests',
+		'protojson.test_delta.DeltaTests',
+		'protojson.test_memo.SubMessageCacheTests',
+		'protojson.test_incremental.IncrementalSerializerTests',
+		'protojson.test_incremental.MarkDirtyTests',
+		'protojson.test_fieldmask.FieldMaskTests',
+		'protojson.test_fieldmask.PartialDeserializeTests',
+		'protojson.test_wire.WireTests',
+		'protojson.test_stream.FrameDecoderTests',
+		'protojson.test_stream.FrameWriterTests',
 	])
 	return suite
 
@@ -0,0 +1,253 @@
+"""
+Newline-delimited PbLite streams: each frame is the PbLite JSON text of
+one message followed by C{"\\n"}.
+
+The classes here do no I/O of their own, so they work with blocking
+sockets, C{select}/C{poll} loops, and event-driven frameworks alike.
+L{FrameDecoder} is fed bytes as they arrive and decodes the frames that
+are complete.  L{FrameWriter} queues messages, and L{FrameWriter.flush}
+writes what is queued with a C{send} function (like C{socket.send}),
+coalescing frames into sends of up to C{SEND_SIZE} bytes, and keeping
+what didn't fit for the next flush; L{FrameWriter.write} returns
+C{False} when the queue is over its high-water mark, so that a producer
+knows to stop until the queue drains.  Each channel needs only one of each, so one process can handle
+many channels.
+
+PbLite JSON text (as written by
+L{PbLiteSerializer.serializeToJson}) never contains a newline, because
+newlines in strings are escaped.
+"""
+
+import errno
+import socket
+
+from collections import deque
+from itertools import islice
+
+from protojson.error import PbDecodeError
+from protojson.pbliteserializer import PbLiteSerializer
+
+_postImportVars = vars().keys()
+
+
+# The most bytes that FrameWriter.flush passes to one send, unless one
+# frame is that long.  Flushing copies only this much per send, however
+# long the queue is.
+SEND_SIZE = 64 * 1024
+
+
+def encodeFrame(message, serializer=None, encoding='utf-8'):
+	"""
+	Returns the C{str} frame for L{google.protobuf.message.Message}
+	C{message}, serialized with C{serializer} (a default
+	L{PbLiteSerializer} if C{None}).  See
+	L{PbLiteSerializer.serializeToJson} for C{encoding}.
+	"""
+	if serializer is None:
+		serializer = PbLiteSerializer()
+	return serializer.serializeToJson(message, encoding) + '\n'
+
+
+
+class FrameDecoder(object):
+	"""
+	Decodes a stream of frames into messages.
+
+	Feed it bytes with L{feed}, then get the messages with L{nextMessage},
+	or by iterating over it::
+
+		decoder.feed(sock.recv(65536))
+		for message in decoder:
+			handle(message)
+	"""
+	__slots__ = (
+		'messageClass', 'serializer', 'maxFrameSize', 'encoding', '_frames',
+		'_pending', '_pendingSize', '_failed')
+
+	def __init__(self, messageClass, serializer=None, maxFrameSize=1024 * 1024,
+	encoding='utf-8'):
+		"""
+		C{messageClass} is called with no arguments to make the message
+		for each frame, which is deserialized with C{serializer} (a
+		default L{PbLiteSerializer} if C{None}).
+
+		Frames longer than C{maxFrameSize} bytes (not counting the
+		newline) are rejected before any of their JSON is parsed.
+		"""
+		if serializer is None:
+			serializer = PbLiteSerializer()
+		self.messageClass = messageClass
+		self.serializer = serializer
+		self.maxFrameSize = maxFrameSize
+		self.encoding = encoding
+		# Complete frames that haven't been decoded yet
+		self._frames = deque()
+		# The chunks of the incomplete frame at the end of the stream
+		self._pending = []
+		self._pendingSize = 0
+		self._failed = False
+
+
+	def _tooLong(self):
+		self._failed = True
+		raise PbDecodeError("Frame is more than maxFrameSize %d bytes "
+			"long" % (self.maxFrameSize,))
+
+
+	def feed(self, data):
+		"""
+		Feeds C{str} C{data}, the next bytes of the stream, to the decoder.
+
+		Raises L{PbDecodeError} if a frame is too long.  After that, the
+		decoder can't find the start of the next frame, so every later
+		call raises.
+		"""
+		if self._failed:
+			raise PbDecodeError("Can't decode frames after a frame that "
+				"was too long")
+		maxFrameSize = self.maxFrameSize
+		start = 0
+		end = data.find('\n')
+		while end != -1:
+			if self._pendingSize + end - start > maxFrameSize:
+				self._tooLong()
+			if self._pending:
+				self._pending.append(data[start:end])
+				frame = ''.join(self._pending)
+				self._pending = []
+				self._pendingSize = 0
+			else:
+				frame = data[start:end]
+			# Empty frames (keepalives) are skipped.
+			if frame:
+				self._frames.append(frame)
+			start = end + 1
+			end = data.find('\n', start)
+		if start < len(data):
+			self._pendingSize += len(data) - start
+			if self._pendingSize > maxFrameSize:
+				self._tooLong()
+			self._pending.append(data[start:])
+
+
+	def nextMessage(self):
+		"""
+		Returns the message for the next complete frame, or C{None} if
+		there are no complete frames.  If the frame isn't a valid message,
+		it is dropped, and L{PbDecodeError} is raised.
+		"""
+		if not self._frames:
+			return None
+		message = self.messageClass()
+		self.serializer.deserializeFromJson(
+			message, self._frames.popleft(), self.encoding)
+		return message
+
+
+	def __iter__(self):
+		"""
+		Yields the messages for the complete frames, like L{nextMessage}.
+		"""
+		while self._frames:
+			yield self.nextMessage()
+
+
+	def close(self):
+		"""
+		Tells the decoder that the stream has ended.  Raises
+		L{PbDecodeError} if it ended in the middle of a frame.
+		"""
+		if self._pendingSize:
+			raise PbDecodeError("Stream ended in the middle of a frame")
+
+
+
+class FrameWriter(object):
+	"""
+	Queues frames and writes them with a C{send} function.
+	"""
+	__slots__ = (
+		'send', 'serializer', 'highWaterMark', 'encoding', '_queue',
+		'_queueSize', '_offset')
+
+	def __init__(self, send, serializer=None, highWaterMark=64 * 1024,
+	encoding='utf-8'):
+		"""
+		C{send} is called with a C{str} and returns the number of bytes it
+		wrote, like C{socket.send}.  If it raises C{socket.error} with
+		C{EAGAIN} or C{EWOULDBLOCK} (from a non-blocking socket), nothing
+		was written.
+
+		Messages are serialized with C{serializer} (a default
+		L{PbLiteSerializer} if C{None}).
+		"""
+		if serializer is None:
+			serializer = PbLiteSerializer()
+		self.send = send
+		self.serializer = serializer
+		self.highWaterMark = highWaterMark
+		self.encoding = encoding
+		self._queue = deque()
+		self._queueSize = 0
+		# The number of bytes of self._queue[0] that were already sent
+		self._offset = 0
+
+
+	def getQueueSize(self):
+		"""
+		Returns the number of bytes that are queued but not yet sent.
+		"""
+		return self._queueSize
+
+
+	def write(self, message):
+		"""
+		Queues the frame for L{google.protobuf.message.Message} C{message}.
+		Nothing is sent until L{flush} is called.
+
+		Returns C{False} if the queue is now over the high-water mark, and
+		the caller should stop writing until L{flush} returns C{True}.
+		"""
+		frame = encodeFrame(message, self.serializer, self.encoding)
+		self._queue.append(frame)
+		self._queueSize += len(frame)
+		return self._queueSize <= self.highWaterMark
+
+
+	def flush(self):
+		"""
+		Sends as much of the queue as C{send} will take, calling it until
+		it takes less than it was given.  Returns C{True} if the queue is
+		now empty.
+		"""
+		queue = self._queue
+		while queue:
+			offset = self._offset
+			first = queue[0]
+			if offset or len(first) >= SEND_SIZE or len(queue) == 1:
+				data = first[offset:offset + SEND_SIZE]
+			else:
+				# Coalesce the queued frames into one send.
+				parts = [first]
+				size = len(first)
+				for frame in islice(queue, 1, None):
+					size += len(frame)
+					if size > SEND_SIZE:
+						break
+					parts.append(frame)
+				data = ''.join(parts)
+			try:
+				sent = self.send(data)
+			except socket.error, e:
+				if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+					raise
+				sent = 0
+			self._queueSize -= sent
+			# Drop the frames that were sent completely.
+			remaining = sent + offset
+			while queue and remaining >= len(queue[0]):
+				remaining -= len(queue.popleft())
+			self._offset = remaining
+			if sent < len(data):
+				break
+		return not queue
@@ -0,0 +1,83 @@
+from unittest import TestCase
+from protojson import analyzer, alltypes_pb2, benchmark_pb2, pbliteserializer
+
+
+class AnalyzerTests(TestCase):
+	"""
+	Tests for L{analyzer}.
+	"""
+
+	def _byName(self, reports):
+		return dict((report.fullName, report) for report in reports)
+
+
+	def test_descriptor(self):
+		"""
+		L{analyzer.analyze} reports on the type and every type reachable
+		from it.
+		"""
+		reports = self._byName(analyzer.analyze(alltypes_pb2.TestAllTypes.DESCRIPTOR))
+		self.assertEqual(sorted([
+			'TestAllTypes', 'TestAllTypes.NestedMessage',
+			'TestAllTypes.OptionalGroup', 'TestAllTypes.RepeatedGroup']),
+			sorted(reports))
+		report = reports['TestAllTypes']
+		self.assertEqual(51, report.length)
+		self.assertEqual(37, report.fieldCount)
+		self.assertEqual(14, report.fillerSlots)
+		# "null,"
+		self.assertEqual(14 * 5, report.wastedBytes)
+		self.assertEqual(None, report.sampleWastedBytes)
+
+
+	def test_module(self):
+		reports = self._byName(analyzer.analyze(benchmark_pb2))
+		self.assertEqual(['Nested', 'Sparse'], sorted(reports))
+		self.assertEqual(1997, reports['Sparse'].fillerSlots)
+		self.assertEqual(
+			[('label', 100, 2), ('ratio', 1000, 3), ('values', 2000, 4)],
+			reports['Sparse'].renumbering)
+		self.assertEqual([], analyzer.suggestRenumbering(
+			pbliteserializer._getPlan(alltypes_pb2.TestAllTypes.NestedMessage.DESCRIPTOR)))
+
+
+	def test_fillerValue(self):
+		serializer = pbliteserializer.PbLiteSerializer(fillerValue=0)
+		reports = self._byName(analyzer.analyze(
+			benchmark_pb2.Sparse.DESCRIPTOR, serializer=serializer))
+		# "0,"
+		self.assertEqual(1997 * 2, reports['Sparse'].wastedBytes)
+
+
+	def test_samples(self):
+		"""
+		With samples, the filler in their actual encodings is counted for
+		each type, including unset fields with C{omitUnset}.
+		"""
+		message = alltypes_pb2.TestAllTypes()
+		message.repeated_nested_message.add()
+		message.repeated_nested_message.add()
+		reports = self._byName(analyzer.analyze(
+			alltypes_pb2.TestAllTypes.DESCRIPTOR, [message, message]))
+		nested = reports['TestAllTypes.NestedMessage']
+		# optional_nested_message and two repeated_nested_messages each time
+		self.assertEqual(6, nested.sampleInstances)
+		self.assertEqual(6, nested.sampleFillerSlots)
+		self.assertEqual(30, nested.sampleWastedBytes)
+		self.assertEqual(2 * 14, reports['TestAllTypes'].sampleFillerSlots)
+
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		reports = self._byName(analyzer.analyze(
+			alltypes_pb2.TestAllTypes.DESCRIPTOR, [message], serializer))
+		# Everything before repeated_nested_message at index 48
+		self.assertEqual(48, reports['TestAllTypes'].sampleFillerSlots)
+		self.assertEqual(2, reports['TestAllTypes.NestedMessage'].sampleInstances)
+		self.assertEqual(0, reports['TestAllTypes.OptionalGroup'].sampleInstances)
+
+
+	def test_formatReports(self):
+		text = analyzer.formatReports(analyzer.analyze(benchmark_pb2))
+		lines = text.split('\n')
+		self.assertTrue(lines[1].startswith('Sparse '))
+		self.assertTrue('Suggested renumbering for Sparse:' in lines)
+		self.assertTrue('\tlabel = 100 -> 2' in lines)
@@ -0,0 +1,144 @@
+import multiprocessing
+
+from unittest import TestCase
+from protojson import pbliteserializer, alltypes_pb2, batch
+from protojson.error import PbDecodeError
+from protojson.memo import SubMessageCache
+from protojson.metrics import MetricsSink
+from protojson.objectserializer import HybridSerializer
+from protojson.testhelpers import getExpectedDefaults, getPopulatedMessage
+
+
+def _getMessages(n):
+	messages = []
+	for i in xrange(n):
+		message = getPopulatedMessage()
+		message.optional_int32 = i
+		messages.append(message)
+	return messages
+
+
+class BatchTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer.serializeMany} and
+	L{pbliteserializer.PbLiteSerializer.deserializeMany} without a pool.
+	"""
+
+	def test_serializeMany(self):
+		messages = _getMessages(5)
+		messages.append(alltypes_pb2.TestAllTypes.NestedMessage(b=3))
+		for serializer in (
+			pbliteserializer.PbLiteSerializer(),
+			pbliteserializer.PbLiteSerializer(specialize=True),
+			pbliteserializer.PbLiteSerializer(omitUnset=True),
+			HybridSerializer(20),
+		):
+			self.assertEqual(
+				[serializer.serialize(message) for message in messages],
+				serializer.serializeMany(iter(messages)))
+
+
+	def test_deserializeMany(self):
+		serializer = pbliteserializer.PbLiteSerializer()
+		lists = serializer.serializeMany(_getMessages(5))
+		messages = serializer.deserializeMany(alltypes_pb2.TestAllTypes, lists)
+		self.assertEqual(5, len(messages))
+		for data, message in zip(lists, messages):
+			expected = alltypes_pb2.TestAllTypes()
+			serializer.deserialize(expected, data)
+			self.assertEqual(expected, message)
+
+
+	def test_deserializeManyInvalid(self):
+		pblite = getExpectedDefaults()
+		pblite[13] = 5
+		serializer = pbliteserializer.PbLiteSerializer()
+		self.assertRaises(PbDecodeError, lambda: serializer.deserializeMany(
+			alltypes_pb2.TestAllTypes, [getExpectedDefaults(), pblite]))
+
+
+	def test_classPath(self):
+		"""
+		Nested message classes are found again from their class path.
+		"""
+		cls = alltypes_pb2.TestAllTypes.NestedMessage
+		self.assertEqual(('protojson.alltypes_pb2', 'TestAllTypes.NestedMessage'),
+			batch._getClassPath(cls))
+		self.assertTrue(cls is batch._getClass(batch._getClassPath(cls)))
+
+
+
+class PoolBatchTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer.serializeMany} and
+	L{pbliteserializer.PbLiteSerializer.deserializeMany} with a
+	C{multiprocessing.Pool}.
+	"""
+
+	def setUp(self):
+		self.pool = multiprocessing.Pool(2)
+
+
+	def tearDown(self):
+		self.pool.terminate()
+		self.pool.join()
+
+
+	def test_roundTripInOrder(self):
+		messages = _getMessages(25)
+		serializer = pbliteserializer.PbLiteSerializer(fillerValue=0)
+		lists = serializer.serializeMany(messages, pool=self.pool, chunkSize=4)
+		self.assertEqual(serializer.serializeMany(messages), lists)
+		decoded = serializer.deserializeMany(
+			alltypes_pb2.TestAllTypes, lists, pool=self.pool, chunkSize=4)
+		self.assertEqual(
+			serializer.deserializeMany(alltypes_pb2.TestAllTypes, lists), decoded)
+
+
+	def test_nestedClass(self):
+		messages = [alltypes_pb2.TestAllTypes.NestedMessage(b=b) for b in xrange(5)]
+		serializer = pbliteserializer.PbLiteSerializer()
+		lists = serializer.serializeMany(messages, pool=self.pool, chunkSize=2)
+		self.assertEqual([[None, b] for b in xrange(5)], lists)
+		decoded = serializer.deserializeMany(
+			alltypes_pb2.TestAllTypes.NestedMessage, lists, pool=self.pool)
+		self.assertEqual(messages, decoded)
+
+
+	def test_errorInWorker(self):
+		pblite = getExpectedDefaults()
+		pblite[21] = 99
+		serializer = pbliteserializer.PbLiteSerializer()
+		self.assertRaises(PbDecodeError, lambda: serializer.deserializeMany(
+			alltypes_pb2.TestAllTypes, [pblite], pool=self.pool))
+
+
+	def test_metricsRejected(self):
+		"""
+		Metrics updated in the workers would be lost, so a serializer with
+		C{metrics} is rejected.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer(metrics=MetricsSink())
+		self.assertRaises(ValueError, lambda: serializer.serializeMany(
+			_getMessages(2), pool=self.pool))
+		self.assertRaises(ValueError, lambda: serializer.deserializeMany(
+			alltypes_pb2.TestAllTypes, [], pool=self.pool))
+
+
+	def test_cacheNotShipped(self):
+		# The lambda can't be pickled, so this fails if the cache is shipped.
+		cache = SubMessageCache(lambda message: message.SerializePartialToString())
+		serializer = pbliteserializer.PbLiteSerializer(cache=cache)
+		messages = _getMessages(5)
+		lists = serializer.serializeMany(messages, pool=self.pool, chunkSize=2)
+		self.assertEqual(
+			pbliteserializer.PbLiteSerializer().serializeMany(messages), lists)
+		self.assertTrue(serializer.cache is cache)
+		self.assertEqual(None, batch._getWorkerSerializer(serializer).cache)
+
+
+	def test_empty(self):
+		serializer = pbliteserializer.PbLiteSerializer()
+		self.assertEqual([], serializer.serializeMany([], pool=self.pool))
+		self.assertEqual([], serializer.deserializeMany(
+			alltypes_pb2.TestAllTypes, [], pool=self.pool))
@@ -0,0 +1,70 @@
+from unittest import TestCase
+from protojson import benchmark
+from protojson.pbliteserializer import PbLiteSerializer
+
+
+class BenchmarkTests(TestCase):
+	"""
+	Tests for L{benchmark}.
+	"""
+
+	def test_casesRoundTrip(self):
+		"""
+		Every shape has serialize, deserialize, and roundTrip benchmarks
+		for the generic serializer, the specialized one (unless it uses
+		C{omitUnset}), and the cached one (if it has a key function), and
+		the deserialized messages serialize to the same lists as the
+		originals.
+		"""
+		cases = dict(benchmark.getCases())
+		expectedCases = 0
+		for shape, getMessage, omitUnset, keyFunction in benchmark.SHAPES:
+			serializer = PbLiteSerializer(omitUnset=omitUnset)
+			expected = serializer.serialize(getMessage())
+			serializerNames = ['generic']
+			if not omitUnset:
+				serializerNames.append('specialized')
+			else:
+				self.assertFalse(shape + '/specialized/serialize' in cases)
+			if keyFunction is not None:
+				serializerNames.append('cached')
+			expectedCases += len(serializerNames) * 3
+			for serializerName in serializerNames:
+				prefix = '%s/%s/' % (shape, serializerName)
+				# Twice, so that the cached serializer has hits.
+				self.assertEqual(expected, cases[prefix + 'serialize']())
+				self.assertEqual(expected, cases[prefix + 'serialize']())
+				for op in ('deserialize', 'roundTrip'):
+					self.assertEqual(expected,
+						serializer.serialize(cases[prefix + op]()))
+		self.assertEqual(expectedCases, len(cases))
+
+
+	def test_runBenchmarks(self):
+		cases = [c for c in benchmark.getCases() if c[0].startswith('sparse/')]
+		results = benchmark.runBenchmarks(cases, minTime=0, repeat=1)
+		self.assertEqual(sorted(name for name, operation in cases), sorted(results))
+		for result in results.itervalues():
+			self.assertTrue(result['opsPerSec'] > 0)
+			self.assertTrue(result['allocations'] >= 0)
+			if benchmark.tracemalloc is None:
+				self.assertEqual(None, result['peakBytes'])
+			else:
+				self.assertTrue(result['peakBytes'] >= 0)
+		self.assertTrue('sparse/generic/serialize' in benchmark.formatResults(results))
+
+
+	def test_compareResults(self):
+		baseline = {
+			'a': {'opsPerSec': 100.0},
+			'b': {'opsPerSec': 100.0},
+			'c': {'opsPerSec': 100.0},
+		}
+		results = {
+			'a': {'opsPerSec': 95.0},
+			'b': {'opsPerSec': 50.0},
+			'd': {'opsPerSec': 10.0},
+		}
+		ratios, regressions = benchmark.compareResults(baseline, results, 0.1)
+		self.assertEqual([('a', 0.95), ('b', 0.5)], ratios)
+		self.assertEqual(['b'], regressions)
@@ -0,0 +1,106 @@
+from unittest import TestCase
+from protojson import pbliteserializer, codegen, alltypes_pb2
+from protojson.test_pbliteserializer import PbLiteDeserializeTests
+from protojson.testhelpers import getExpectedDefaults, getPopulatedMessage
+
+
+class SpecializedSerializeTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer} with C{specialize=True}.
+	"""
+
+	def test_defaults(self):
+		serializer = pbliteserializer.PbLiteSerializer(specialize=True)
+		self.assertEqual(getExpectedDefaults(),
+			serializer.serialize(alltypes_pb2.TestAllTypes()))
+
+
+	def test_sameAsGeneric(self):
+		"""
+		The specialized serializer produces the same list as the generic
+		one, with any C{fillerValue}.
+		"""
+		message = getPopulatedMessage()
+		for fillerValue in (None, 0, u''):
+			generic = pbliteserializer.PbLiteSerializer(fillerValue)
+			specialized = pbliteserializer.PbLiteSerializer(
+				fillerValue, specialize=True)
+			self.assertEqual(
+				generic.serialize(message), specialized.serialize(message))
+
+
+	def test_deserializeSameAsGeneric(self):
+		"""
+		The specialized deserializer produces the same Message as the
+		generic one.
+		"""
+		pblite = pbliteserializer.PbLiteSerializer().serialize(
+			getPopulatedMessage())
+		generic = alltypes_pb2.TestAllTypes()
+		pbliteserializer.PbLiteSerializer().deserialize(generic, pblite)
+		specialized = alltypes_pb2.TestAllTypes()
+		pbliteserializer.PbLiteSerializer(specialize=True).deserialize(
+			specialized, pblite)
+		self.assertEqual(generic, specialized)
+		self.assertEqual(pblite,
+			pbliteserializer.PbLiteSerializer().serialize(specialized))
+
+
+	def test_functionsAreCached(self):
+		"""
+		The generated functions are compiled once per message type and
+		stored on the plan.
+		"""
+		plan = pbliteserializer._getPlan(alltypes_pb2.TestAllTypes.DESCRIPTOR)
+		functions = codegen.getFunctions(plan)
+		self.assertTrue(functions is codegen.getFunctions(plan))
+		self.assertTrue(functions is plan.specialized)
+		self.assertEqual('serialize_TestAllTypes', functions[0].__name__)
+		self.assertEqual('deserialize_TestAllTypes', functions[1].__name__)
+		nestedPlan = pbliteserializer._getPlan(
+			alltypes_pb2.TestAllTypes.NestedMessage.DESCRIPTOR)
+		self.assertNotEqual(None, nestedPlan.specialized)
+
+
+	def test_cannotSpecialize(self):
+		"""
+		Field names that can't be written as attribute accesses are not
+		specialized.
+		"""
+		self.assertTrue(codegen._canSpecialize('optional_int32'))
+		self.assertFalse(codegen._canSpecialize('class'))
+		self.assertFalse(codegen._canSpecialize('not-an-identifier'))
+
+
+	def test_wrongTypeForData(self):
+		serializer = pbliteserializer.PbLiteSerializer(specialize=True)
+		for pblite in [None, 3, 4L, 0.5]:
+			messageDecoded = alltypes_pb2.TestAllTypes()
+			self.assertRaises(
+				TypeError,
+				lambda: serializer.deserialize(messageDecoded, pblite))
+
+
+
+class SpecializedDeserializeTests(PbLiteDeserializeTests):
+	"""
+	Run L{PbLiteDeserializeTests} against the specialized deserializer.
+	"""
+
+	def setUp(self):
+		self.serializer = pbliteserializer.PbLiteSerializer(specialize=True)
+
+
+	def test_noneInsteadOfNestedMessage(self):
+		"""
+		If an index which should contain a nested Message contains a
+		C{None}, L{PbLiteSerializer.deserialize} raises L{TypeError}, like
+		the generic deserializer.
+		"""
+		pblite = getExpectedDefaults()
+		pblite[18] = None
+		for serializer in (pbliteserializer.PbLiteSerializer(), self.serializer):
+			messageDecoded = alltypes_pb2.TestAllTypes()
+			self.assertRaises(
+				TypeError,
+				lambda: serializer.deserialize(messageDecoded, pblite))
@@ -0,0 +1,126 @@
+from unittest import TestCase
+from protojson import alltypes_pb2, pbliteserializer
+from protojson.delta import applyPatch, makePatch
+from protojson.error import PbDecodeError
+from protojson.testhelpers import getPopulatedMessage
+
+
+class DeltaTests(TestCase):
+	"""
+	Tests for L{protojson.delta}.
+	"""
+
+	def _copy(self, message):
+		copy = message.__class__()
+		copy.CopyFrom(message)
+		return copy
+
+
+	def _assertRoundTrip(self, old, new, serializer=None):
+		"""
+		Asserts that patching a copy of C{old} with the patch from C{old}
+		to C{new} results in a message that serializes like C{new}.
+		Returns the patch.
+		"""
+		if serializer is None:
+			serializer = pbliteserializer.PbLiteSerializer()
+		patch = makePatch(old, new, serializer)
+		self.assertEqual(patch, makePatch(serializer.serialize(old), new, serializer))
+		patched = self._copy(old)
+		applyPatch(patched, patch, serializer)
+		self.assertEqual(serializer.serialize(new), serializer.serialize(patched))
+		return patch
+
+
+	def test_noChange(self):
+		message = getPopulatedMessage()
+		self.assertEqual({}, makePatch(message, self._copy(message)))
+
+
+	def test_scalar(self):
+		old = getPopulatedMessage()
+		new = self._copy(old)
+		new.optional_int32 = 77
+		new.optional_bool = not old.optional_bool
+		patch = self._assertRoundTrip(old, new)
+		self.assertEqual({1: 77, 13: new.optional_bool and 1 or 0}, patch)
+
+
+	def test_nested(self):
+		old = getPopulatedMessage()
+		new = self._copy(old)
+		new.optional_nested_message.b = 12345
+		new.repeatedgroup[0].a.append(3)
+		patch = self._assertRoundTrip(old, new)
+		self.assertEqual({1: 12345}, patch[18])
+		self.assertEqual([0, 1], patch[46][:2])
+
+
+	def test_splices(self):
+		old = alltypes_pb2.TestAllTypes()
+		old.repeated_int32.extend([1, 2, 3, 4, 5])
+		for n in range(3):
+			old.repeated_nested_message.add().b = n
+		new = self._copy(old)
+		del new.repeated_int32[1:3]
+		new.repeated_int32.append(6)
+		new.repeated_nested_message[1].b = 10
+		patch = self._assertRoundTrip(old, new)
+		self.assertEqual([1, 4, [4, 5, 6]], patch[31])
+		self.assertEqual([1, 1, [[None, 10]]], patch[48])
+		# Inserting in the middle keeps the tail.
+		new = self._copy(old)
+		del new.repeated_int32[:]
+		new.repeated_int32.extend([1, 2, 9, 3, 4, 5])
+		self.assertEqual([2, 0, [9]], self._assertRoundTrip(old, new)[31])
+
+
+	def test_clear(self):
+		"""
+		With C{omitUnset}, fields that become unset are cleared.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		old = alltypes_pb2.TestAllTypes()
+		old.optional_int32 = 3
+		old.optional_nested_message.b = 1
+		old.repeated_string.append(u'x')
+		new = alltypes_pb2.TestAllTypes()
+		new.optionalgroup.SetInParent()
+		patch = self._assertRoundTrip(old, new, serializer)
+		self.assertEqual({1: None, 16: {}, 18: None, 44: [0, 1, []]}, patch)
+		patched = self._copy(old)
+		applyPatch(patched, patch, serializer)
+		self.assertFalse(patched.HasField('optional_int32'))
+		self.assertFalse(patched.HasField('optional_nested_message'))
+		self.assertTrue(patched.HasField('optionalgroup'))
+
+
+	def test_stringKeys(self):
+		message = alltypes_pb2.TestAllTypes()
+		applyPatch(message, {'1': 5, '18': {'1': 6}})
+		self.assertEqual(5, message.optional_int32)
+		self.assertEqual(6, message.optional_nested_message.b)
+
+
+	def test_invalid(self):
+		message = alltypes_pb2.TestAllTypes()
+		message.repeated_int32.extend([1, 2])
+		for patch in [
+			{1: 'x'},
+			{13: 2},
+			{21: 4},
+			{999: 1},
+			{31: [1, 2, []]},
+			{31: [-1, 0, []]},
+			{31: 3},
+			{31: [0, 0, ['x']]},
+			{18: 3},
+			[],
+		]:
+			self.assertRaises(PbDecodeError,
+				lambda: applyPatch(self._copy(message), patch))
+
+
+	def test_wrongType(self):
+		self.assertRaises(TypeError, lambda: makePatch(
+			alltypes_pb2.TestAllTypes.NestedMessage(), alltypes_pb2.TestAllTypes()))
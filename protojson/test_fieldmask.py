@@ -0,0 +1,204 @@
+from unittest import TestCase
+from protojson import alltypes_pb2, pbliteserializer
+from protojson.error import PbDecodeError
+from protojson.fieldmask import FieldMask, compileMask, getMask
+from protojson.testhelpers import getPopulatedMessage
+
+
+class FieldMaskTests(TestCase):
+	"""
+	Tests for L{protojson.fieldmask} and
+	L{pbliteserializer.PbLiteSerializer.serialize} with C{fields}.
+	"""
+
+	def _keep(self, serialized, tags, fillerValue=None):
+		"""
+		Returns a copy of C{serialized} with only the indices in C{tags}.
+		"""
+		return [n in tags and value or fillerValue
+			for n, value in enumerate(serialized)]
+
+
+	def test_topLevel(self):
+		message = getPopulatedMessage()
+		serializer = pbliteserializer.PbLiteSerializer(fillerValue=0)
+		full = serializer.serialize(message)
+		self.assertEqual(self._keep(full, (1, 14, 44), 0),
+			serializer.serialize(message,
+				fields=['repeated_string', 'optional_int32', 'optional_string']))
+
+
+	def test_wholeMessage(self):
+		message = getPopulatedMessage()
+		serializer = pbliteserializer.PbLiteSerializer()
+		full = serializer.serialize(message)
+		self.assertEqual(self._keep(full, (18, 48)),
+			serializer.serialize(message,
+				fields=['optional_nested_message', 'repeated_nested_message']))
+
+
+	def test_nested(self):
+		message = getPopulatedMessage()
+		message.repeated_nested_message[1].ClearField('b')
+		serializer = pbliteserializer.PbLiteSerializer()
+		self.assertEqual([[None, 100], [None, 0]],
+			serializer.serialize(message, fields=['repeated_nested_message.b'])[48])
+
+
+	def test_nestedAndWhole(self):
+		"""
+		A path to a nested field and a path to its message selects all of
+		the message.
+		"""
+		mask = compileMask(alltypes_pb2.TestAllTypes.DESCRIPTOR,
+			['optional_nested_message.b', 'optional_nested_message'])
+		self.assertEqual(1, len(mask.fields))
+		self.assertEqual(None, mask.fields[0][1])
+
+
+	def test_omitUnset(self):
+		message = alltypes_pb2.TestAllTypes()
+		message.optional_int32 = 5
+		message.optional_nested_message.b = 7
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		self.assertEqual([None, 5],
+			serializer.serialize(message, fields=['optional_int32', 'optional_bool']))
+		self.assertEqual([None, None, None, None, None, None, None, None, None,
+			None, None, None, None, None, None, None, None, None, [None, 7]],
+			serializer.serialize(message,
+				fields=['optional_nested_message.b', 'repeated_int32']))
+		self.assertEqual([], serializer.serialize(message, fields=['optional_bool']))
+		self.assertEqual([], serializer.serialize(message, fields=[]))
+
+
+	def test_deserializable(self):
+		"""
+		A masked serialization with C{omitUnset} can be deserialized, with
+		the other fields left unset.
+		"""
+		message = getPopulatedMessage()
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		masked = serializer.serialize(message,
+			fields=['required_int32', 'optional_int32', 'repeated_nested_message.b'])
+		decoded = alltypes_pb2.TestAllTypes()
+		serializer.deserialize(decoded, masked)
+		self.assertEqual(101, decoded.optional_int32)
+		self.assertFalse(decoded.HasField('optional_int64'))
+		self.assertEqual([100, 200], [child.b for child in decoded.repeated_nested_message])
+
+
+	def test_sameMask(self):
+		descriptor = alltypes_pb2.TestAllTypes.DESCRIPTOR
+		mask = getMask(descriptor, ['optional_int32', 'optional_nested_message.b'])
+		self.assertTrue(mask is getMask(
+			descriptor, ('optional_int32', 'optional_nested_message.b')))
+		self.assertTrue(mask is getMask(descriptor, mask))
+
+
+	def test_compiledMask(self):
+		message = getPopulatedMessage()
+		serializer = pbliteserializer.PbLiteSerializer()
+		mask = compileMask(message.DESCRIPTOR, ['optional_int32'])
+		self.assertTrue(isinstance(mask, FieldMask))
+		self.assertEqual(serializer.serialize(message, fields=['optional_int32']),
+			serializer.serialize(message, fields=mask))
+
+
+	def test_wrongType(self):
+		mask = compileMask(alltypes_pb2.TestAllTypes.NestedMessage.DESCRIPTOR, ['b'])
+		serializer = pbliteserializer.PbLiteSerializer()
+		self.assertRaises(ValueError,
+			lambda: serializer.serialize(getPopulatedMessage(), fields=mask))
+
+
+	def test_invalidPaths(self):
+		descriptor = alltypes_pb2.TestAllTypes.DESCRIPTOR
+		for paths in (['nonexistent'], ['optional_nested_message.c'],
+		['optional_int32.b'], [''], ['optional_nested_message.']):
+			self.assertRaises(ValueError, lambda: compileMask(descriptor, paths))
+			self.assertRaises(ValueError, lambda: getMask(descriptor, paths))
+		self.assertRaises(TypeError, lambda: getMask(descriptor, 'optional_int32'))
+
+
+
+class PartialDeserializeTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer.deserialize} with
+	C{fields}.
+	"""
+
+	def test_selectedOnly(self):
+		serializer = pbliteserializer.PbLiteSerializer()
+		data = serializer.serialize(getPopulatedMessage())
+		message = alltypes_pb2.TestAllTypes()
+		message.optional_int64 = 5
+		serializer.deserialize(message, data,
+			fields=['optional_int32', 'repeated_string', 'optional_nested_message'])
+		self.assertEqual(101, message.optional_int32)
+		self.assertEqual([u'foo', u'bar'], list(message.repeated_string))
+		self.assertEqual(112, message.optional_nested_message.b)
+		# Cleared, and not deserialized
+		self.assertFalse(message.HasField('optional_int64'))
+		self.assertFalse(message.HasField('required_int32'))
+		self.assertEqual(0, len(message.repeated_int32))
+
+
+	def test_nested(self):
+		serializer = pbliteserializer.PbLiteSerializer()
+		data = serializer.serialize(getPopulatedMessage())
+		message = alltypes_pb2.TestAllTypes()
+		serializer.deserialize(message, data, fields=['repeated_nested_message.b'])
+		self.assertEqual([100, 200], [child.b for child in message.repeated_nested_message])
+
+
+	def test_otherFieldsIgnored(self):
+		"""
+		Invalid values in fields that weren't selected are not looked at.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer()
+		data = serializer.serialize(getPopulatedMessage())
+		data[13] = 'not a bool'
+		data[18] = 'not a message'
+		message = alltypes_pb2.TestAllTypes()
+		serializer.deserialize(message, data, fields=['optional_int32'])
+		self.assertEqual(101, message.optional_int32)
+		self.assertRaises(PbDecodeError,
+			lambda: serializer.deserialize(message, data, fields=['optional_bool']))
+		self.assertRaises(PbDecodeError, lambda: serializer.deserialize(
+			message, data, fields=['optional_nested_message.b']))
+
+
+	def test_shortList(self):
+		serializer = pbliteserializer.PbLiteSerializer()
+		message = alltypes_pb2.TestAllTypes()
+		self.assertRaises(PbDecodeError, lambda: serializer.deserialize(
+			message, [None, 5], fields=['optional_int64']))
+		self.assertRaises(PbDecodeError, lambda: serializer.deserialize(
+			message, 5, fields=['optional_int64']))
+		serializer.deserialize(message, [None, 5], fields=['optional_int32'])
+		self.assertEqual(5, message.optional_int32)
+
+
+	def test_omitUnset(self):
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		message = alltypes_pb2.TestAllTypes()
+		serializer.deserialize(message, [None, 5],
+			fields=['optional_int32', 'optional_int64', 'optional_nested_message.b'])
+		self.assertEqual(5, message.optional_int32)
+		self.assertFalse(message.HasField('optional_int64'))
+		self.assertFalse(message.HasField('optional_nested_message'))
+		self.assertRaises(PbDecodeError, lambda: serializer.deserialize(
+			message, [None, 5], fields=['required_int32']))
+
+
+	def test_roundTrip(self):
+		"""
+		Deserializing the fields that were serialized gives the same
+		message as the masked serialization.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		paths = ['optional_int32', 'repeated_nested_message.b', 'optionalgroup']
+		data = serializer.serialize(getPopulatedMessage(), fields=paths)
+		message = alltypes_pb2.TestAllTypes()
+		serializer.deserialize(message, data, fields=paths)
+		self.assertEqual(data, serializer.serialize(message))
@@ -0,0 +1,210 @@
+from unittest import TestCase
+from protojson import alltypes_pb2, benchmark_pb2, pbliteserializer
+from protojson.error import PbDecodeError
+from protojson.incremental import IncrementalSerializer
+from protojson.testhelpers import getPopulatedMessage
+
+
+def _countMessages(message):
+	"""
+	Returns the number of messages serialized (without C{omitUnset}) for
+	C{message}, counting itself.
+	"""
+	count = 1
+	for field in message.DESCRIPTOR.fields:
+		if field.message_type is None:
+			continue
+		if field.label == field.LABEL_REPEATED:
+			for child in getattr(message, field.name):
+				count += _countMessages(child)
+		else:
+			count += _countMessages(getattr(message, field.name))
+	return count
+
+
+
+class IncrementalSerializerTests(TestCase):
+	"""
+	Tests for L{IncrementalSerializer}, with protobuf's change tracking.
+	"""
+	trackChanges = True
+
+	def _getMessage(self):
+		message = getPopulatedMessage()
+		for n in range(10):
+			message.repeated_nested_message.add().b = n
+		return message
+
+
+	def _getHandle(self, message, serializer=None):
+		return IncrementalSerializer(message, serializer, self.trackChanges)
+
+
+	def _markDirty(self, handle, message):
+		if not self.trackChanges:
+			handle.markDirty(message)
+
+
+	def _assertSerializes(self, handle, serializer=None):
+		if serializer is None:
+			serializer = pbliteserializer.PbLiteSerializer()
+		self.assertEqual(serializer.serialize(handle.message), handle.serialize())
+
+
+	def test_unchanged(self):
+		"""
+		Nothing is serialized again if nothing changed.
+		"""
+		handle = self._getHandle(self._getMessage())
+		self._assertSerializes(handle)
+		# Everything
+		self.assertEqual(_countMessages(handle.message), handle.rebuilt)
+		first = handle.serialize()
+		self.assertEqual(0, handle.rebuilt)
+		self.assertTrue(first is handle.serialize())
+
+
+	def test_nestedChange(self):
+		"""
+		Changing a nested message re-serializes only it and its ancestors.
+		"""
+		message = self._getMessage()
+		handle = self._getHandle(message)
+		old = handle.serialize()
+		child = message.repeated_nested_message[5]
+		child.b = 100
+		self._markDirty(handle, child)
+		self._assertSerializes(handle)
+		self.assertEqual(2, handle.rebuilt)
+		new = handle.serialize()
+		self.assertTrue(old[48][4] is new[48][4])
+		self.assertTrue(old[18] is new[18])
+
+
+	def test_scalarChange(self):
+		message = self._getMessage()
+		handle = self._getHandle(message)
+		handle.serialize()
+		message.optional_int32 = 5
+		self._markDirty(handle, message)
+		self._assertSerializes(handle)
+		self.assertEqual(1, handle.rebuilt)
+
+
+	def test_repeatedChanges(self):
+		message = self._getMessage()
+		handle = self._getHandle(message)
+		handle.serialize()
+		message.repeated_nested_message.add().b = 50
+		self._markDirty(handle, message)
+		self._assertSerializes(handle)
+		self.assertEqual(2, handle.rebuilt)
+		del message.repeated_nested_message[1:4]
+		self._markDirty(handle, message)
+		self._assertSerializes(handle)
+		self.assertEqual(1, handle.rebuilt)
+		message.repeated_nested_message[0].b = 7
+		self._markDirty(handle, message.repeated_nested_message[0])
+		self._assertSerializes(handle)
+		self.assertEqual(2, handle.rebuilt)
+
+
+	def test_omitUnset(self):
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		message = alltypes_pb2.TestAllTypes()
+		handle = self._getHandle(message, serializer)
+		self._assertSerializes(handle, serializer)
+		message.optional_nested_message.b = 1
+		# It wasn't serialized before, so its parent is what changed.
+		self._markDirty(handle, message)
+		self._assertSerializes(handle, serializer)
+		self.assertEqual(2, handle.rebuilt)
+		message.ClearField('optional_nested_message')
+		self._markDirty(handle, message)
+		self._assertSerializes(handle, serializer)
+
+
+	def test_deep(self):
+		"""
+		Nesting is limited by the serializer's C{maxDepth}, not by Python's
+		recursion limit.
+		"""
+		message = benchmark_pb2.Nested()
+		child = message
+		for n in xrange(1500):
+			# Setting a field on each level as we go keeps protobuf from
+			# recursing to mark all of the parents as populated.
+			child.value = n
+			child = child.child
+		child.value = 1500
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		handle = self._getHandle(message, serializer)
+		self.assertRaises(PbDecodeError, handle.serialize)
+		self.assertRaises(PbDecodeError, lambda: serializer.serialize(message))
+		if not self.trackChanges:
+			# With change tracking, serialize() calls protobuf's ByteSize(),
+			# which recurses.
+			serializer.maxDepth = 2000
+			handle.reset()
+			serialized = handle.serialize()
+			for n in xrange(1500):
+				self.assertEqual(n, serialized[1])
+				serialized = serialized[3]
+			self.assertEqual([None, 1500], serialized)
+
+
+	def test_reset(self):
+		handle = self._getHandle(self._getMessage())
+		handle.serialize()
+		handle.reset()
+		handle.serialize()
+		self.assertEqual(_countMessages(handle.message), handle.rebuilt)
+
+
+
+class MarkDirtyTests(IncrementalSerializerTests):
+	"""
+	Tests for L{IncrementalSerializer}, with only
+	L{IncrementalSerializer.markDirty}.
+	"""
+	trackChanges = False
+
+	def test_unmarkedChange(self):
+		"""
+		Without change tracking, unmarked changes are not noticed.
+		"""
+		message = self._getMessage()
+		handle = self._getHandle(message)
+		old = handle.serialize()
+		message.optional_int32 = 12345
+		self.assertTrue(old is handle.serialize())
+
+
+	def test_default(self):
+		"""
+		By default, only L{IncrementalSerializer.markDirty} is used, so
+		serializing the message in other ways doesn't hide changes.
+		"""
+		message = alltypes_pb2.TestAllTypes(required_int32=1)
+		message.optional_nested_message.b = 1
+		handle = IncrementalSerializer(message)
+		self.assertFalse(handle.trackChanges)
+		handle.serialize()
+		message.optional_nested_message.b = 2
+		handle.markDirty(message.optional_nested_message)
+		message.SerializeToString()
+		self.assertEqual([None, 2], handle.serialize()[18])
+
+
+	def test_parentsForgotten(self):
+		"""
+		Removed messages are removed from the parents map.
+		"""
+		message = self._getMessage()
+		handle = self._getHandle(message)
+		handle.serialize()
+		count = len(handle._parents)
+		del message.repeated_nested_message[:5]
+		handle.markDirty(message)
+		handle.serialize()
+		self.assertEqual(count - 5, len(handle._parents))
@@ -0,0 +1,149 @@
+from unittest import TestCase
+from protojson import pbliteserializer, alltypes_pb2
+from protojson.error import PbDecodeError
+from protojson.lazy import LazyMessage
+from protojson.testhelpers import getExpectedDefaults, getPopulatedMessage
+
+
+class LazyMessageTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer.deserializeLazy} and
+	L{LazyMessage}.
+	"""
+
+	def setUp(self):
+		self.serializer = pbliteserializer.PbLiteSerializer()
+
+
+	def _lazy(self, pblite):
+		return self.serializer.deserializeLazy(
+			alltypes_pb2.TestAllTypes.DESCRIPTOR, pblite)
+
+
+	def test_fieldsSameAsDeserialize(self):
+		"""
+		Every field of the view equals the same field of the eagerly
+		deserialized message.
+		"""
+		pblite = self.serializer.serialize(getPopulatedMessage())
+		message = alltypes_pb2.TestAllTypes()
+		self.serializer.deserialize(message, pblite)
+		lazy = self._lazy(pblite)
+		self.assertEqual(message.optional_int64, lazy.optional_int64)
+		self.assertEqual(message.optional_bool, lazy.optional_bool)
+		self.assertTrue(lazy.optional_bool is True)
+		self.assertEqual(message.optional_string, lazy.optional_string)
+		self.assertEqual(message.optional_nested_enum, lazy.optional_nested_enum)
+		self.assertEqual(message.optionalgroup.a, lazy.optionalgroup.a)
+		self.assertEqual(message.optional_nested_message.b,
+			lazy.optional_nested_message.b)
+		self.assertEqual(tuple(message.repeated_bool), lazy.repeated_bool)
+		self.assertEqual(tuple(message.repeated_string), lazy.repeated_string)
+		self.assertEqual([m.b for m in message.repeated_nested_message],
+			[m.b for m in lazy.repeated_nested_message])
+		self.assertEqual([list(g.a) for g in message.repeatedgroup],
+			[list(g.a) for g in lazy.repeatedgroup])
+
+
+	def test_onlyAccessedFieldsValidated(self):
+		"""
+		Invalid data in a field that is never read doesn't raise.  Reading
+		it raises L{PbDecodeError}.
+		"""
+		pblite = getExpectedDefaults()
+		pblite[2] = u'wrong-type'
+		pblite[13] = 5
+		pblite[18] = [None, u'wrong-type']
+		pblite[49] = [1, 99]
+		lazy = self._lazy(pblite)
+		self.assertEqual(0, lazy.optional_int32)
+		nested = lazy.optional_nested_message
+		for name in ('optional_int64', 'optional_bool', 'repeated_nested_enum'):
+			self.assertRaises(PbDecodeError, lambda: getattr(lazy, name))
+		self.assertRaises(PbDecodeError, lambda: nested.b)
+
+
+	def test_valuesCached(self):
+		lazy = self._lazy(getExpectedDefaults())
+		self.assertTrue(lazy.optional_nested_message is lazy.optional_nested_message)
+		self.assertTrue(lazy.repeated_int32 is lazy.repeated_int32)
+
+
+	def test_missingIndex(self):
+		"""
+		A missing index raises L{PbDecodeError} when its field is read.
+		"""
+		pblite = getExpectedDefaults()
+		pblite.pop()
+		lazy = self._lazy(pblite)
+		self.assertEqual(0, lazy.optional_int32)
+		self.assertRaises(PbDecodeError, lambda: lazy.required_int32)
+
+
+	def test_noneForOptionalAndRequired(self):
+		"""
+		Without C{omitUnset}, C{None} for a scalar field raises
+		L{PbDecodeError} when it is read, like L{PbLiteSerializer.deserialize}
+		raises for it.
+		"""
+		pblite = getExpectedDefaults()
+		pblite[2] = None
+		pblite[50] = None
+		self.assertRaises(PbDecodeError, lambda: self.serializer.deserialize(
+			alltypes_pb2.TestAllTypes(), pblite))
+		lazy = self._lazy(pblite)
+		self.assertRaises(PbDecodeError, lambda: lazy.optional_int64)
+		self.assertFalse(lazy.HasField('optional_int64'))
+		self.assertTrue(lazy.HasField('optional_int32'))
+		self.assertRaises(PbDecodeError, lambda: lazy.required_int32)
+
+
+	def test_numbersOutOfRange(self):
+		pblite = getExpectedDefaults()
+		pblite[1] = 2**31
+		pblite[3] = -1
+		pblite[4] = 2**64 - 1
+		lazy = self._lazy(pblite)
+		self.assertRaises(PbDecodeError, lambda: lazy.optional_int32)
+		self.assertRaises(PbDecodeError, lambda: lazy.optional_uint32)
+		self.assertEqual(2**64 - 1, lazy.optional_uint64)
+
+
+	def test_readOnly(self):
+		lazy = self._lazy(getExpectedDefaults())
+		def setField():
+			lazy.optional_int32 = 3
+		self.assertRaises(AttributeError, setField)
+		self.assertRaises(AttributeError, lambda: lazy.no_such_field)
+
+
+	def test_toMessage(self):
+		pblite = self.serializer.serialize(getPopulatedMessage())
+		expected = alltypes_pb2.TestAllTypes()
+		self.serializer.deserialize(expected, pblite)
+		lazy = self._lazy(pblite)
+		message = lazy.toMessage(self.serializer, alltypes_pb2.TestAllTypes())
+		self.assertEqual(expected, message)
+		self.assertRaises(TypeError, lambda: lazy.toMessage(
+			self.serializer, alltypes_pb2.TestAllTypes.NestedMessage()))
+
+
+	def test_descriptor(self):
+		lazy = self._lazy(getExpectedDefaults())
+		self.assertTrue(lazy.DESCRIPTOR is alltypes_pb2.TestAllTypes.DESCRIPTOR)
+		self.assertTrue(isinstance(lazy.optionalgroup, LazyMessage))
+
+
+	def test_omitUnset(self):
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		lazy = serializer.deserializeLazy(
+			alltypes_pb2.TestAllTypes.DESCRIPTOR, [None, 5])
+		self.assertEqual(5, lazy.optional_int32)
+		self.assertEqual(1, lazy.optional_int64)
+		self.assertEqual((), lazy.repeated_nested_message)
+		self.assertEqual(0, lazy.optional_nested_message.b)
+		self.assertFalse(lazy.HasField('optional_nested_message'))
+		self.assertRaises(PbDecodeError, lambda: lazy.required_int32)
+		lazy = serializer.deserializeLazy(
+			alltypes_pb2.TestAllTypes.DESCRIPTOR, [None] * 18 + ['x'])
+		self.assertRaises(PbDecodeError, lambda: lazy.optional_nested_message.b)
@@ -0,0 +1,98 @@
+from unittest import TestCase
+from protojson import alltypes_pb2, pbliteserializer
+from protojson.memo import SubMessageCache
+from protojson.testhelpers import getPopulatedMessage
+
+
+def _getContentKey(message):
+	return message.SerializePartialToString()
+
+
+def _getB(message):
+	return message.b
+
+
+class SubMessageCacheTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer} with a
+	L{SubMessageCache}.
+	"""
+
+	def _getMessage(self):
+		message = alltypes_pb2.TestAllTypes()
+		message.optional_nested_message.b = 1
+		for n in (1, 2, 1, 1):
+			message.repeated_nested_message.add().b = n
+		return message
+
+
+	def test_sameOutput(self):
+		for omitUnset in (False, True):
+			for specialize in (False, True):
+				expected = pbliteserializer.PbLiteSerializer(
+					omitUnset=omitUnset).serialize(getPopulatedMessage())
+				serializer = pbliteserializer.PbLiteSerializer(
+					omitUnset=omitUnset, specialize=specialize, cache=SubMessageCache(_getContentKey))
+				for n in range(2):
+					self.assertEqual(expected, serializer.serialize(getPopulatedMessage()))
+
+
+	def test_hitsAndMisses(self):
+		"""
+		Nested messages with the same content are serialized once, and
+		the result is shared.
+		"""
+		cache = SubMessageCache(_getB, types=['TestAllTypes.NestedMessage'])
+		serializer = pbliteserializer.PbLiteSerializer(cache=cache)
+		serialized = serializer.serialize(self._getMessage())
+		self.assertEqual([[None, 1], [None, 2], [None, 1], [None, 1]], serialized[48])
+		self.assertEqual(2, cache.misses)
+		self.assertEqual(3, cache.hits)
+		self.assertEqual(2, len(cache))
+		self.assertTrue(serialized[18] is serialized[48][0])
+		serializer.serialize(self._getMessage())
+		self.assertEqual(2, cache.misses)
+		self.assertEqual(8, cache.hits)
+
+
+	def test_types(self):
+		"""
+		Only nested messages of the given types are cached.
+		"""
+		cache = SubMessageCache(
+			lambda m: m.a, types=['TestAllTypes.OptionalGroup'])
+		serializer = pbliteserializer.PbLiteSerializer(cache=cache)
+		serializer.serialize(self._getMessage())
+		self.assertEqual(1, cache.misses)
+		self.assertEqual(0, cache.hits)
+
+
+	def test_eviction(self):
+		cache = SubMessageCache(
+			_getB, maxSize=1, types=['TestAllTypes.NestedMessage'])
+		serializer = pbliteserializer.PbLiteSerializer(cache=cache)
+		serializer.serialize(self._getMessage())
+		self.assertEqual(1, len(cache))
+		# 1 (miss), 1, 2 (miss, evicts 1), 1 (miss, evicts 2), 1
+		self.assertEqual(3, cache.misses)
+		self.assertEqual(2, cache.evictions)
+		cache.clear()
+		self.assertEqual((0, 0, 0, 0),
+			(len(cache), cache.hits, cache.misses, cache.evictions))
+
+
+	def test_keyFunction(self):
+		"""
+		With a C{keyFunction}, the caller decides which messages are the
+		same, and C{None} means "don't cache".
+		"""
+		cache = SubMessageCache(lambda m: m.b != 2 and 'same' or None,
+			types=['TestAllTypes.NestedMessage'])
+		serializer = pbliteserializer.PbLiteSerializer(cache=cache)
+		message = self._getMessage()
+		message.optional_nested_message.b = 3
+		serialized = serializer.serialize(message)
+		self.assertEqual([None, 3], serialized[18])
+		# Every message with the same key gets the first result.
+		self.assertEqual([[None, 3], [None, 2], [None, 3], [None, 3]], serialized[48])
+		self.assertEqual(1, len(cache))
@@ -0,0 +1,179 @@
+from unittest import TestCase
+from protojson import pbliteserializer, alltypes_pb2
+from protojson.error import PbDecodeError
+from protojson.metrics import MetricsSink
+
+
+class MetricsTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer} with a
+	L{MetricsSink}.
+	"""
+
+	def setUp(self):
+		self.sink = MetricsSink()
+		self.serializer = pbliteserializer.PbLiteSerializer(metrics=self.sink)
+
+
+	def _getMessage(self):
+		message = alltypes_pb2.TestAllTypes()
+		message.repeated_int32.extend([1, 2, 3])
+		message.repeated_nested_message.add().b = 1
+		return message
+
+
+	def _countValues(self, message):
+		"""
+		Returns the number of field values that serializing C{message}
+		without C{omitUnset} emits.
+		"""
+		count = 0
+		for field in message.DESCRIPTOR.fields:
+			value = getattr(message, field.name)
+			if field.label != field.LABEL_REPEATED:
+				value = [value]
+			count += len(value)
+			if field.message_type is not None:
+				for child in value:
+					count += self._countValues(child)
+		return count
+
+
+	def _getStats(self, operation):
+		return self.sink.getStats(operation, 'TestAllTypes')
+
+
+	def test_serialize(self):
+		message = self._getMessage()
+		serialized = self.serializer.serialize(message)
+		self.assertEqual(
+			pbliteserializer.PbLiteSerializer().serialize(message), serialized)
+		self.serializer.serialize(message)
+		stats = self._getStats('serialize')
+		self.assertEqual(2, stats.calls)
+		self.assertEqual(0, stats.errors)
+		self.assertEqual(2 * self._countValues(message), stats.elements)
+		self.assertEqual(2, stats.maxDepth)
+		self.assertTrue(stats.seconds >= 0)
+		self.assertEqual(None, self._getStats('deserialize'))
+
+
+	def test_deserialize(self):
+		serialized = self.serializer.serialize(self._getMessage())
+		decoded = alltypes_pb2.TestAllTypes()
+		self.serializer.deserialize(decoded, serialized)
+		self.assertEqual(serialized, self.serializer.serialize(decoded))
+		stats = self._getStats('deserialize')
+		self.assertEqual(1, stats.calls)
+		self.assertEqual(self._getStats('serialize').elements / 2, stats.elements)
+		self.assertEqual(2, stats.maxDepth)
+
+
+	def test_counts(self):
+		"""
+		Every field value and repeated item is counted, and so is the
+		depth of nested messages.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer(
+			omitUnset=True, metrics=self.sink)
+		message = alltypes_pb2.TestAllTypes(required_int32=1)
+		message.repeated_int32.extend([1, 2, 3])
+		serialized = serializer.serialize(message)
+		serializer.deserialize(alltypes_pb2.TestAllTypes(), serialized)
+		for operation in ('serialize', 'deserialize'):
+			stats = self._getStats(operation)
+			self.assertEqual((4, 1), (stats.elements, stats.maxDepth))
+		# The nested message counts, and so does its field.
+		message.optional_nested_message.b = 1
+		serialized = serializer.serialize(message)
+		serializer.deserialize(alltypes_pb2.TestAllTypes(), serialized)
+		for operation in ('serialize', 'deserialize'):
+			stats = self._getStats(operation)
+			self.assertEqual((4 + 6, 2), (stats.elements, stats.maxDepth))
+
+
+	def test_errors(self):
+		self.assertRaises(PbDecodeError,
+			lambda: self.serializer.deserialize(alltypes_pb2.TestAllTypes(), [None]))
+		stats = self._getStats('deserialize')
+		self.assertEqual(1, stats.calls)
+		self.assertEqual(1, stats.errors)
+		self.assertEqual(0, stats.elements)
+
+
+	def test_otherErrors(self):
+		"""
+		Exceptions other than L{PbDecodeError} count as failures too.
+		"""
+		self.assertRaises(TypeError,
+			lambda: self.serializer.deserialize(alltypes_pb2.TestAllTypes(), 5))
+		stats = self._getStats('deserialize')
+		self.assertEqual((1, 1, 0), (stats.calls, stats.errors, stats.elements))
+
+
+	def test_specialized(self):
+		"""
+		With C{metrics}, C{specialize} is not used, so everything is
+		counted the same way.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer(
+			specialize=True, metrics=self.sink)
+		serializer.serialize(self._getMessage())
+		self.serializer.serialize(self._getMessage())
+		stats = self._getStats('serialize')
+		self.assertEqual(2, stats.calls)
+		self.assertEqual(2 * self._countValues(self._getMessage()), stats.elements)
+
+
+	def test_many(self):
+		messages = [self._getMessage(), alltypes_pb2.TestAllTypes()]
+		lists = self.serializer.serializeMany(messages)
+		decoded = self.serializer.deserializeMany(alltypes_pb2.TestAllTypes, lists)
+		self.assertEqual(lists, self.serializer.serializeMany(decoded))
+		self.assertEqual(4, self._getStats('serialize').calls)
+		stats = self._getStats('deserialize')
+		self.assertEqual(2, stats.calls)
+		self.assertEqual(2, stats.maxDepth)
+
+
+	def test_fields(self):
+		message = self._getMessage()
+		serialized = self.serializer.serialize(
+			message, fields=['repeated_int32', 'repeated_nested_message.b'])
+		self.serializer.deserialize(alltypes_pb2.TestAllTypes(), serialized,
+			fields=['repeated_int32', 'repeated_nested_message.b'])
+		for operation in ('serialize', 'deserialize'):
+			stats = self._getStats(operation)
+			self.assertEqual((1, 5, 2),
+				(stats.calls, stats.elements, stats.maxDepth), operation)
+
+
+	def test_inSteps(self):
+		message = self._getMessage()
+		steps = self.serializer.serializeInSteps(message, 2)
+		steps.next()
+		# Recorded when done.
+		self.assertEqual(None, self._getStats('serialize'))
+		steps = list(steps)
+		self.assertEqual(self.serializer.serialize(message), steps[-1])
+		for step in self.serializer.deserializeInSteps(
+		alltypes_pb2.TestAllTypes(), steps[-1], 2):
+			pass
+		serializeStats = self._getStats('serialize')
+		deserializeStats = self._getStats('deserialize')
+		self.assertEqual(2, serializeStats.calls)
+		self.assertEqual(1, deserializeStats.calls)
+		self.assertEqual(serializeStats.elements / 2, deserializeStats.elements)
+		self.assertEqual(2, deserializeStats.maxDepth)
+		steps = self.serializer.deserializeInSteps(
+			alltypes_pb2.TestAllTypes(), [None], 1)
+		self.assertRaises(PbDecodeError, lambda: list(steps))
+		self.assertEqual(1, self._getStats('deserialize').errors)
+
+
+	def test_snapshot(self):
+		self.serializer.serialize(self._getMessage())
+		snapshot = self.sink.snapshot(reset=True)
+		self.assertEqual([('serialize', 'TestAllTypes')], snapshot.keys())
+		self.assertEqual(1, snapshot[('serialize', 'TestAllTypes')]['calls'])
+		self.assertEqual({}, self.sink.snapshot())
@@ -0,0 +1,182 @@
+try:
+	import json
+except ImportError:
+	# Python 2.4 and 2.5
+	import simplejson as json
+
+from unittest import TestCase
+from protojson import pbliteserializer, alltypes_pb2
+from protojson.error import PbDecodeError
+from protojson.objectserializer import ObjectSerializer, HybridSerializer
+from protojson.testhelpers import getExpectedDefaults, getPopulatedMessage
+
+
+class ObjectSerializerTests(TestCase):
+	"""
+	Tests for L{ObjectSerializer}.
+	"""
+
+	def setUp(self):
+		self.serializer = ObjectSerializer()
+
+
+	def test_empty(self):
+		self.assertEqual({}, self.serializer.serialize(alltypes_pb2.TestAllTypes()))
+
+
+	def test_onlyPopulatedFields(self):
+		message = alltypes_pb2.TestAllTypes()
+		message.optional_int32 = 3
+		message.optional_bool = False
+		message.optional_nested_message.b = 7
+		message.repeated_nested_message.add()
+		message.repeated_string.append(u'x')
+		self.assertEqual({
+			1: 3,
+			13: False,
+			18: {1: 7},
+			44: [u'x'],
+			48: [{}],
+		}, self.serializer.serialize(message))
+
+
+	def test_keyByName(self):
+		message = alltypes_pb2.TestAllTypes()
+		message.optionalgroup.a = 5
+		serializer = ObjectSerializer(keyByName=True)
+		serialized = serializer.serialize(message)
+		self.assertEqual({'optionalgroup': {'a': 5}}, serialized)
+		decoded = alltypes_pb2.TestAllTypes()
+		serializer.deserialize(decoded, json.loads(json.dumps(serialized)))
+		self.assertEqual(message, decoded)
+
+
+	def test_roundTrip(self):
+		"""
+		A message survives serializing and deserializing, including which
+		fields are populated, even if the tag numbers have been turned into
+		strings.
+		"""
+		message = getPopulatedMessage()
+		message.optional_nested_message.Clear()
+		message.optional_nested_message.SetInParent()
+		serialized = self.serializer.serialize(message)
+		serialized = dict((str(k), v) for k, v in serialized.iteritems())
+		decoded = alltypes_pb2.TestAllTypes()
+		self.serializer.deserialize(decoded, serialized)
+		self.assertEqual(message, decoded)
+		self.assertTrue(decoded.HasField('optional_nested_message'))
+		self.assertFalse(decoded.HasField('optional_uint32'))
+
+
+	def test_unknownKeysAndNoneIgnored(self):
+		decoded = alltypes_pb2.TestAllTypes()
+		self.serializer.deserialize(decoded, {'999': 1, 'x': 2, 1: None, 2: 5})
+		self.assertEqual(5, decoded.optional_int64)
+		self.assertFalse(decoded.HasField('optional_int32'))
+
+
+	def test_invalid(self):
+		for data in [
+			[], None, {13: 5}, {21: 99}, {2: u'wrong-type'}, {31: 3},
+			{18: []}, {48: [None]}, {48: 3},
+		]:
+			decoded = alltypes_pb2.TestAllTypes()
+			self.assertRaises(PbDecodeError,
+				lambda: self.serializer.deserialize(decoded, data))
+
+
+
+class HybridSerializerTests(TestCase):
+	"""
+	Tests for L{HybridSerializer}.
+	"""
+
+	def setUp(self):
+		self.serializer = HybridSerializer(threshold=20)
+
+
+	def test_lowTagsOnly(self):
+		"""
+		A message with all tags <= threshold is serialized like
+		L{pbliteserializer.PbLiteSerializer} would.
+		"""
+		message = alltypes_pb2.TestAllTypes.NestedMessage(b=3)
+		self.assertEqual(
+			pbliteserializer.PbLiteSerializer().serialize(message),
+			self.serializer.serialize(message))
+
+
+	def test_defaults(self):
+		"""
+		Unpopulated high-tag fields are not serialized, so there is no
+		trailing dict for a message without any.
+		"""
+		message = alltypes_pb2.TestAllTypes()
+		self.assertEqual(getExpectedDefaults()[:19],
+			self.serializer.serialize(message))
+
+
+	def test_trailingDict(self):
+		message = alltypes_pb2.TestAllTypes()
+		message.optional_nested_enum = alltypes_pb2.TestAllTypes.BAZ
+		message.repeated_bool.append(True)
+		message.repeatedgroup.add().a.append(4)
+		message.required_int32 = 1
+		serialized = self.serializer.serialize(message)
+		self.assertEqual(20, len(serialized))
+		# The group's only field is also above the threshold.
+		self.assertEqual({21: 3, 43: [1], 46: [[{47: [4]}]], 50: 1},
+			serialized[-1])
+
+
+	def test_roundTrip(self):
+		message = getPopulatedMessage()
+		serialized = self.serializer.serialize(message)
+		serialized[-1] = dict((str(k), v) for k, v in serialized[-1].iteritems())
+		decoded = alltypes_pb2.TestAllTypes()
+		self.serializer.deserialize(decoded, serialized)
+		expected = alltypes_pb2.TestAllTypes()
+		pbliteSerializer = pbliteserializer.PbLiteSerializer()
+		pbliteSerializer.deserialize(expected, pbliteSerializer.serialize(message))
+		self.assertEqual(
+			pbliteSerializer.serialize(expected), pbliteSerializer.serialize(decoded))
+		self.assertEqual(list(message.repeated_nested_enum),
+			list(decoded.repeated_nested_enum))
+
+
+	def test_missingDenseIndex(self):
+		serialized = self.serializer.serialize(getPopulatedMessage())
+		del serialized[5]
+		self.assertRaises(PbDecodeError,
+			lambda: self.serializer.deserialize(alltypes_pb2.TestAllTypes(), serialized))
+
+
+	def test_invalidSparseValue(self):
+		serialized = self.serializer.serialize(getPopulatedMessage())
+		serialized[-1]['49'] = [99]
+		self.assertRaises(PbDecodeError,
+			lambda: self.serializer.deserialize(alltypes_pb2.TestAllTypes(), serialized))
+
+
+	def test_publicMethods(self):
+		"""
+		L{HybridSerializer} isn't a L{pbliteserializer.PbLiteSerializer},
+		and every public method it has uses the hybrid format.
+		"""
+		self.assertFalse(isinstance(self.serializer, pbliteserializer.PbLiteSerializer))
+		self.assertEqual(
+			['deserialize', 'deserializeMany', 'fillerValue', 'serialize',
+				'serializeMany', 'threshold'],
+			sorted(name for name in dir(self.serializer) if not name.startswith('_')))
+		messages = [getPopulatedMessage(), alltypes_pb2.TestAllTypes(required_int32=3)]
+		expected = [self.serializer.serialize(message) for message in messages]
+		self.assertTrue(isinstance(expected[0][-1], dict))
+		self.assertEqual(expected, self.serializer.serializeMany(iter(messages)))
+		decoded = self.serializer.deserializeMany(
+			alltypes_pb2.TestAllTypes, iter(expected))
+		self.assertEqual(expected, self.serializer.serializeMany(decoded))
+		message = alltypes_pb2.TestAllTypes()
+		self.serializer.deserialize(message, expected[1])
+		self.assertEqual(3, message.required_int32)
+		self.assertEqual(expected[1], self.serializer.serialize(message))
@@ -0,0 +1,346 @@
+try:
+	import json
+except ImportError:
+	# Python 2.4 and 2.5
+	import simplejson as json
+
+from unittest import TestCase
+from protojson import pbliteserializer, alltypes_pb2, benchmark_pb2
+from protojson.test_pbliteserializer import PbLiteDeserializeTests
+from protojson.error import PbDecodeError
+from protojson.testhelpers import getExpectedDefaults, getPopulatedMessage
+
+
+class IterencodeTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer.iterencode} and
+	L{pbliteserializer.PbLiteSerializer.serializeToJson}.
+	"""
+
+	def setUp(self):
+		self.serializer = pbliteserializer.PbLiteSerializer()
+
+
+	def test_defaults(self):
+		encoded = self.serializer.serializeToJson(alltypes_pb2.TestAllTypes())
+		self.assertEqual(getExpectedDefaults(), json.loads(encoded))
+
+
+	def test_sameAsSerialize(self):
+		"""
+		The JSON decodes to the same list that L{PbLiteSerializer.serialize}
+		returns, and is the same text as C{json.dumps} with compact
+		separators.
+		"""
+		message = getPopulatedMessage()
+		message.optional_double = 0.1
+		message.repeated_float.extend([1.5, -2.0])
+		message.repeated_int64.extend([2**62, -1])
+		message.repeated_bytes.extend(['', 'xyz'])
+		message.repeated_string.append(u'\u2603"\\\n')
+		serialized = self.serializer.serialize(message)
+		encoded = self.serializer.serializeToJson(message)
+		self.assertEqual(serialized, json.loads(encoded))
+		self.assertEqual(json.dumps(serialized, separators=(',', ':')), encoded)
+
+
+	def test_fillerValue(self):
+		serializer = pbliteserializer.PbLiteSerializer(fillerValue=0)
+		encoded = serializer.serializeToJson(alltypes_pb2.TestAllTypes())
+		self.assertEqual(
+			serializer.serialize(alltypes_pb2.TestAllTypes()), json.loads(encoded))
+		self.assertTrue(encoded.startswith('[0,0,1,'))
+
+
+	def test_boolsAreNumbers(self):
+		message = alltypes_pb2.TestAllTypes()
+		message.optional_bool = True
+		message.repeated_bool.extend([False, True])
+		decoded = json.loads(self.serializer.serializeToJson(message))
+		self.assertEqual(1, decoded[13])
+		self.assertEqual([0, 1], decoded[43])
+
+
+	def test_repeatedMessages(self):
+		message = alltypes_pb2.TestAllTypes()
+		for b in xrange(3):
+			message.repeated_nested_message.add().b = b
+		message.repeatedgroup.add()
+		message.repeatedgroup.add().a.append(7)
+		decoded = json.loads(self.serializer.serializeToJson(message))
+		self.assertEqual([[None, 0], [None, 1], [None, 2]], decoded[48])
+		self.assertEqual([None] * 47 + [[]], decoded[46][0])
+		self.assertEqual([None] * 47 + [[7]], decoded[46][1])
+
+
+	def test_nonUtf8Bytes(self):
+		"""
+		C{bytes} that aren't UTF-8 can be encoded with C{encoding='latin-1'},
+		like with C{simplejson.dumps}.
+		"""
+		message = alltypes_pb2.TestAllTypes()
+		message.optional_bytes = '\xff'
+		self.assertRaises(UnicodeDecodeError,
+			lambda: self.serializer.serializeToJson(message))
+		encoded = self.serializer.serializeToJson(message, encoding='latin-1')
+		self.assertTrue('"\\u00ff"' in encoded)
+		self.assertEqual(u'\xff', json.loads(encoded)[15])
+
+
+	def test_omitUnset(self):
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		for message in (alltypes_pb2.TestAllTypes(), getPopulatedMessage()):
+			message.repeated_nested_message.add()
+			message.repeated_nested_message.add().b = 3
+			serialized = serializer.serialize(message)
+			encoded = serializer.serializeToJson(message)
+			self.assertEqual(json.dumps(serialized, separators=(',', ':')), encoded)
+
+
+	def test_deep(self):
+		"""
+		Messages nested deeper than Python's recursion limit are encoded,
+		and C{maxDepth} is enforced.  (Without C{omitUnset}, a recursive
+		type always reaches C{maxDepth}, because unset nested messages are
+		written with their defaults.)
+		"""
+		message = benchmark_pb2.Nested()
+		child = message
+		for n in xrange(3000):
+			# Setting a field on each level as we go keeps protobuf from
+			# recursing to mark all of the parents as populated.
+			child.value = n
+			child = child.child
+		child.value = 7
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True, maxDepth=5000)
+		encoded = serializer.serializeToJson(message)
+		self.assertEqual(3001, encoded.count('['))
+		self.assertTrue(encoded.endswith(',7]' + ']' * 3000))
+		serializer.maxDepth = 100
+		self.assertRaises(PbDecodeError, lambda: serializer.serializeToJson(message))
+		serializer = pbliteserializer.PbLiteSerializer(maxDepth=5000)
+		self.assertRaises(PbDecodeError, lambda: serializer.serializeToJson(message))
+
+
+	def test_chunks(self):
+		"""
+		L{PbLiteSerializer.iterencode} yields several C{str} chunks for
+		a large message.
+		"""
+		message = alltypes_pb2.TestAllTypes()
+		for b in xrange(1000):
+			message.repeated_nested_message.add().b = b
+		chunks = list(self.serializer.iterencode(message, bufferSize=64))
+		self.assertTrue(len(chunks) > 10)
+		for chunk in chunks:
+			self.assertTrue(isinstance(chunk, str))
+		self.assertEqual(self.serializer.serialize(message),
+			json.loads(''.join(chunks)))
+
+
+
+class _JsonSerializer(object):
+	"""
+	Deserializes through L{PbLiteSerializer.deserializeFromJson}.
+	"""
+	def __init__(self, chunkSize=None):
+		self.serializer = pbliteserializer.PbLiteSerializer()
+		self.chunkSize = chunkSize
+
+
+	def deserialize(self, message, data):
+		text = json.dumps(data)
+		if self.chunkSize is None:
+			self.serializer.deserializeFromJson(message, text)
+		else:
+			decoder = self.serializer.getDecoder(message)
+			for i in xrange(0, len(text), self.chunkSize):
+				decoder.feed(text[i:i + self.chunkSize])
+			decoder.close()
+
+
+
+class JsonDeserializeTests(PbLiteDeserializeTests):
+	"""
+	Run L{PbLiteDeserializeTests} against
+	L{pbliteserializer.PbLiteSerializer.deserializeFromJson}.
+	"""
+
+	def setUp(self):
+		self.serializer = _JsonSerializer()
+
+
+
+class ChunkedJsonDeserializeTests(PbLiteDeserializeTests):
+	"""
+	Run L{PbLiteDeserializeTests} against a
+	L{pblitejson.PbLiteDecoder} fed one character at a time.
+	"""
+
+	def setUp(self):
+		self.serializer = _JsonSerializer(chunkSize=1)
+
+
+
+class PbLiteDecoderTests(TestCase):
+	"""
+	Tests for L{pblitejson.PbLiteDecoder}.
+	"""
+
+	def setUp(self):
+		self.serializer = pbliteserializer.PbLiteSerializer()
+
+
+	def _decode(self, text):
+		message = alltypes_pb2.TestAllTypes()
+		self.serializer.deserializeFromJson(message, text)
+		return message
+
+
+	def test_sameAsDeserialize(self):
+		"""
+		Decoding the JSON text gives the same Message as
+		L{PbLiteSerializer.deserialize} on the serialized list, whether
+		the text is fed all at once or in small chunks.
+		"""
+		message = getPopulatedMessage()
+		message.repeated_float.extend([1.5, -2.0])
+		message.repeated_string.append(u'\u2603"\\\n')
+		message.repeated_bytes.append('\xff\x00')
+		text = self.serializer.serializeToJson(message, encoding='latin-1')
+		expected = alltypes_pb2.TestAllTypes()
+		self.serializer.deserialize(expected, self.serializer.serialize(message))
+
+		for chunkSize in (len(text), 1, 2, 7):
+			decoded = alltypes_pb2.TestAllTypes()
+			decoder = self.serializer.getDecoder(decoded, encoding='latin-1')
+			for i in xrange(0, len(text), chunkSize):
+				decoder.feed(text[i:i + chunkSize])
+			self.assertTrue(decoder.close() is decoded)
+			self.assertEqual(expected, decoded)
+
+
+	def test_utf8SplitAcrossChunks(self):
+		"""
+		A UTF-8 C{str} can be split in the middle of a character.
+		"""
+		pblite = getExpectedDefaults()
+		pblite[14] = u'\u2603'
+		text = json.dumps(pblite, ensure_ascii=False).encode('utf-8')
+		decoded = alltypes_pb2.TestAllTypes()
+		decoder = self.serializer.getDecoder(decoded)
+		for c in text:
+			decoder.feed(c)
+		decoder.close()
+		self.assertEqual(u'\u2603', decoded.optional_string)
+
+
+	def test_fieldsSetAsTheyArrive(self):
+		"""
+		Fields are set on the message as soon as their values are read.
+		"""
+		decoded = alltypes_pb2.TestAllTypes()
+		decoder = self.serializer.getDecoder(decoded)
+		decoder.feed('[null, 5, 6, 7')
+		self.assertEqual(5, decoded.optional_int32)
+		self.assertEqual(6, decoded.optional_int64)
+
+
+	def test_extraIndicesSkipped(self):
+		"""
+		Values at indices which are not fields are ignored, even if they
+		are nested lists or objects.
+		"""
+		pblite = getExpectedDefaults()
+		pblite[17] = [[1, {"a": [2, {}]}], u"x"]
+		pblite[19] = {"b": None, "c": [True, False]}
+		pblite.append([[]])
+		decoded = self._decode(json.dumps(pblite))
+		expected = alltypes_pb2.TestAllTypes()
+		self.serializer.deserialize(expected, getExpectedDefaults())
+		self.assertEqual(expected, decoded)
+
+
+	def test_errorOffset(self):
+		"""
+		L{PbDecodeError} includes the offset of the problem, and is raised
+		as soon as the problem is fed.
+		"""
+		decoder = self.serializer.getDecoder(alltypes_pb2.TestAllTypes())
+		decoder.feed('[null, 1, ')
+		try:
+			decoder.feed('"wrong-type", 3')
+		except PbDecodeError, e:
+			self.assertTrue('offset 10' in str(e), str(e))
+		else:
+			self.fail("Expected PbDecodeError")
+		self.assertRaises(PbDecodeError, lambda: decoder.feed('4'))
+
+
+	def test_invalidJson(self):
+		for text in ['', '[', '[1,]', '[1 2]', '{}', '5', '[]]', '[1, tru]',
+		'["\\x"]', '[1]x', '[{1: 2}]', '[null, [1]]']:
+			self.assertRaises(PbDecodeError, lambda: self._decode(text))
+
+
+	def test_objectInsteadOfField(self):
+		pblite = getExpectedDefaults()
+		pblite[18] = {}
+		self.assertRaises(PbDecodeError, lambda: self._decode(json.dumps(pblite)))
+
+
+	def test_messageMissingAnIndex(self):
+		pblite = getExpectedDefaults()
+		pblite.pop()
+		try:
+			self._decode(json.dumps(pblite))
+		except PbDecodeError, e:
+			self.assertTrue('expected index 50' in str(e), str(e))
+		else:
+			self.fail("Expected PbDecodeError")
+
+
+	def test_maxDepth(self):
+		"""
+		Nesting is limited by the serializer's C{maxDepth}, like
+		L{PbLiteSerializer.deserialize} limits it, for singular and
+		repeated Message fields.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True, maxDepth=3000)
+		text = '[null,0,null,' * 2999 + '[null,7]' + ']' * 2999
+		decoded = benchmark_pb2.Nested()
+		serializer.deserializeFromJson(decoded, text)
+		self.assertEqual(0, decoded.value)
+		serializer.maxDepth = 2999
+		self.assertRaises(PbDecodeError, lambda: serializer.deserializeFromJson(
+			benchmark_pb2.Nested(), text))
+		self.assertRaises(PbDecodeError, lambda: self.serializer.deserializeFromJson(
+			benchmark_pb2.Nested(), text))
+
+		message = alltypes_pb2.TestAllTypes(required_int32=1)
+		message.repeated_nested_message.add().b = 2
+		text = pbliteserializer.PbLiteSerializer(omitUnset=True).serializeToJson(message)
+		serializer.maxDepth = 1
+		self.assertRaises(PbDecodeError, lambda: serializer.deserializeFromJson(
+			alltypes_pb2.TestAllTypes(), text))
+		serializer.maxDepth = 2
+		decoded = alltypes_pb2.TestAllTypes()
+		serializer.deserializeFromJson(decoded, text)
+		self.assertEqual(message, decoded)
+
+
+	def test_omitUnset(self):
+		"""
+		With C{omitUnset}, short lists are accepted, and C{null} is unset.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		message = alltypes_pb2.TestAllTypes()
+		message.optional_nested_message.SetInParent()
+		message.required_int32 = 3
+		text = serializer.serializeToJson(message)
+		self.assertEqual(serializer.serialize(message), json.loads(text))
+		decoded = alltypes_pb2.TestAllTypes()
+		serializer.deserializeFromJson(decoded, text)
+		self.assertEqual(message, decoded)
+		self.assertRaises(PbDecodeError, lambda: serializer.deserializeFromJson(
+			alltypes_pb2.TestAllTypes(), '[null, 1]'))
@@ -1,64 +1,8 @@
+import sys
+
 from unittest import TestCase
-from protojson import pbliteserializer, alltypes_pb2
-
-
-def _getExpectedDefaults():
-	expectedDefaults = [
-		None, # 0
-		0, # 1
-		1, # 2
-		0, # and so on
-		0,
-		0,
-		0,
-		0,
-		0,
-		0,
-		0,
-		1.5,
-		0,
-		0,
-		u'',
-		'moo',
-		[ # 16
-			None, None, None, None, None, None, None, None, None,
-			None, None, None, None, None, None, None, None, 0],
-		None, # 17
-		[None, 0],
-		None,
-		None,
-		1,
-		None,
-		None,
-		None,
-		None,
-		None,
-		None,
-		None,
-		None,
-		None,
-		[], # 31
-		[],
-		[],
-		[],
-		[],
-		[],
-		[],
-		[],
-		[],
-		[],
-		[],
-		[],
-		[],
-		[],
-		[],
-		[], # 46
-		None, # 47
-		[], # 48
-		[], # 49
-		1, # 50
-	]
-	return expectedDefaults
+from protojson import pbliteserializer, alltypes_pb2, benchmark_pb2
+from protojson.testhelpers import getExpectedDefaults
 
 
 class PbLiteSerializeTests(TestCase):
@@ -71,7 +15,7 @@ class PbLiteSerializeTests(TestCase):
 		serializer = pbliteserializer.PbLiteSerializer()
 		ser = serializer.serialize(message)
 
-		self.assertEqual(_getExpectedDefaults(), ser)
+		self.assertEqual(getExpectedDefaults(), ser)
 
 
 	def test_serializeDeserialize(self):
@@ -171,7 +115,7 @@ class PbLiteSerializeTests(TestCase):
 		matches the original serialized data.
 		"""
 		serializer = pbliteserializer.PbLiteSerializer()
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the repeated_nested_message
 		pblite[48] = [[None, 100], [None, 200]]
 		messageDecoded = alltypes_pb2.TestAllTypes()
@@ -218,7 +162,7 @@ class PbLiteDeserializeTests(TestCase):
 		If an index which should contain an int64 field contains a string,
 		L{PbLiteSerializer.deserialize} raises L{PbDecodeError}.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the optional_int64 to a string
 		pblite[2] = u'wrong-type'
 		messageDecoded = alltypes_pb2.TestAllTypes()
@@ -232,7 +176,7 @@ class PbLiteDeserializeTests(TestCase):
 		If an index which should contain an int64 field contains a big number
 		2**128, L{PbLiteSerializer.deserialize} raises L{PbDecodeError}.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the optional_int64 to a big number
 		pblite[2] = 2**128
 		messageDecoded = alltypes_pb2.TestAllTypes()
@@ -246,7 +190,7 @@ class PbLiteDeserializeTests(TestCase):
 		If an index which should contain a list of int64s contains a list of strings,
 		L{PbLiteSerializer.deserialize} raises L{PbDecodeError}.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the repeated_int32
 		pblite[31] = [4, u'wrong-type', 5]
 		messageDecoded = alltypes_pb2.TestAllTypes()
@@ -260,7 +204,7 @@ class PbLiteDeserializeTests(TestCase):
 		If an index which should contain a list of int64s contains a None,
 		L{PbLiteSerializer.deserialize} raises L{PbDecodeError}.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the repeated_int32
 		pblite[31] = None
 		messageDecoded = alltypes_pb2.TestAllTypes()
@@ -275,7 +219,7 @@ class PbLiteDeserializeTests(TestCase):
 		contains a None, L{PbLiteSerializer.deserialize} raises
 		L{PbDecodeError}.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the repeated_nested_message
 		pblite[48] = None
 		messageDecoded = alltypes_pb2.TestAllTypes()
@@ -289,7 +233,7 @@ class PbLiteDeserializeTests(TestCase):
 		If an index which should contain a bool (or bool number) contains
 		a string, L{PbLiteSerializer.deserialize} raises L{PbDecodeError}.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the optional_bool
 		pblite[13] = u'wrong-type'
 		messageDecoded = alltypes_pb2.TestAllTypes()
@@ -303,7 +247,7 @@ class PbLiteDeserializeTests(TestCase):
 		If an index which should contain a list of bools (or bool numbers)
 		contains a string, L{PbLiteSerializer.deserialize} raises L{PbDecodeError}.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the repeated_bool
 		pblite[43] = [1, u'wrong-type', 0]
 		messageDecoded = alltypes_pb2.TestAllTypes()
@@ -317,7 +261,7 @@ class PbLiteDeserializeTests(TestCase):
 		If a serialized message has an invalid enum value,
 		L{PbLiteSerializer.deserialize} raises L{PbDecodeError}.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the optional_nested_enum
 		pblite[21] = 99 # not a valid enum value
 		messageDecoded = alltypes_pb2.TestAllTypes()
@@ -331,7 +275,7 @@ class PbLiteDeserializeTests(TestCase):
 		If a serialized message has an invalid repeated enum value,
 		L{PbLiteSerializer.deserialize} raises L{PbDecodeError}.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the repeated_nested_enum
 		pblite[49] = [1, 2, 99, 3] # 99 is not a valid enum value; the others are
 		messageDecoded = alltypes_pb2.TestAllTypes()
@@ -345,7 +289,7 @@ class PbLiteDeserializeTests(TestCase):
 		If a serialized message is missing an index which it should have,
 		L{PbLiteSerializer.deserialize} raises L{PbDecodeError}.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		pblite.pop()
 		messageDecoded = alltypes_pb2.TestAllTypes()
 		self.assertRaises(
@@ -358,7 +302,7 @@ class PbLiteDeserializeTests(TestCase):
 		If a serialized message has more indices than it should have,
 		L{PbLiteSerializer.deserialize} ignores it.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		pblite.append(u'extra-field')
 		messageDecoded = alltypes_pb2.TestAllTypes()
 		self.serializer.deserialize(messageDecoded, pblite)
@@ -369,7 +313,7 @@ class PbLiteDeserializeTests(TestCase):
 		If a serialized message has a C{None} for a required field,
 		L{PbLiteSerializer.deserialize} raises L{PbDecodeError}.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the required_int32
 		pblite[50] = None
 		messageDecoded = alltypes_pb2.TestAllTypes()
@@ -384,7 +328,7 @@ class PbLiteDeserializeTests(TestCase):
 		a default, L{PbLiteSerializer.deserialize} ignores the None and
 		uses the default value.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the optional_int64
 		pblite[2] = None
 		messageDecoded = alltypes_pb2.TestAllTypes()
@@ -398,9 +342,600 @@ class PbLiteDeserializeTests(TestCase):
 		a default, L{PbLiteSerializer.deserialize} ignores the None and
 		the decoded Message is missing the field.
 		"""
-		pblite = _getExpectedDefaults()
+		pblite = getExpectedDefaults()
 		# Set the optional_int32
 		pblite[1] = None
 		messageDecoded = alltypes_pb2.TestAllTypes()
 		self.assertFalse(messageDecoded.HasField("optional_int32"))
 		self.assertEqual(0, messageDecoded.optional_int32)
+
+
+
+class MessagePlanTests(TestCase):
+	"""
+	Tests for L{pbliteserializer._getPlan}.
+	"""
+
+	def test_cachedPerDescriptor(self):
+		"""
+		L{pbliteserializer._getPlan} returns the same plan every time it is
+		called with the same descriptor, including for nested types.
+		"""
+		descriptor = alltypes_pb2.TestAllTypes.DESCRIPTOR
+		plan = pbliteserializer._getPlan(descriptor)
+		self.assertTrue(plan is pbliteserializer._getPlan(descriptor))
+		nestedPlan = pbliteserializer._getPlan(
+			alltypes_pb2.TestAllTypes.NestedMessage.DESCRIPTOR)
+		fieldPlan = [f for f in plan.fields if f[1] == 'optional_nested_message'][0]
+		self.assertTrue(nestedPlan is fieldPlan[5])
+
+
+	def test_planContents(self):
+		"""
+		The plan has the length of the PbLite list and one entry per field,
+		sorted by tag, with the right kinds.
+		"""
+		plan = pbliteserializer._getPlan(alltypes_pb2.TestAllTypes.DESCRIPTOR)
+		self.assertEqual(len(getExpectedDefaults()), plan.length)
+		tags = [f[0] for f in plan.fields]
+		self.assertEqual(sorted(tags), tags)
+		byName = dict((f[1], f) for f in plan.fields)
+		self.assertEqual(pbliteserializer.KIND_BOOL, byName['optional_bool'][2])
+		self.assertEqual(pbliteserializer.KIND_ENUM, byName['repeated_nested_enum'][2])
+		self.assertEqual(True, byName['repeated_nested_enum'][3])
+		self.assertEqual(frozenset([1, 2, 3]), byName['repeated_nested_enum'][4])
+		self.assertEqual(pbliteserializer.KIND_MESSAGE, byName['optionalgroup'][2])
+		self.assertEqual(18, byName['optionalgroup'][5].length)
+		self.assertEqual(pbliteserializer.KIND_SCALAR, byName['optional_string'][2])
+
+
+	def test_emptyMessage(self):
+		"""
+		A plan for a message type with no fields has length 0, and its
+		messages serialize to an empty list.
+		"""
+		from google.protobuf import descriptor, descriptor_pb2, message_factory
+		emptyDescriptor = descriptor.MakeDescriptor(
+			descriptor_pb2.DescriptorProto(name='Empty'))
+		plan = pbliteserializer._getPlan(emptyDescriptor)
+		self.assertEqual(0, plan.length)
+		self.assertEqual((), plan.fields)
+		messageClass = message_factory.MessageFactory().GetPrototype(emptyDescriptor)
+		serializer = pbliteserializer.PbLiteSerializer()
+		self.assertEqual([], serializer.serialize(messageClass()))
+		serializer.deserialize(messageClass(), [])
+
+
+
+class OmitUnsetTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer} with C{omitUnset=True}.
+	"""
+
+	def setUp(self):
+		self.serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+
+
+	def test_empty(self):
+		self.assertEqual([], self.serializer.serialize(alltypes_pb2.TestAllTypes()))
+
+
+	def test_onlySetFields(self):
+		"""
+		Unset fields (including empty repeated fields and unset messages)
+		get the filler, and the list ends at the last set field.
+		"""
+		message = alltypes_pb2.TestAllTypes()
+		message.optional_int64 = 1
+		message.optional_nested_message.SetInParent()
+		message.repeated_nested_enum.append(2)
+		message.repeated_bool.append(True)
+		expected = [None] * 50
+		expected[2] = 1
+		expected[18] = []
+		expected[43] = [1]
+		expected[49] = [2]
+		self.assertEqual(expected, self.serializer.serialize(message))
+
+
+	def test_fillerValue(self):
+		serializer = pbliteserializer.PbLiteSerializer(fillerValue=0, omitUnset=True)
+		message = alltypes_pb2.TestAllTypes(optional_uint32=5)
+		self.assertEqual([0, 0, 0, 5], serializer.serialize(message))
+
+
+	def test_roundTrip(self):
+		"""
+		Which fields are set survives serializing and deserializing.
+		"""
+		message = alltypes_pb2.TestAllTypes()
+		message.optional_int32 = 0
+		message.optional_string = u'x'
+		message.optionalgroup.SetInParent()
+		message.repeatedgroup.add().a.append(3)
+		message.repeated_nested_message.add()
+		message.required_int32 = 7
+		decoded = alltypes_pb2.TestAllTypes()
+		self.serializer.deserialize(decoded, self.serializer.serialize(message))
+		self.assertEqual(message, decoded)
+		self.assertTrue(decoded.HasField('optional_int32'))
+		self.assertTrue(decoded.HasField('optionalgroup'))
+		self.assertFalse(decoded.HasField('optional_int64'))
+		self.assertFalse(decoded.HasField('optional_nested_message'))
+
+
+	def test_shortListAccepted(self):
+		pblite = [None, 5]
+		pblite.extend([None] * 48)
+		pblite.append(1)
+		decoded = alltypes_pb2.TestAllTypes()
+		self.serializer.deserialize(decoded, pblite)
+		self.assertEqual(5, decoded.optional_int32)
+		self.assertEqual([], list(decoded.repeated_int32))
+		self.assertTrue(decoded.IsInitialized())
+
+
+	def test_requiredFieldMissing(self):
+		"""
+		A missing or C{None} required field is still an error.
+		"""
+		for pblite in ([None, 5], [None] * 50 + [None]):
+			decoded = alltypes_pb2.TestAllTypes()
+			self.assertRaises(pbliteserializer.PbDecodeError,
+				lambda: self.serializer.deserialize(decoded, pblite))
+
+
+	def test_invalidValueStillRejected(self):
+		pblite = [None] * 50 + [1]
+		pblite[13] = 5
+		self.assertRaises(pbliteserializer.PbDecodeError,
+			lambda: self.serializer.deserialize(alltypes_pb2.TestAllTypes(), pblite))
+
+
+	def test_stringInsteadOfMessage(self):
+		"""
+		A C{str}, C{unicode}, or C{dict} where a nested message is expected
+		is not taken for a message with every field unset.
+		"""
+		for value in ('x', u'x', {}):
+			for tag in (18, 48):
+				pblite = [None] * 50 + [1]
+				pblite[tag] = [value] if tag == 48 else value
+				self.assertRaises(pbliteserializer.PbDecodeError,
+					lambda: self.serializer.deserialize(alltypes_pb2.TestAllTypes(), pblite))
+				self.assertRaises(pbliteserializer.PbDecodeError,
+					lambda: self.serializer.deserialize(
+						alltypes_pb2.TestAllTypes(), pblite, fields=['optional_nested_message',
+							'repeated_nested_message']))
+			self.assertRaises(pbliteserializer.PbDecodeError,
+				lambda: self.serializer.deserialize(alltypes_pb2.TestAllTypes(), value))
+
+
+	def test_specializeIgnored(self):
+		"""
+		C{specialize} falls back to the generic code when C{omitUnset}.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer(
+			specialize=True, omitUnset=True)
+		message = alltypes_pb2.TestAllTypes(optional_int32=3)
+		self.assertEqual([None, 3], serializer.serialize(message))
+
+
+
+class RepeatedArrayTests(TestCase):
+	"""
+	Tests for repeated scalar fields as C{array.array}s (and NumPy arrays),
+	and for L{pbliteserializer.PbLiteSerializer}'s C{repeatedArrays}.
+	"""
+
+	def _getMessage(self):
+		message = alltypes_pb2.TestAllTypes()
+		message.repeated_int32.extend([1, -2])
+		message.repeated_uint64.append(2**63)
+		message.repeated_double.extend([0.5, 1.5])
+		message.repeated_bool.extend([True, False])
+		message.repeated_string.append(u'x')
+		message.repeated_nested_enum.append(3)
+		message.repeated_nested_message.add().b = 4
+		return message
+
+
+	def test_deserializeArrays(self):
+		"""
+		The deserializer accepts C{array.array}s for repeated fields.
+		"""
+		import array
+		pblite = getExpectedDefaults()
+		pblite[31] = array.array('i', [1, -2])
+		pblite[42] = array.array('d', [0.5, 1.5])
+		pblite[43] = array.array('b', [1, 0])
+		pblite[49] = array.array('i', [3])
+		decoded = alltypes_pb2.TestAllTypes()
+		pbliteserializer.PbLiteSerializer().deserialize(decoded, pblite)
+		self.assertEqual([1, -2], list(decoded.repeated_int32))
+		self.assertEqual([0.5, 1.5], list(decoded.repeated_double))
+		self.assertEqual([True, False], list(decoded.repeated_bool))
+		self.assertEqual([3], list(decoded.repeated_nested_enum))
+
+
+	def test_invalidValues(self):
+		"""
+		Invalid items anywhere in a repeated field raise L{PbDecodeError}
+		and add nothing to the field.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer()
+		for tag, value in [
+			(31, [1, 'x']),
+			(31, [1, 2**40]),
+			(43, [1, 2]),
+			(43, [1, [1]]),
+			(49, [1, 4]),
+			(49, [1, [1]]),
+			(31, 3),
+		]:
+			pblite = getExpectedDefaults()
+			pblite[tag] = value
+			decoded = alltypes_pb2.TestAllTypes()
+			self.assertRaises(pbliteserializer.PbDecodeError,
+				lambda: serializer.deserialize(decoded, pblite))
+
+
+	def test_repeatedArraysArray(self):
+		"""
+		With C{repeatedArrays='array'}, repeated numeric and bool fields
+		are serialized as C{array.array}s, and deserialize to the same
+		message.
+		"""
+		import array
+		serializer = pbliteserializer.PbLiteSerializer(repeatedArrays='array')
+		message = self._getMessage()
+		serialized = serializer.serialize(message)
+		self.assertEqual(array.array('i', [1, -2]), serialized[31])
+		self.assertEqual(array.array('d', [0.5, 1.5]), serialized[42])
+		self.assertEqual(array.array('b', [1, 0]), serialized[43])
+		self.assertEqual(array.array('i', [3]), serialized[49])
+		self.assertEqual([u'x'], serialized[44])
+		self.assertEqual([[None, 4]], serialized[48])
+		self.assertEqual(
+			pbliteserializer.PbLiteSerializer().serialize(message),
+			[getattr(v, 'tolist', lambda: v)() for v in serialized])
+		decoded = alltypes_pb2.TestAllTypes()
+		serializer.deserialize(decoded, serialized)
+		self.assertEqual(list(message.repeated_uint64), list(decoded.repeated_uint64))
+		self.assertEqual(serialized, serializer.serialize(decoded))
+
+
+	def test_repeatedArraysNumpy(self):
+		try:
+			import numpy
+		except ImportError:
+			self.skipTest("numpy is not installed")
+		serializer = pbliteserializer.PbLiteSerializer(repeatedArrays='numpy')
+		message = self._getMessage()
+		serialized = serializer.serialize(message)
+		self.assertEqual(numpy.dtype('int32'), serialized[31].dtype)
+		self.assertEqual(numpy.dtype('uint64'), serialized[34].dtype)
+		self.assertEqual([2**63], serialized[34].tolist())
+		decoded = alltypes_pb2.TestAllTypes()
+		serializer.deserialize(decoded, serialized)
+		self.assertEqual(
+			pbliteserializer.PbLiteSerializer().serialize(message),
+			pbliteserializer.PbLiteSerializer().serialize(decoded))
+
+
+	def test_invalidRepeatedArrays(self):
+		self.assertRaises(ValueError,
+			lambda: pbliteserializer.PbLiteSerializer(repeatedArrays='list'))
+
+
+
+class MaxDepthTests(TestCase):
+	"""
+	Tests for deeply nested messages and L{pbliteserializer.PbLiteSerializer}'s
+	C{maxDepth}.
+	"""
+
+	def _getNested(self, depth):
+		"""
+		Returns a L{benchmark_pb2.Nested} nested C{depth} deep, and its
+		C{omitUnset} serialization.
+		"""
+		message = benchmark_pb2.Nested()
+		child = message
+		for n in xrange(depth - 1):
+			child.value = n
+			child = child.child
+		child.value = depth
+		data = [None, depth]
+		for n in xrange(depth - 2, -1, -1):
+			data = [None, n, None, data]
+		return message, data
+
+
+	def _assertNestedEqual(self, expected, data):
+		"""
+		Like C{assertEqual} for the lists from L{_getNested}, which are too
+		deep to compare with C{==}.
+		"""
+		while len(expected) == 4:
+			self.assertEqual(expected[:3], data[:3])
+			expected = expected[3]
+			data = data[3]
+		self.assertEqual(expected, data)
+
+
+	def test_deeperThanRecursionLimit(self):
+		"""
+		Nesting deeper than Python's recursion limit works, because nested
+		messages are not handled recursively.
+		"""
+		depth = sys.getrecursionlimit() + 100
+		message, data = self._getNested(depth)
+		serializer = pbliteserializer.PbLiteSerializer(
+			omitUnset=True, maxDepth=depth)
+		self._assertNestedEqual(data, serializer.serialize(message))
+		decoded = benchmark_pb2.Nested()
+		serializer.deserialize(decoded, data)
+		self._assertNestedEqual(data, serializer.serialize(decoded))
+
+
+	def test_tooDeep(self):
+		message, data = self._getNested(11)
+		for specialize in (False, True):
+			serializer = pbliteserializer.PbLiteSerializer(
+				omitUnset=True, maxDepth=10, specialize=specialize)
+			self.assertRaises(pbliteserializer.PbDecodeError,
+				lambda: serializer.serialize(message))
+			self.assertRaises(pbliteserializer.PbDecodeError,
+				lambda: serializer.deserialize(benchmark_pb2.Nested(), data))
+			serializer.maxDepth = 11
+			self.assertEqual(data, serializer.serialize(message))
+			serializer.deserialize(benchmark_pb2.Nested(), data)
+
+
+	def test_denseRecursiveType(self):
+		"""
+		Without C{omitUnset}, a recursive message type would be serialized
+		forever, so it raises L{PbDecodeError} at C{maxDepth}.
+		"""
+		for specialize in (False, True):
+			serializer = pbliteserializer.PbLiteSerializer(specialize=specialize)
+			self.assertRaises(pbliteserializer.PbDecodeError,
+				lambda: serializer.serialize(benchmark_pb2.Nested()))
+
+
+	def test_repeatedGroups(self):
+		message = alltypes_pb2.TestAllTypes()
+		for n in xrange(5):
+			message.repeatedgroup.add().a.extend([n, n + 1])
+		serializer = pbliteserializer.PbLiteSerializer(maxDepth=2)
+		serialized = serializer.serialize(message)
+		self.assertEqual([[None] * 47 + [[n, n + 1]] for n in xrange(5)], serialized[46])
+		decoded = alltypes_pb2.TestAllTypes()
+		serializer.deserialize(decoded, serialized)
+		self.assertEqual(serialized, serializer.serialize(decoded))
+		serializer.maxDepth = 1
+		self.assertRaises(pbliteserializer.PbDecodeError,
+			lambda: serializer.serialize(message))
+
+
+	def test_getNesting(self):
+		self.assertEqual(2, pbliteserializer._getNesting(
+			pbliteserializer._getPlan(alltypes_pb2.TestAllTypes.DESCRIPTOR)))
+		self.assertEqual(1, pbliteserializer._getNesting(
+			pbliteserializer._getPlan(benchmark_pb2.Sparse.DESCRIPTOR)))
+		self.assertEqual(None, pbliteserializer._getNesting(
+			pbliteserializer._getPlan(benchmark_pb2.Nested.DESCRIPTOR)))
+
+
+
+class InStepsTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer.serializeInSteps} and
+	L{pbliteserializer.PbLiteSerializer.deserializeInSteps}.
+	"""
+
+	def _getMessage(self):
+		message = alltypes_pb2.TestAllTypes(required_int32=1)
+		for n in xrange(500):
+			message.repeated_nested_message.add().b = n
+		message.repeated_int32.extend(range(300))
+		message.optional_nested_message.b = 5
+		return message
+
+
+	def test_sameAsSerialize(self):
+		message = self._getMessage()
+		for serializer in (pbliteserializer.PbLiteSerializer(),
+		pbliteserializer.PbLiteSerializer(omitUnset=True, fillerValue=None)):
+			steps = list(serializer.serializeInSteps(message, stepSize=100))
+			self.assertEqual(serializer.serialize(message), steps[-1])
+			self.assertEqual([None] * (len(steps) - 1), steps[:-1])
+			# 500 messages, 300 ints, and the fields of the top message
+			self.assertTrue(6 <= len(steps) <= 25, len(steps))
+
+
+	def test_sameAsDeserialize(self):
+		serializer = pbliteserializer.PbLiteSerializer()
+		data = serializer.serialize(self._getMessage())
+		decoded = alltypes_pb2.TestAllTypes()
+		decoded.optional_int32 = 99
+		steps = list(serializer.deserializeInSteps(decoded, data, stepSize=100))
+		self.assertEqual([None] * len(steps), steps)
+		self.assertTrue(8 <= len(steps) <= 25, len(steps))
+		self.assertEqual(data, serializer.serialize(decoded))
+
+
+	def test_noSteps(self):
+		serializer = pbliteserializer.PbLiteSerializer()
+		message = self._getMessage()
+		self.assertEqual([serializer.serialize(message)],
+			list(serializer.serializeInSteps(message, stepSize=None)))
+
+
+	def test_error(self):
+		serializer = pbliteserializer.PbLiteSerializer()
+		data = serializer.serialize(self._getMessage())
+		data[48][400][1] = 'x'
+		steps = serializer.deserializeInSteps(alltypes_pb2.TestAllTypes(), data, 100)
+		self.assertRaises(pbliteserializer.PbDecodeError, lambda: list(steps))
+
+
+
+class Base64BytesTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer}'s C{base64Bytes}.
+	"""
+
+	def _getMessage(self):
+		message = alltypes_pb2.TestAllTypes(required_int32=1)
+		message.optional_bytes = '\x00\xff\x80abc'
+		message.optional_string = u'abc'
+		message.repeated_bytes.extend(['', '\xfe', 'x' * 100])
+		message.repeated_nested_message.add().b = 4
+		return message
+
+
+	def test_serialize(self):
+		serialized = pbliteserializer.PbLiteSerializer(
+			base64Bytes=True).serialize(self._getMessage())
+		self.assertEqual('AP+AYWJj', serialized[15])
+		self.assertEqual(['', '/g==', 'eHh4' * 33 + 'eA=='], serialized[45])
+		# Strings aren't affected.
+		self.assertEqual(u'abc', serialized[14])
+
+
+	def test_roundTrip(self):
+		message = self._getMessage()
+		for serializer in (
+		pbliteserializer.PbLiteSerializer(base64Bytes=True),
+		pbliteserializer.PbLiteSerializer(base64Bytes=True, omitUnset=True),
+		pbliteserializer.PbLiteSerializer(base64Bytes=True, specialize=True)):
+			# Without omitUnset, every field of decoded is set, so compare
+			# the bytes fields and the serialized forms.
+			serialized = serializer.serialize(message)
+			decoded = alltypes_pb2.TestAllTypes()
+			serializer.deserialize(decoded, serialized)
+			self.assertEqual(message.optional_bytes, decoded.optional_bytes)
+			self.assertEqual(message.repeated_bytes, decoded.repeated_bytes)
+			self.assertEqual(serialized, serializer.serialize(decoded))
+			decoded = alltypes_pb2.TestAllTypes()
+			serializer.deserializeFromJson(
+				decoded, serializer.serializeToJson(message))
+			self.assertEqual(message.optional_bytes, decoded.optional_bytes)
+			self.assertEqual(serialized, serializer.serialize(decoded))
+
+
+	def test_json(self):
+		"""
+		The JSON encoding of base64 C{bytes} is the same with or without
+		the intermediate list, and needs no C{encoding}.
+		"""
+		import json
+		serializer = pbliteserializer.PbLiteSerializer(base64Bytes=True)
+		message = self._getMessage()
+		self.assertEqual(
+			json.loads(serializer.serializeToJson(message)),
+			json.loads(json.dumps(serializer.serialize(message))))
+
+
+	def test_unicodeInput(self):
+		"""
+		Strings from a JSON decoder are C{unicode}.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer(base64Bytes=True)
+		data = serializer.serialize(self._getMessage())
+		data[15] = u'AAE='
+		data[45] = [u'/g==']
+		decoded = alltypes_pb2.TestAllTypes()
+		serializer.deserialize(decoded, data)
+		self.assertEqual('\x00\x01', decoded.optional_bytes)
+		self.assertEqual(['\xfe'], list(decoded.repeated_bytes))
+
+
+	def test_invalid(self):
+		"""
+		Invalid base64 is rejected by every way of reading PbLite lists.
+		"""
+		from protojson import wire
+		descriptor = alltypes_pb2.TestAllTypes.DESCRIPTOR
+		for serializer in (
+		pbliteserializer.PbLiteSerializer(base64Bytes=True),
+		pbliteserializer.PbLiteSerializer(base64Bytes=True, specialize=True)):
+			for tag, value in [
+				(15, 'abc'),
+				(15, u'\xe9\xe9\xe9\xe9'),
+				(15, 4),
+				(45, ['AA==', 'abc']),
+				(45, [None]),
+			]:
+				data = serializer.serialize(self._getMessage())
+				data[tag] = value
+				self.assertRaises(pbliteserializer.PbDecodeError,
+					lambda: serializer.deserialize(alltypes_pb2.TestAllTypes(), data))
+				self.assertNotEqual(None, serializer.validate(descriptor, data))
+				lazy = serializer.deserializeLazy(descriptor, data)
+				self.assertRaises(pbliteserializer.PbDecodeError,
+					lambda: (lazy.optional_bytes, lazy.repeated_bytes))
+				self.assertRaises(pbliteserializer.PbDecodeError,
+					lambda: serializer.deserializeRecord(descriptor, data))
+				self.assertRaises(pbliteserializer.PbDecodeError,
+					lambda: wire.pbLiteToWire(descriptor, data, serializer))
+
+
+	def test_specialized(self):
+		"""
+		The L{protojson.codegen} functions are used with C{base64Bytes},
+		and give the same results as the generic code.
+		"""
+		message = self._getMessage()
+		generic = pbliteserializer.PbLiteSerializer(base64Bytes=True)
+		serializer = pbliteserializer.PbLiteSerializer(
+			base64Bytes=True, specialize=True)
+		plan = pbliteserializer._getPlan(message.DESCRIPTOR)
+		self.assertNotEqual(None, serializer._getSpecializedFunctions(plan))
+		serialized = serializer.serialize(message)
+		self.assertEqual(generic.serialize(message), serialized)
+		decoded = alltypes_pb2.TestAllTypes()
+		serializer.deserialize(decoded, serialized)
+		self.assertEqual(message.optional_bytes, decoded.optional_bytes)
+		self.assertEqual(message.repeated_bytes, decoded.repeated_bytes)
+		decoded = serializer.deserializeMany(alltypes_pb2.TestAllTypes, [serialized])[0]
+		self.assertEqual(message.optional_bytes, decoded.optional_bytes)
+
+
+	def test_validateAndLazy(self):
+		serializer = pbliteserializer.PbLiteSerializer(base64Bytes=True)
+		descriptor = alltypes_pb2.TestAllTypes.DESCRIPTOR
+		data = serializer.serialize(self._getMessage())
+		self.assertEqual(None, serializer.validate(descriptor, data))
+		lazy = serializer.deserializeLazy(descriptor, data)
+		self.assertEqual('\x00\xff\x80abc', lazy.optional_bytes)
+		self.assertEqual(('', '\xfe', 'x' * 100), lazy.repeated_bytes)
+
+
+	def test_wire(self):
+		from protojson import wire
+		serializer = pbliteserializer.PbLiteSerializer(base64Bytes=True)
+		descriptor = alltypes_pb2.TestAllTypes.DESCRIPTOR
+		message = self._getMessage()
+		serialized = serializer.serialize(message)
+		self.assertEqual(serialized,
+			wire.wireToPbLite(descriptor, message.SerializeToString(), serializer))
+		decoded = alltypes_pb2.TestAllTypes()
+		decoded.ParseFromString(wire.pbLiteToWire(descriptor, serialized, serializer))
+		self.assertEqual(message.optional_bytes, decoded.optional_bytes)
+		self.assertEqual(message.repeated_bytes, decoded.repeated_bytes)
+		self.assertEqual(serialized, serializer.serialize(decoded))
+
+
+	def test_incremental(self):
+		from protojson.incremental import IncrementalSerializer
+		serializer = pbliteserializer.PbLiteSerializer(base64Bytes=True)
+		message = self._getMessage()
+		incremental = IncrementalSerializer(message, serializer)
+		self.assertEqual(serializer.serialize(message), incremental.serialize())
+		message.optional_bytes = '\x01'
+		message.repeated_bytes.append('\x02')
+		incremental.markDirty(message)
+		self.assertEqual(serializer.serialize(message), incremental.serialize())
@@ -0,0 +1,183 @@
+from unittest import TestCase
+from protojson import pbliteserializer, alltypes_pb2, benchmark_pb2
+from protojson.error import PbDecodeError
+from protojson.records import Record, getRecordClass
+from protojson.testhelpers import getExpectedDefaults, getPopulatedMessage
+
+
+class RecordTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer.deserializeRecord} and
+	L{protojson.records}.
+	"""
+
+	def setUp(self):
+		self.serializer = pbliteserializer.PbLiteSerializer()
+
+
+	def _record(self, pblite, serializer=None):
+		return (serializer or self.serializer).deserializeRecord(
+			alltypes_pb2.TestAllTypes.DESCRIPTOR, pblite)
+
+
+	def _assertSameAsMessage(self, message, record):
+		self.assertTrue(record.DESCRIPTOR is message.DESCRIPTOR)
+		for field in message.DESCRIPTOR.fields:
+			expected = getattr(message, field.name)
+			value = getattr(record, field.name)
+			if field.label == field.LABEL_REPEATED:
+				self.assertTrue(isinstance(value, tuple), field.name)
+				self.assertEqual(len(expected), len(value), field.name)
+				if field.message_type is not None:
+					for child, childRecord in zip(expected, value):
+						self._assertSameAsMessage(child, childRecord)
+				else:
+					self.assertEqual(list(expected), list(value), field.name)
+			elif field.message_type is not None:
+				self._assertSameAsMessage(expected, value)
+			else:
+				self.assertEqual(expected, value, field.name)
+				self.assertEqual(type(expected), type(value), field.name)
+
+
+	def test_sameAsDeserialize(self):
+		for pblite in (getExpectedDefaults(),
+		self.serializer.serialize(getPopulatedMessage())):
+			message = alltypes_pb2.TestAllTypes()
+			self.serializer.deserialize(message, pblite)
+			self._assertSameAsMessage(message, self._record(pblite))
+
+
+	def test_sameInvalidData(self):
+		"""
+		Data that L{PbLiteSerializer.deserialize} rejects is rejected.
+		"""
+		for tag, value in [
+			(1, 2**31),
+			(1, u'1'),
+			(13, 2),
+			(14, '\xff'),
+			(16, [None, u'x']),
+			(18, [None, u'x']),
+			(21, 99),
+			(43, [1, 2]),
+			(49, [1, 99]),
+			(49, [1.0]),
+			(31, 5),
+		]:
+			pblite = getExpectedDefaults()
+			pblite[tag] = value
+			self.assertRaises(PbDecodeError, lambda: self.serializer.deserialize(
+				alltypes_pb2.TestAllTypes(), pblite))
+			self.assertRaises(PbDecodeError, lambda: self._record(pblite))
+
+
+	def test_notAList(self):
+		pblite = getExpectedDefaults()
+		for value in (5, None):
+			pblite[16] = value
+			self.assertRaises(PbDecodeError, lambda: self._record(pblite))
+		self.assertRaises(PbDecodeError, lambda: self._record(5))
+
+
+	def test_stringInsteadOfMessage(self):
+		"""
+		With C{omitUnset}, a C{str} where a nested message is expected is
+		rejected, as L{PbLiteSerializer.deserialize} rejects it.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		for tag, value in ((18, 'x'), (48, [u'x']), (18, {})):
+			pblite = [None] * 50 + [1]
+			pblite[tag] = value
+			self.assertRaises(PbDecodeError, lambda: self._record(pblite, serializer))
+		self.assertRaises(PbDecodeError, lambda: self._record('x', serializer))
+
+
+	def test_missingIndex(self):
+		pblite = getExpectedDefaults()
+		pblite.pop()
+		self.assertRaises(PbDecodeError, lambda: self._record(pblite))
+
+
+	def test_none(self):
+		"""
+		Without C{omitUnset}, C{None} is rejected for every kind of field,
+		as L{PbLiteSerializer.deserialize} rejects it.
+		"""
+		for tag in (1, 2, 13, 14, 15, 21, 31, 48, 50):
+			pblite = getExpectedDefaults()
+			pblite[tag] = None
+			self.assertRaises(PbDecodeError, lambda: self.serializer.deserialize(
+				alltypes_pb2.TestAllTypes(), pblite))
+			self.assertRaises(PbDecodeError, lambda: self._record(pblite))
+
+
+	def test_omitUnset(self):
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		message = alltypes_pb2.TestAllTypes(required_int32=3)
+		message.repeated_nested_message.add().b = 4
+		record = self._record(serializer.serialize(message), serializer)
+		self.assertEqual(3, record.required_int32)
+		self.assertEqual(1, record.optional_int64)
+		self.assertEqual((), record.repeated_int32)
+		self.assertEqual(None, record.optional_nested_message)
+		self.assertEqual(4, record.repeated_nested_message[0].b)
+		self.assertRaises(PbDecodeError, lambda: self._record([None, 5], serializer))
+
+
+	def test_readOnly(self):
+		record = self._record(getExpectedDefaults())
+		def setField():
+			record.optional_int32 = 3
+		def delField():
+			del record.optional_int32
+		self.assertRaises(AttributeError, setField)
+		self.assertRaises(AttributeError, delField)
+		self.assertRaises(AttributeError, lambda: record.no_such_field)
+
+
+	def test_class(self):
+		record = self._record(getExpectedDefaults())
+		plan = pbliteserializer._getPlan(alltypes_pb2.TestAllTypes.DESCRIPTOR)
+		recordClass = getRecordClass(plan)
+		self.assertTrue(record.__class__ is recordClass)
+		self.assertTrue(isinstance(record, Record))
+		self.assertEqual('TestAllTypes', recordClass.__name__)
+		self.assertFalse(hasattr(record, '__dict__'))
+		self.assertTrue(isinstance(record.optional_nested_message, Record))
+
+
+	def test_equality(self):
+		pblite = self.serializer.serialize(getPopulatedMessage())
+		record = self._record(pblite)
+		self.assertEqual(record, self._record(pblite))
+		self.assertEqual(hash(record), hash(self._record(pblite)))
+		pblite[1] += 1
+		self.assertNotEqual(record, self._record(pblite))
+
+
+	def test_deep(self):
+		"""
+		Nesting is limited by C{maxDepth}, not Python's recursion limit.
+		"""
+		data = [None, 1500]
+		for n in xrange(1498, -1, -1):
+			data = [None, n, None, data]
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True, maxDepth=2000)
+		record = serializer.deserializeRecord(benchmark_pb2.Nested.DESCRIPTOR, data)
+		for n in xrange(1499):
+			self.assertEqual(n, record.value)
+			record = record.child
+		self.assertEqual(1500, record.value)
+		self.assertEqual(None, record.child)
+		serializer.maxDepth = 100
+		self.assertRaises(PbDecodeError, lambda: serializer.deserializeRecord(
+			benchmark_pb2.Nested.DESCRIPTOR, data))
+
+
+	def test_base64Bytes(self):
+		serializer = pbliteserializer.PbLiteSerializer(base64Bytes=True)
+		message = getPopulatedMessage()
+		message.optional_bytes = '\xff\x00'
+		record = self._record(serializer.serialize(message), serializer)
+		self.assertEqual('\xff\x00', record.optional_bytes)
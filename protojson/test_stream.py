@@ -0,0 +1,257 @@
+import select
+import socket
+
+from unittest import TestCase
+from protojson import alltypes_pb2, benchmark_pb2, pbliteserializer
+from protojson.error import PbDecodeError
+from protojson.stream import SEND_SIZE, FrameDecoder, FrameWriter, encodeFrame
+from protojson.testhelpers import getPopulatedMessage
+
+
+def _getMessage(n):
+	message = alltypes_pb2.TestAllTypes(required_int32=n)
+	message.optional_string = u'line\nbreak %d' % (n,)
+	return message
+
+
+
+class FrameDecoderTests(TestCase):
+	"""
+	Tests for L{protojson.stream.FrameDecoder} and
+	L{protojson.stream.encodeFrame}.
+	"""
+
+	def _serialize(self, message):
+		return pbliteserializer.PbLiteSerializer().serialize(message)
+
+
+	def test_oneNewline(self):
+		frame = encodeFrame(_getMessage(1))
+		self.assertEqual(1, frame.count('\n'))
+		self.assertTrue(frame.endswith('\n'))
+
+
+	def test_byteAtATime(self):
+		data = ''.join(encodeFrame(_getMessage(n)) for n in xrange(3))
+		decoder = FrameDecoder(alltypes_pb2.TestAllTypes)
+		messages = []
+		for byte in data:
+			decoder.feed(byte)
+			messages.extend(decoder)
+		decoder.close()
+		self.assertEqual([self._serialize(_getMessage(n)) for n in xrange(3)],
+			[self._serialize(message) for message in messages])
+
+
+	def test_manyInOneChunk(self):
+		decoder = FrameDecoder(alltypes_pb2.TestAllTypes)
+		decoder.feed('\n' + encodeFrame(getPopulatedMessage()) + '\n\n' +
+			encodeFrame(_getMessage(2)) + encodeFrame(_getMessage(3))[:10])
+		messages = list(decoder)
+		self.assertEqual(2, len(messages))
+		self.assertEqual(2, messages[1].required_int32)
+		self.assertEqual(None, decoder.nextMessage())
+		self.assertRaises(PbDecodeError, decoder.close)
+		decoder.feed(encodeFrame(_getMessage(3))[10:])
+		self.assertEqual(3, decoder.nextMessage().required_int32)
+		decoder.close()
+
+
+	def test_invalidFrame(self):
+		"""
+		An invalid frame raises L{PbDecodeError} and is dropped, and the
+		frames after it can still be decoded.
+		"""
+		decoder = FrameDecoder(alltypes_pb2.TestAllTypes)
+		decoder.feed('[not json\n' + '[1, 2]\n' + encodeFrame(_getMessage(4)))
+		self.assertRaises(PbDecodeError, decoder.nextMessage)
+		self.assertRaises(PbDecodeError, decoder.nextMessage)
+		self.assertEqual(4, decoder.nextMessage().required_int32)
+
+
+	def test_maxDepth(self):
+		"""
+		A frame nested deeper than the serializer's C{maxDepth} is
+		rejected like any other invalid frame.
+		"""
+		decoder = FrameDecoder(benchmark_pb2.Nested,
+			pbliteserializer.PbLiteSerializer(omitUnset=True))
+		decoder.feed('[null,0,null,' * 4999 + '[null,7]' + ']' * 4999 + '\n')
+		decoder.feed('[null,1,null,[null,2]]\n')
+		self.assertRaises(PbDecodeError, decoder.nextMessage)
+		self.assertEqual(2, decoder.nextMessage().child.value)
+
+
+	def test_maxFrameSize(self):
+		frame = encodeFrame(_getMessage(5))
+		decoder = FrameDecoder(alltypes_pb2.TestAllTypes, maxFrameSize=len(frame) - 1)
+		decoder.feed(frame)
+		self.assertEqual(5, decoder.nextMessage().required_int32)
+
+		decoder = FrameDecoder(alltypes_pb2.TestAllTypes, maxFrameSize=len(frame) - 2)
+		self.assertRaises(PbDecodeError, lambda: decoder.feed(frame))
+		self.assertEqual(None, decoder.nextMessage())
+		# It can't recover.
+		self.assertRaises(PbDecodeError, lambda: decoder.feed(frame))
+
+
+	def test_maxFrameSizeWithoutNewline(self):
+		"""
+		A frame is rejected as soon as it is too long, before its newline
+		arrives.
+		"""
+		decoder = FrameDecoder(alltypes_pb2.TestAllTypes, maxFrameSize=100)
+		decoder.feed('[' * 60)
+		self.assertRaises(PbDecodeError, lambda: decoder.feed('[' * 60))
+
+
+
+class FrameWriterTests(TestCase):
+	"""
+	Tests for L{protojson.stream.FrameWriter}, over socket pairs.
+	"""
+
+	def setUp(self):
+		self.sockets = []
+
+
+	def tearDown(self):
+		for sock in self.sockets:
+			sock.close()
+
+
+	def _getSocketPair(self):
+		left, right = socket.socketpair()
+		self.sockets.extend([left, right])
+		left.setblocking(False)
+		right.setblocking(False)
+		return left, right
+
+
+	def test_coalescing(self):
+		"""
+		Everything that is queued is sent with one C{send}.
+		"""
+		left, right = self._getSocketPair()
+		sent = []
+		def send(data):
+			sent.append(data)
+			return left.send(data)
+		writer = FrameWriter(send)
+		for n in xrange(5):
+			self.assertTrue(writer.write(_getMessage(n)))
+		self.assertTrue(writer.flush())
+		self.assertEqual(1, len(sent))
+		self.assertEqual(0, writer.getQueueSize())
+		self.assertTrue(writer.flush())
+		self.assertEqual(1, len(sent))
+		decoder = FrameDecoder(alltypes_pb2.TestAllTypes)
+		decoder.feed(right.recv(65536))
+		self.assertEqual(range(5), [message.required_int32 for message in decoder])
+
+
+	def test_partialSends(self):
+		"""
+		However little C{send} takes, everything queued arrives in order,
+		and no C{send} is passed much more than C{SEND_SIZE} bytes.
+		"""
+		sent = []
+		sizes = []
+		def send(data):
+			sizes.append(len(data))
+			sent.append(data[:1000])
+			return len(sent[-1])
+		writer = FrameWriter(send, highWaterMark=0)
+		frames = []
+		for n in xrange(2000):
+			writer.write(_getMessage(n))
+			frames.append(encodeFrame(_getMessage(n)))
+		self.assertFalse(writer.flush())
+		self.assertEqual(1, len(sizes))
+		while not writer.flush():
+			pass
+		self.assertEqual(''.join(frames), ''.join(sent))
+		self.assertEqual(0, writer.getQueueSize())
+		self.assertTrue(max(sizes) <= SEND_SIZE)
+
+
+	def test_sendsUntilFull(self):
+		"""
+		L{FrameWriter.flush} keeps calling C{send} while it takes
+		everything, and sends a frame longer than C{SEND_SIZE} in pieces.
+		"""
+		sizes = []
+		def send(data):
+			sizes.append(len(data))
+			return len(data)
+		writer = FrameWriter(send)
+		message = _getMessage(0)
+		message.optional_string = u'x' * (SEND_SIZE * 2)
+		writer.write(message)
+		frameSize = writer.getQueueSize()
+		for n in xrange(1, 2000):
+			writer.write(_getMessage(n))
+		total = writer.getQueueSize()
+		self.assertTrue(writer.flush())
+		self.assertEqual(0, writer.getQueueSize())
+		self.assertEqual(total, sum(sizes))
+		self.assertEqual([SEND_SIZE, SEND_SIZE, frameSize - 2 * SEND_SIZE], sizes[:3])
+		self.assertTrue(max(sizes) <= SEND_SIZE)
+
+
+	def test_backpressure(self):
+		"""
+		L{FrameWriter.write} returns C{False} over the high-water mark, and
+		L{FrameWriter.flush} keeps what the socket wouldn't take.
+		"""
+		left, right = self._getSocketPair()
+		writer = FrameWriter(left.send, highWaterMark=1000)
+		message = getPopulatedMessage()
+		count = 0
+		while writer.write(message):
+			count += 1
+		count += 1
+		self.assertTrue(writer.getQueueSize() > 1000)
+		# Fill the socket buffer until it won't take more.
+		while writer.flush():
+			writer.write(message)
+			count += 1
+		self.assertTrue(writer.getQueueSize() > 0)
+
+		decoder = FrameDecoder(alltypes_pb2.TestAllTypes)
+		received = 0
+		while received < count:
+			select.select([right], [left], [], 5)
+			writer.flush()
+			try:
+				decoder.feed(right.recv(65536))
+			except socket.error:
+				continue
+			for decoded in decoder:
+				received += 1
+		self.assertEqual(count, received)
+		self.assertEqual(0, writer.getQueueSize())
+
+
+	def test_manyChannels(self):
+		"""
+		One C{select} loop can carry frames over many channels at once.
+		"""
+		decoders = {}
+		for n in xrange(50):
+			left, right = self._getSocketPair()
+			writer = FrameWriter(left.send)
+			for m in xrange(3):
+				writer.write(_getMessage(n * 10 + m))
+			writer.flush()
+			decoders[right] = FrameDecoder(alltypes_pb2.TestAllTypes)
+		received = []
+		while len(received) < 150:
+			readable = select.select(decoders.keys(), [], [], 5)[0]
+			self.assertTrue(readable)
+			for right in readable:
+				decoder = decoders[right]
+				decoder.feed(right.recv(65536))
+				received.extend(message.required_int32 for message in decoder)
+		self.assertEqual(sorted(n * 10 + m for n in xrange(50) for m in xrange(3)),
+			sorted(received))
@@ -0,0 +1,154 @@
+from unittest import TestCase
+from protojson import pbliteserializer, alltypes_pb2, benchmark_pb2
+from protojson.error import PbDecodeError
+from protojson.testhelpers import getExpectedDefaults, getPopulatedMessage
+
+
+def _getInvalid():
+	"""
+	Returns a list of (index path, bad value) pairs, each of which makes
+	a valid PbLite list invalid.
+	"""
+	return [
+		((1,), 'x'), # optional_int32
+		((1,), 2**31),
+		((3,), -1), # optional_uint32
+		((11,), 'x'), # optional_float
+		((13,), 2), # optional_bool
+		((14,), '\xff'), # optional_string
+		((15,), u'x'), # optional_bytes
+		((21,), 4), # optional_nested_enum
+		((21,), [1]),
+		((31,), 3), # repeated_int32
+		((31,), [1, 'x']),
+		((43,), [1, 2]), # repeated_bool
+		((49,), [1, 4]), # repeated_nested_enum
+		((16, 17), 'x'), # optionalgroup.a
+		((18, 1), 'x'), # optional_nested_message.b
+		((18,), [None]), # too short
+		((48,), [[None, 'x']]), # repeated_nested_message
+	]
+
+
+def _setPath(pblite, path, value):
+	for index in path[:-1]:
+		pblite = pblite[index]
+	pblite[path[-1]] = value
+
+
+class ValidateTests(TestCase):
+	"""
+	Tests for L{pbliteserializer.PbLiteSerializer.validate}.
+	"""
+
+	def setUp(self):
+		self.serializer = pbliteserializer.PbLiteSerializer()
+		self.descriptor = alltypes_pb2.TestAllTypes.DESCRIPTOR
+
+
+	def test_valid(self):
+		for pblite in [
+			getExpectedDefaults(),
+			self.serializer.serialize(getPopulatedMessage()),
+		]:
+			self.assertEqual(None, self.serializer.validate(self.descriptor, pblite))
+			self.assertEqual([], self.serializer.validate(
+				self.descriptor, pblite, allErrors=True))
+
+
+	def test_sameAsDeserialize(self):
+		"""
+		L{validate} returns an error for every list that L{deserialize}
+		rejects.
+		"""
+		for path, value in _getInvalid():
+			pblite = getExpectedDefaults()
+			_setPath(pblite, path, value)
+			self.assertRaises(PbDecodeError, lambda: self.serializer.deserialize(
+				alltypes_pb2.TestAllTypes(), pblite))
+			error = self.serializer.validate(self.descriptor, pblite)
+			self.assertTrue(isinstance(error, PbDecodeError), (path, value))
+
+
+	def test_errorPath(self):
+		"""
+		The error message starts with the path of indices to the bad value.
+		"""
+		pblite = getExpectedDefaults()
+		pblite[48] = [[None, 1], [None, 'x']]
+		error = self.serializer.validate(self.descriptor, pblite)
+		self.assertTrue(str(error).startswith('At [48, 1, 1]: '), str(error))
+
+
+	def test_allErrors(self):
+		pblite = getExpectedDefaults()
+		pblite[1] = 'x'
+		pblite[43] = [2, 1, 2]
+		pblite[18] = 'x'
+		errors = self.serializer.validate(self.descriptor, pblite, allErrors=True)
+		self.assertEqual(
+			['At [1]: ', 'At [18]: ', 'At [43, 0]: ', 'At [43, 2]: '],
+			[str(e)[:str(e).index(':') + 2] for e in errors])
+
+
+	def test_notAList(self):
+		for data in [None, 3, {}]:
+			error = self.serializer.validate(self.descriptor, data)
+			self.assertTrue(isinstance(error, PbDecodeError))
+
+
+	def test_missingIndex(self):
+		pblite = getExpectedDefaults()[:30]
+		errors = self.serializer.validate(self.descriptor, pblite, allErrors=True)
+		self.assertEqual(1, len(errors))
+		self.assertTrue('expected index 31' in str(errors[0]), str(errors[0]))
+
+
+	def test_omitUnset(self):
+		"""
+		With C{omitUnset}, short lists and C{None}s are valid, except for
+		required fields.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		pblite = serializer.serialize(alltypes_pb2.TestAllTypes(required_int32=1))
+		self.assertEqual(None, serializer.validate(self.descriptor, pblite))
+		pblite[1] = None
+		pblite[31] = None
+		self.assertEqual(None, serializer.validate(self.descriptor, pblite))
+		pblite[50] = None
+		self.assertTrue(isinstance(
+			serializer.validate(self.descriptor, pblite), PbDecodeError))
+
+
+	def test_stringInsteadOfMessage(self):
+		"""
+		With C{omitUnset}, a C{str} where a nested message is expected is
+		invalid, as L{PbLiteSerializer.deserialize} finds it.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		for tag, value in ((18, 'x'), (48, [u'x']), (18, {})):
+			pblite = serializer.serialize(alltypes_pb2.TestAllTypes(required_int32=1))
+			pblite[tag] = value
+			self.assertTrue(isinstance(
+				serializer.validate(self.descriptor, pblite), PbDecodeError))
+		self.assertTrue(isinstance(
+			serializer.validate(self.descriptor, 'x'), PbDecodeError))
+
+
+	def test_deep(self):
+		"""
+		Hostile input nested deeper than Python's recursion limit gets a
+		L{PbDecodeError} for C{maxDepth}, like L{deserialize} gives.
+		"""
+		data = [None, 1]
+		for n in xrange(5000):
+			data = [None, n, u'', data]
+		for omitUnset in (False, True):
+			serializer = pbliteserializer.PbLiteSerializer(omitUnset=omitUnset)
+			error = serializer.validate(benchmark_pb2.Nested.DESCRIPTOR, data)
+			self.assertTrue(isinstance(error, PbDecodeError), error)
+			self.assertTrue('nested more than 100 deep' in str(error), str(error))
+			self.assertRaises(PbDecodeError, lambda: serializer.deserialize(
+				benchmark_pb2.Nested(), data))
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True, maxDepth=6000)
+		self.assertEqual(None, serializer.validate(benchmark_pb2.Nested.DESCRIPTOR, data))
@@ -0,0 +1,198 @@
+from unittest import TestCase
+from protojson import alltypes_pb2, benchmark_pb2, pbliteserializer
+from protojson.error import PbDecodeError
+from protojson.testhelpers import getAllTypesMessage, getPopulatedMessage
+from protojson.wire import pbLiteToWire, wireToPbLite
+
+
+class WireTests(TestCase):
+	"""
+	Tests for L{protojson.wire}.
+	"""
+
+	def _assertTranscodes(self, message, serializer):
+		binary = message.SerializeToString()
+		data = wireToPbLite(message.DESCRIPTOR, binary, serializer)
+		parsed = message.__class__()
+		parsed.ParseFromString(binary)
+		self.assertEqual(serializer.serialize(parsed), data)
+		deserialized = message.__class__()
+		serializer.deserialize(deserialized, data)
+		self.assertEqual(deserialized.SerializeToString(),
+			pbLiteToWire(message.DESCRIPTOR, data, serializer))
+
+
+	def test_allTypes(self):
+		self._assertTranscodes(
+			getAllTypesMessage(), pbliteserializer.PbLiteSerializer())
+
+
+	def test_options(self):
+		for serializer in (
+		pbliteserializer.PbLiteSerializer(omitUnset=True),
+		pbliteserializer.PbLiteSerializer(fillerValue=0)):
+			self._assertTranscodes(getAllTypesMessage(), serializer)
+			message = alltypes_pb2.TestAllTypes()
+			message.required_int32 = 3
+			self._assertTranscodes(message, serializer)
+
+
+	def test_recursive(self):
+		message = benchmark_pb2.Nested()
+		child = message
+		for n in xrange(10):
+			child.value = n
+			child = child.child
+		self._assertTranscodes(
+			message, pbliteserializer.PbLiteSerializer(omitUnset=True))
+
+
+	def test_sparse(self):
+		message = benchmark_pb2.Sparse(low=1, ratio=0.5)
+		message.values.extend([1, 2, 3])
+		self._assertTranscodes(message, pbliteserializer.PbLiteSerializer())
+
+
+	def test_mergedMessages(self):
+		"""
+		Like C{ParseFromString}, occurrences of a singular message are
+		merged, and the last occurrence of a singular scalar wins.
+		"""
+		first = alltypes_pb2.TestAllTypes(required_int32=1)
+		first.optionalgroup.a = 5
+		second = alltypes_pb2.TestAllTypes(required_int32=2)
+		second.optional_nested_message.b = 6
+		binary = first.SerializeToString() + second.SerializeToString()
+		data = wireToPbLite(alltypes_pb2.TestAllTypes.DESCRIPTOR, binary)
+		self.assertEqual(2, data[50])
+		self.assertEqual(5, data[16][17])
+		self.assertEqual([None, 6], data[18])
+
+
+	def test_unknownFields(self):
+		message = alltypes_pb2.TestAllTypes(required_int32=1)
+		expected = wireToPbLite(message.DESCRIPTOR, message.SerializeToString())
+		# Field 99 as a varint, fixed64, fixed32, string, and group, and
+		# an unknown value for optional_nested_enum
+		unknown = ('\x98\x06\x96\x01' '\x99\x06' + '\x00' * 8 + '\x9d\x06' +
+			'\x00' * 4 + '\x9a\x06\x02ab' '\x9b\x06\x08\x01\x9c\x06' '\xa8\x01\x07')
+		self.assertEqual(expected, wireToPbLite(
+			message.DESCRIPTOR, message.SerializeToString() + unknown))
+
+
+	def test_packed(self):
+		"""
+		Repeated scalar fields are accepted in packed form.
+		"""
+		# repeated_int32 = [1, 150], repeated_nested_enum = [2, 7 (unknown)]
+		binary = '\xfa\x01\x03\x01\x96\x01' '\x8a\x03\x02\x02\x07' '\x90\x03\x01'
+		data = wireToPbLite(alltypes_pb2.TestAllTypes.DESCRIPTOR, binary,
+			pbliteserializer.PbLiteSerializer(omitUnset=True))
+		self.assertEqual([1, 150], data[31])
+		self.assertEqual([2], data[49])
+
+
+	def test_invalidBinary(self):
+		descriptor = alltypes_pb2.TestAllTypes.DESCRIPTOR
+		binary = alltypes_pb2.TestAllTypes(
+			required_int32=1, optional_string=u'abc').SerializeToString()
+		for bad in (
+		binary[:-1],
+		# Invalid UTF-8
+		binary.replace('abc', 'ab\xff'),
+		# Group without an end
+		'\x83\x01' + binary,
+		# A varint that is too long
+		'\x08' + '\xff' * 10 + '\x01',
+		# Wire type 7
+		'\x0f'):
+			self.assertRaises(PbDecodeError, lambda: wireToPbLite(descriptor, bad))
+
+
+	def test_missingRequired(self):
+		"""
+		Like C{ParseFromString}, L{wireToPbLite} accepts a message that is
+		missing required fields, and gives what C{serialize} would for it.
+		"""
+		message = alltypes_pb2.TestAllTypes(optional_int32=1)
+		binary = message.SerializePartialToString()
+		parsed = alltypes_pb2.TestAllTypes()
+		parsed.ParseFromString(binary)
+		for omitUnset in (False, True):
+			serializer = pbliteserializer.PbLiteSerializer(omitUnset=omitUnset)
+			self.assertEqual(serializer.serialize(parsed), wireToPbLite(
+				alltypes_pb2.TestAllTypes.DESCRIPTOR, binary, serializer))
+
+
+	def test_serializerMaxDepth(self):
+		"""
+		The serializer's C{maxDepth} limits the nesting.
+		"""
+		message = benchmark_pb2.Nested()
+		child = message
+		for n in xrange(20):
+			child.value = n
+			child = child.child
+		binary = message.SerializeToString()
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True, maxDepth=20)
+		data = wireToPbLite(benchmark_pb2.Nested.DESCRIPTOR, binary, serializer)
+		self.assertEqual(serializer.serialize(message), data)
+		self.assertEqual(binary,
+			pbLiteToWire(benchmark_pb2.Nested.DESCRIPTOR, data, serializer))
+		serializer.maxDepth = 19
+		self.assertRaises(PbDecodeError,
+			lambda: wireToPbLite(benchmark_pb2.Nested.DESCRIPTOR, binary, serializer))
+		self.assertRaises(PbDecodeError,
+			lambda: pbLiteToWire(benchmark_pb2.Nested.DESCRIPTOR, data, serializer))
+		# Without omitUnset, unset nested messages of a recursive type are
+		# serialized as defaults until maxDepth, like serialize does.
+		serializer = pbliteserializer.PbLiteSerializer(maxDepth=30)
+		self.assertRaises(PbDecodeError,
+			lambda: wireToPbLite(benchmark_pb2.Nested.DESCRIPTOR, binary, serializer))
+
+
+	def test_tooDeep(self):
+		message = benchmark_pb2.Nested()
+		child = message
+		for n in xrange(200):
+			child = child.child
+		child.value = 1
+		binary = message.SerializeToString()
+		self.assertRaises(PbDecodeError,
+			lambda: wireToPbLite(benchmark_pb2.Nested.DESCRIPTOR, binary))
+		data = [None, 1]
+		for n in xrange(200):
+			data = [None, None, None, data]
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		self.assertRaises(PbDecodeError,
+			lambda: pbLiteToWire(benchmark_pb2.Nested.DESCRIPTOR, data, serializer))
+
+
+	def test_invalidPbLite(self):
+		"""
+		L{pbLiteToWire} rejects what L{PbLiteSerializer.deserialize} would
+		reject.
+		"""
+		serializer = pbliteserializer.PbLiteSerializer()
+		good = serializer.serialize(getPopulatedMessage())
+		for tag, value in ((13, 2), (21, 7), (1, 2**31), (4, -1), (14, '\xff'),
+		(15, u'x'), (31, ['1'])):
+			data = list(good)
+			data[tag] = value
+			self.assertRaises(PbDecodeError, lambda: serializer.deserialize(
+				alltypes_pb2.TestAllTypes(), data))
+			self.assertRaises(PbDecodeError, lambda: pbLiteToWire(
+				alltypes_pb2.TestAllTypes.DESCRIPTOR, data, serializer))
+		for tag, value in ((18, 5), (48, [5]), (48, 5)):
+			data = list(good)
+			data[tag] = value
+			self.assertRaises(PbDecodeError, lambda: pbLiteToWire(
+				alltypes_pb2.TestAllTypes.DESCRIPTOR, data, serializer))
+		self.assertRaises(PbDecodeError, lambda: pbLiteToWire(
+			alltypes_pb2.TestAllTypes.DESCRIPTOR, good[:20], serializer))
+		serializer = pbliteserializer.PbLiteSerializer(omitUnset=True)
+		for tag, value in ((18, 'x'), (48, [u'x'])):
+			data = [None] * 50 + [1]
+			data[tag] = value
+			self.assertRaises(PbDecodeError, lambda: pbLiteToWire(
+				alltypes_pb2.TestAllTypes.DESCRIPTOR, data, serializer))
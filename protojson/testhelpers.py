@@ -0,0 +1,128 @@
+"""
+Fixtures shared by the test modules.
+"""
+
+from protojson import alltypes_pb2
+
+
+def getExpectedDefaults():
+	"""
+	Returns what a default L{PbLiteSerializer} serializes an empty
+	C{TestAllTypes} to.
+	"""
+	expectedDefaults = [
+		None, # 0
+		0, # 1
+		1, # 2
+		0, # and so on
+		0,
+		0,
+		0,
+		0,
+		0,
+		0,
+		0,
+		1.5,
+		0,
+		0,
+		u'',
+		'moo',
+		[ # 16
+			None, None, None, None, None, None, None, None, None,
+			None, None, None, None, None, None, None, None, 0],
+		None, # 17
+		[None, 0],
+		None,
+		None,
+		1,
+		None,
+		None,
+		None,
+		None,
+		None,
+		None,
+		None,
+		None,
+		None,
+		[], # 31
+		[],
+		[],
+		[],
+		[],
+		[],
+		[],
+		[],
+		[],
+		[],
+		[],
+		[],
+		[],
+		[],
+		[],
+		[], # 46
+		None, # 47
+		[], # 48
+		[], # 49
+		1, # 50
+	]
+	return expectedDefaults
+
+
+def getPopulatedMessage():
+	"""
+	Returns a C{TestAllTypes} with fields of most kinds populated.
+	"""
+	message = alltypes_pb2.TestAllTypes()
+	message.optional_int32 = 101
+	message.optional_int64 = 102
+	message.optional_float = 111.5
+	message.optional_bool = True
+	message.optional_string = u'test'
+	message.optional_bytes = 'abcd'
+	message.optionalgroup.a = 111
+	message.optional_nested_message.b = 112
+	message.optional_nested_enum = alltypes_pb2.TestAllTypes.BAR
+	message.repeated_int32.extend([201, 202])
+	message.repeated_bool.extend([True, False, True])
+	message.repeated_string.extend([u'foo', u'bar'])
+	message.repeatedgroup.add().a.extend([1, 2])
+	message.repeatedgroup.add()
+	message.repeated_nested_message.add().b = 100
+	message.repeated_nested_message.add().b = 200
+	message.repeated_nested_enum.extend([3, 1])
+	message.required_int32 = 1
+	return message
+
+
+def getAllTypesMessage():
+	"""
+	Like L{getPopulatedMessage}, but with every scalar type populated,
+	with values at the edges of their ranges.
+	"""
+	message = getPopulatedMessage()
+	message.optional_int32 = -5
+	message.optional_int64 = -2**63
+	message.optional_uint32 = 2**32 - 1
+	message.optional_uint64 = 2**64 - 1
+	message.optional_sint32 = -2**31
+	message.optional_sint64 = -7
+	message.optional_fixed32 = 7
+	message.optional_fixed64 = 2**64 - 2
+	message.optional_sfixed32 = -8
+	message.optional_sfixed64 = -9
+	message.optional_double = -1.25
+	message.optional_string = u'\u2603 snow'
+	message.optional_bytes = '\x00\xff\x80'
+	message.repeated_int64.extend([-1, 1])
+	message.repeated_uint32.extend([0, 2**32 - 1])
+	message.repeated_uint64.extend([2**64 - 1])
+	message.repeated_sint32.extend([-1, 1])
+	message.repeated_sint64.extend([-2**63])
+	message.repeated_fixed32.extend([1, 2])
+	message.repeated_fixed64.extend([3])
+	message.repeated_sfixed32.extend([-4])
+	message.repeated_sfixed64.extend([-5])
+	message.repeated_float.extend([0.5, -2.5])
+	message.repeated_double.extend([1e300])
+	message.repeated_bytes.extend(['\xff', ''])
+	return message
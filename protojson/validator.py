@@ -0,0 +1,129 @@
+"""
+Validation of PbLite lists without deserializing them.
+
+L{iterErrors} checks a PbLite list against a message type the way
+L{protojson.pbliteserializer.PbLiteSerializer.deserialize} would (list
+lengths, value types and ranges, bools, enums, and nested messages), but
+never creates a Message.  Each problem is reported as a L{PbDecodeError}
+whose message starts with the path of indices to the bad value.
+
+Use it through
+L{protojson.pbliteserializer.PbLiteSerializer.validate}.
+"""
+
+from protojson.error import PbDecodeError
+from protojson.pbliteserializer import (
+	KIND_MESSAGE, LABEL_REQUIRED, _getFieldChecker, _getIterator)
+
+_postImportVars = vars().keys()
+
+
+def _error(path, message):
+	return PbDecodeError("At %r: %s" % (list(path), message))
+
+
+def _checkMessage(plan, data, path, depth, maxDepth):
+	"""
+	Returns a L{PbDecodeError} if C{data} can't be a message of the type
+	of C{plan} at C{depth}, or else C{None}.
+	"""
+	if depth > maxDepth:
+		return _error(path, "Message %s is nested more than %d deep" % (
+			plan.descriptor.full_name, maxDepth))
+	if not isinstance(data, (list, tuple)):
+		return _error(path, "Expected a list for message %s but found a %r" % (
+			plan.descriptor.full_name, type(data)))
+	return None
+
+
+def iterErrors(plan, data, omitUnset=False, maxDepth=100, base64Bytes=False):
+	"""
+	Yields a L{PbDecodeError} for every problem that would make
+	deserializing C{data} (a PbLite list for the message type of
+	L{protojson.pbliteserializer._MessagePlan} C{plan}) fail, in order.
+	C{omitUnset}, C{maxDepth}, and C{base64Bytes} have the same meaning as
+	for L{PbLiteSerializer}.
+
+	Nothing inside a value that is itself invalid (a nested message that
+	isn't a list, for example) is checked.
+	"""
+	error = _checkMessage(plan, data, (), 1, maxDepth)
+	if error is not None:
+		yield error
+		return
+	# Message frames are [plan, data, path, depth, index of the next field
+	# in plan.fields, False].  Repeated-message frames are [childPlan, list
+	# of the items, path, depth of the items, index of the next item, True].
+	# Nested messages are checked with this stack, not recursion, so that
+	# hostile input can't exhaust Python's stack.
+	stack = [[plan, data, (), 1, 0, False]]
+	while stack:
+		frame = stack[-1]
+		plan, data, path, depth, index, isRepeated = frame
+		if isRepeated:
+			if index == len(data):
+				stack.pop()
+				continue
+			frame[4] = index + 1
+			itemPath = path + (index,)
+			error = _checkMessage(plan, data[index], itemPath, depth, maxDepth)
+			if error is not None:
+				yield error
+			else:
+				stack.append([plan, data[index], itemPath, depth, 0, False])
+			continue
+
+		fields = plan.fields
+		nFields = len(fields)
+		length = len(data)
+		while index < nFields:
+			fieldPlan = fields[index]
+			index += 1
+			tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+			if tag < length:
+				subdata = data[tag]
+			elif not omitUnset:
+				# Missing even if it was an optional field.
+				yield _error(path, "For message %s expected index %r but it "
+					"was missing." % (plan.descriptor.full_name, tag))
+				stack.pop()
+				break
+			else:
+				subdata = None
+			if subdata is None and omitUnset:
+				if field.label == LABEL_REQUIRED:
+					yield _error(path + (tag,), "Required field %s is missing" % (
+						field.full_name,))
+				continue
+			fieldPath = path + (tag,)
+			if repeated:
+				try:
+					items = list(_getIterator(subdata))
+				except PbDecodeError, e:
+					yield _error(fieldPath, str(e))
+					continue
+				if kind == KIND_MESSAGE:
+					frame[4] = index
+					stack.append([childPlan, items, fieldPath, depth + 1, 0, True])
+					break
+				checker = _getFieldChecker(fieldPlan, base64Bytes)
+				for n, value in enumerate(items):
+					try:
+						checker(value)
+					except PbDecodeError, e:
+						yield _error(fieldPath + (n,), str(e))
+			elif kind == KIND_MESSAGE:
+				error = _checkMessage(childPlan, subdata, fieldPath, depth + 1, maxDepth)
+				if error is not None:
+					yield error
+					continue
+				frame[4] = index
+				stack.append([childPlan, subdata, fieldPath, depth + 1, 0, False])
+				break
+			else:
+				try:
+					_getFieldChecker(fieldPlan, base64Bytes)(subdata)
+				except PbDecodeError, e:
+					yield _error(fieldPath, str(e))
+		else:
+			stack.pop()
@@ -0,0 +1,539 @@
+"""
+Transcoding between the protobuf binary wire format and PbLite, without
+creating Messages.
+
+L{wireToPbLite} decodes binary protobuf data (what C{SerializeToString}
+returns) straight into the PbLite list that
+L{PbLiteSerializer.serialize} would make for the parsed message, and
+L{pbLiteToWire} encodes a PbLite list straight into the binary data
+that C{SerializeToString} would return for the deserialized message,
+checking it like L{PbLiteSerializer.deserialize} would.  A gateway
+between binary protobuf and PbLite can use these instead of
+C{ParseFromString} followed by C{serialize} (and C{deserialize}
+followed by C{SerializeToString}).
+
+Like C{ParseFromString}, L{wireToPbLite} drops unknown fields (and
+extensions) and unknown enum values, accepts repeated scalar fields
+whether or not they are packed, and doesn't check required fields (a
+missing one is serialized as unset).  Like C{deserialize},
+L{pbLiteToWire} rejects missing required fields.  It writes repeated
+fields packed only if they are declared C{[packed=true]}.  Both raise
+L{PbDecodeError} for invalid input, including messages nested more than
+the serializer's C{maxDepth} deep.  Nested messages are handled by
+recursion, so a C{maxDepth} near Python's recursion limit can raise
+C{RuntimeError} instead.
+"""
+
+import struct
+
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.internal.wire_format import (
+	WIRETYPE_END_GROUP, WIRETYPE_FIXED32, WIRETYPE_FIXED64,
+	WIRETYPE_LENGTH_DELIMITED, WIRETYPE_START_GROUP, WIRETYPE_VARINT,
+	ZigZagDecode, ZigZagEncode)
+
+from protojson.error import PbDecodeError
+from protojson.pbliteserializer import (
+	KIND_BOOL, KIND_ENUM, KIND_MESSAGE, LABEL_REQUIRED, TYPE_BYTES, TYPE_GROUP,
+	PbLiteSerializer, _encodeBase64, _getChecker, _getList, _getPlan)
+
+_postImportVars = vars().keys()
+
+
+_UINT32_MASK = (1 << 32) - 1
+_UINT64_MASK = (1 << 64) - 1
+
+
+def _decodeVarint(buffer, pos, end):
+	"""
+	Returns C{(value, pos)}: the unsigned varint starting at C{pos} in
+	C{str} C{buffer}, and the position after it.
+	"""
+	result = 0
+	shift = 0
+	while 1:
+		if pos >= end:
+			raise PbDecodeError("Truncated varint at %d" % (pos,))
+		byte = ord(buffer[pos])
+		pos += 1
+		result |= (byte & 0x7f) << shift
+		if not byte & 0x80:
+			return result & _UINT64_MASK, pos
+		shift += 7
+		if shift >= 70:
+			raise PbDecodeError("Varint at %d is too long" % (pos,))
+
+
+def _encodeVarint(value):
+	if value < 0:
+		value &= _UINT64_MASK
+	chunks = []
+	while value > 0x7f:
+		chunks.append(chr(0x80 | (value & 0x7f)))
+		value >>= 7
+	chunks.append(chr(value))
+	return ''.join(chunks)
+
+
+def _toInt32(value):
+	value &= _UINT32_MASK
+	if value & 0x80000000:
+		value -= 1 << 32
+	return int(value)
+
+
+def _toInt64(value):
+	if value & 0x8000000000000000:
+		value -= 1 << 64
+	return value
+
+
+def _getVarintDecoder(convert):
+	def decode(buffer, pos, end):
+		# Most varints are one byte.
+		if pos < end:
+			byte = ord(buffer[pos])
+			if byte < 0x80:
+				return convert(byte), pos + 1
+		value, pos = _decodeVarint(buffer, pos, end)
+		return convert(value), pos
+	return decode
+
+
+def _getFixedDecoder(format):
+	size = struct.calcsize(format)
+	unpack = struct.Struct(format).unpack_from
+	def decode(buffer, pos, end):
+		if pos + size > end:
+			raise PbDecodeError("Truncated value at %d" % (pos,))
+		return unpack(buffer, pos)[0], pos + size
+	return decode
+
+
+def _getFixedEncoder(format):
+	pack = struct.Struct(format).pack
+	def encode(value):
+		try:
+			return pack(value)
+		except (struct.error, OverflowError), e:
+			raise PbDecodeError("Can't encode %r: %s" % (value, e))
+	return encode
+
+
+def _decodeString(buffer, pos, end):
+	data, pos = _decodeBytes(buffer, pos, end)
+	try:
+		return data.decode('utf-8'), pos
+	except UnicodeDecodeError:
+		raise PbDecodeError("Invalid UTF-8 in string at %d" % (pos,))
+
+
+def _decodeBytes(buffer, pos, end):
+	size, pos = _decodeVarint(buffer, pos, end)
+	if pos + size > end:
+		raise PbDecodeError("Truncated string at %d" % (pos,))
+	return buffer[pos:pos + size], pos + size
+
+
+def _encodeString(value):
+	value = value.encode('utf-8')
+	return _encodeVarint(len(value)) + value
+
+
+def _encodeBytes(value):
+	return _encodeVarint(len(value)) + value
+
+
+# FieldDescriptor type -> (wire type, decode, encode)
+_codecs = {
+	FieldDescriptor.TYPE_DOUBLE: (WIRETYPE_FIXED64,
+		_getFixedDecoder('<d'), _getFixedEncoder('<d')),
+	FieldDescriptor.TYPE_FLOAT: (WIRETYPE_FIXED32,
+		_getFixedDecoder('<f'), _getFixedEncoder('<f')),
+	FieldDescriptor.TYPE_INT64: (WIRETYPE_VARINT,
+		_getVarintDecoder(_toInt64), _encodeVarint),
+	FieldDescriptor.TYPE_UINT64: (WIRETYPE_VARINT,
+		_decodeVarint, _encodeVarint),
+	FieldDescriptor.TYPE_INT32: (WIRETYPE_VARINT,
+		_getVarintDecoder(_toInt32), _encodeVarint),
+	FieldDescriptor.TYPE_FIXED64: (WIRETYPE_FIXED64,
+		_getFixedDecoder('<Q'), _getFixedEncoder('<Q')),
+	FieldDescriptor.TYPE_FIXED32: (WIRETYPE_FIXED32,
+		_getFixedDecoder('<I'), _getFixedEncoder('<I')),
+	# PbLite bools are 1 and 0.
+	FieldDescriptor.TYPE_BOOL: (WIRETYPE_VARINT,
+		_getVarintDecoder(lambda value: value and 1 or 0),
+		lambda value: value and '\x01' or '\x00'),
+	FieldDescriptor.TYPE_STRING: (WIRETYPE_LENGTH_DELIMITED,
+		_decodeString, _encodeString),
+	FieldDescriptor.TYPE_BYTES: (WIRETYPE_LENGTH_DELIMITED,
+		_decodeBytes, _encodeBytes),
+	FieldDescriptor.TYPE_UINT32: (WIRETYPE_VARINT,
+		_getVarintDecoder(lambda value: value & _UINT32_MASK), _encodeVarint),
+	FieldDescriptor.TYPE_ENUM: (WIRETYPE_VARINT,
+		_getVarintDecoder(_toInt32), _encodeVarint),
+	FieldDescriptor.TYPE_SFIXED32: (WIRETYPE_FIXED32,
+		_getFixedDecoder('<i'), _getFixedEncoder('<i')),
+	FieldDescriptor.TYPE_SFIXED64: (WIRETYPE_FIXED64,
+		_getFixedDecoder('<q'), _getFixedEncoder('<q')),
+	FieldDescriptor.TYPE_SINT32: (WIRETYPE_VARINT,
+		_getVarintDecoder(lambda value: ZigZagDecode(value & _UINT32_MASK)),
+		lambda value: _encodeVarint(ZigZagEncode(value))),
+	FieldDescriptor.TYPE_SINT64: (WIRETYPE_VARINT,
+		_getVarintDecoder(ZigZagDecode),
+		lambda value: _encodeVarint(ZigZagEncode(value))),
+}
+
+
+class _WireField(object):
+	"""
+	How to decode and encode one field.
+	"""
+	__slots__ = (
+		'fieldPlan', 'wireType', 'decode', 'encode', 'check', 'base64Check',
+		'packed', 'tagBytes', 'endTagBytes', 'default', 'childPlan')
+
+	def __init__(self, fieldPlan):
+		tag, name, kind, repeated, enumValues, childPlan, field = fieldPlan
+		self.fieldPlan = fieldPlan
+		self.packed = False
+		self.endTagBytes = None
+		self.default = None
+		# The _WirePlan for a Message field, set when first needed
+		self.childPlan = None
+		if kind == KIND_MESSAGE:
+			self.decode = self.encode = self.check = self.base64Check = None
+			if field.type == TYPE_GROUP:
+				self.wireType = WIRETYPE_START_GROUP
+				self.endTagBytes = _encodeVarint((tag << 3) | WIRETYPE_END_GROUP)
+			else:
+				self.wireType = WIRETYPE_LENGTH_DELIMITED
+		else:
+			self.wireType, self.decode, self.encode = _codecs[field.type]
+			self.check = _getChecker(fieldPlan)
+			# The check for a serializer with base64Bytes
+			self.base64Check = _getChecker(fieldPlan, True)
+			if repeated:
+				self.packed = field.has_options and field.GetOptions().packed
+			elif kind == KIND_BOOL:
+				self.default = field.default_value and 1 or 0
+			else:
+				self.default = field.default_value
+		if self.packed:
+			self.tagBytes = _encodeVarint((tag << 3) | WIRETYPE_LENGTH_DELIMITED)
+		else:
+			self.tagBytes = _encodeVarint((tag << 3) | self.wireType)
+
+
+
+class _WirePlan(object):
+	"""
+	The L{_WireField}s of a message type, as a C{list} by tag and as a
+	C{dict} from tag to L{_WireField}.
+	"""
+	__slots__ = ('plan', 'fields', 'fieldsByTag')
+
+	def __init__(self, plan):
+		self.plan = plan
+		self.fields = [_WireField(fieldPlan) for fieldPlan in plan.fields]
+		self.fieldsByTag = {}
+		for wireField in self.fields:
+			self.fieldsByTag[wireField.fieldPlan[0]] = wireField
+
+
+
+# _MessagePlan -> _WirePlan
+_wirePlans = {}
+
+def _getWirePlan(plan):
+	try:
+		return _wirePlans[plan]
+	except KeyError:
+		wirePlan = _wirePlans[plan] = _WirePlan(plan)
+		return wirePlan
+
+
+def _skipField(buffer, pos, end, number, wireType, depth, maxDepth):
+	"""
+	Returns the position after the value of an unknown field.
+	"""
+	if wireType == WIRETYPE_VARINT:
+		return _decodeVarint(buffer, pos, end)[1]
+	elif wireType == WIRETYPE_FIXED64:
+		pos += 8
+	elif wireType == WIRETYPE_FIXED32:
+		pos += 4
+	elif wireType == WIRETYPE_LENGTH_DELIMITED:
+		size, pos = _decodeVarint(buffer, pos, end)
+		pos += size
+	elif wireType == WIRETYPE_START_GROUP:
+		if depth >= maxDepth:
+			raise PbDecodeError("Messages are nested more than %d deep" % (maxDepth,))
+		while 1:
+			key, pos = _decodeVarint(buffer, pos, end)
+			if key == (number << 3) | WIRETYPE_END_GROUP:
+				return pos
+			pos = _skipField(
+				buffer, pos, end, key >> 3, key & 7, depth + 1, maxDepth)
+	else:
+		raise PbDecodeError("Unexpected wire type %d at %d" % (wireType, pos))
+	if pos > end:
+		raise PbDecodeError("Truncated field %d" % (number,))
+	return pos
+
+
+def _decodeMessage(wirePlan, buffer, pos, end, state, endNumber, depth,
+maxDepth):
+	"""
+	Decodes the fields of a message from C{buffer[pos:end]} into C{dict}
+	C{state}, which maps tags to values (a C{list} of them for repeated
+	fields, and a C{dict} like C{state} for a nested message).  If
+	C{endNumber} is not C{None}, the message is a group, which ends at the
+	end-group tag for field C{endNumber}.  The message is at nesting
+	C{depth}, which must not be more than C{maxDepth}.
+
+	Returns the position after the message.
+	"""
+	if depth > maxDepth:
+		raise PbDecodeError("Messages are nested more than %d deep" % (maxDepth,))
+	fieldsByTag = wirePlan.fieldsByTag
+	while pos < end:
+		key = ord(buffer[pos])
+		if key < 0x80:
+			pos += 1
+		else:
+			key, pos = _decodeVarint(buffer, pos, end)
+		number = key >> 3
+		wireType = key & 7
+		if wireType == WIRETYPE_END_GROUP:
+			if number != endNumber:
+				raise PbDecodeError("Unexpected end-group tag for field %d" % (number,))
+			return pos
+		wireField = fieldsByTag.get(number)
+		if wireField is None:
+			pos = _skipField(buffer, pos, end, number, wireType, depth, maxDepth)
+			continue
+		fieldPlan = wireField.fieldPlan
+		repeated = fieldPlan[3]
+		if wireType != wireField.wireType:
+			if (repeated and wireType == WIRETYPE_LENGTH_DELIMITED
+			and wireField.decode is not None
+			and wireField.wireType != WIRETYPE_LENGTH_DELIMITED):
+				pos = _decodePacked(wireField, buffer, pos, end, state)
+			else:
+				# Like protobuf, treat it as an unknown field.
+				pos = _skipField(buffer, pos, end, number, wireType, depth, maxDepth)
+			continue
+		kind = fieldPlan[2]
+		if kind == KIND_MESSAGE:
+			childPlan = wireField.childPlan
+			if childPlan is None:
+				childPlan = wireField.childPlan = _getWirePlan(fieldPlan[5])
+			if repeated:
+				childState = {}
+				state.setdefault(number, []).append(childState)
+			else:
+				# Occurrences of a singular message are merged.
+				childState = state.setdefault(number, {})
+			if wireType == WIRETYPE_START_GROUP:
+				pos = _decodeMessage(childPlan, buffer, pos, end, childState,
+					number, depth + 1, maxDepth)
+			else:
+				if pos < end and buffer[pos] < '\x80':
+					size = ord(buffer[pos])
+					pos += 1
+				else:
+					size, pos = _decodeVarint(buffer, pos, end)
+				childEnd = pos + size
+				if childEnd > end:
+					raise PbDecodeError("Truncated message in field %d" % (number,))
+				_decodeMessage(childPlan, buffer, pos, childEnd, childState,
+					None, depth + 1, maxDepth)
+				pos = childEnd
+			continue
+		value, pos = wireField.decode(buffer, pos, end)
+		if kind == KIND_ENUM and value not in fieldPlan[4]:
+			# Like protobuf, drop unknown enum values.
+			continue
+		if repeated:
+			state.setdefault(number, []).append(value)
+		else:
+			state[number] = value
+	if pos > end:
+		raise PbDecodeError("Truncated field at %d" % (end,))
+	if endNumber is not None:
+		raise PbDecodeError("Missing end-group tag for field %d" % (endNumber,))
+	return pos
+
+
+def _decodePacked(wireField, buffer, pos, end, state):
+	size, pos = _decodeVarint(buffer, pos, end)
+	packedEnd = pos + size
+	if packedEnd > end:
+		raise PbDecodeError("Truncated packed field at %d" % (pos,))
+	fieldPlan = wireField.fieldPlan
+	decode = wireField.decode
+	enumValues = fieldPlan[2] == KIND_ENUM and fieldPlan[4]
+	values = []
+	append = values.append
+	while pos < packedEnd:
+		value, pos = decode(buffer, pos, packedEnd)
+		if enumValues and value not in enumValues:
+			continue
+		append(value)
+	if values:
+		state.setdefault(fieldPlan[0], []).extend(values)
+	return pos
+
+
+def _toPbLite(wirePlan, state, serializer, depth):
+	"""
+	Returns the PbLite list for the message decoded into C{state}, at
+	nesting C{depth}.  An unset nested message has an empty C{state}, and
+	is serialized (without C{omitUnset}) as all defaults.
+	"""
+	if depth > serializer.maxDepth:
+		raise PbDecodeError("Message %s is nested more than %d deep" % (
+			wirePlan.plan.descriptor.full_name, serializer.maxDepth))
+	if serializer.omitUnset:
+		if not state:
+			length = 0
+		else:
+			length = max(state) + 1
+	else:
+		length = wirePlan.plan.length
+	serialized = [serializer.fillerValue] * length
+	repeatedArrays = serializer.repeatedArrays
+	base64Bytes = serializer.base64Bytes
+	for wireField in wirePlan.fields:
+		tag, name, kind, repeated, enumValues, childPlan, field = wireField.fieldPlan
+		if tag not in state:
+			if serializer.omitUnset:
+				continue
+			if repeated:
+				value = []
+			elif kind == KIND_MESSAGE:
+				value = _toPbLite(_getWirePlan(childPlan), {}, serializer, depth + 1)
+			else:
+				value = wireField.default
+		else:
+			value = state[tag]
+			if kind == KIND_MESSAGE:
+				childPlan = _getWirePlan(childPlan)
+				if repeated:
+					value = [_toPbLite(childPlan, childState, serializer, depth + 1)
+						for childState in value]
+				else:
+					value = _toPbLite(childPlan, value, serializer, depth + 1)
+		if base64Bytes and field.type == TYPE_BYTES:
+			if repeated:
+				value = map(_encodeBase64, value)
+			else:
+				value = _encodeBase64(value)
+		if repeated and kind != KIND_MESSAGE and repeatedArrays is not None:
+			value = serializer._packRepeated(field, value)
+		serialized[tag] = value
+	return serialized
+
+
+def wireToPbLite(descriptor, data, serializer=None):
+	"""
+	Returns the PbLite list that C{serializer} (a default
+	L{PbLiteSerializer} if C{None}) would make for the message of the type
+	described by C{descriptor} that binary protobuf C{str} C{data} encodes.
+	"""
+	if serializer is None:
+		serializer = PbLiteSerializer()
+	wirePlan = _getWirePlan(_getPlan(descriptor))
+	state = {}
+	_decodeMessage(
+		wirePlan, data, 0, len(data), state, None, 1, serializer.maxDepth)
+	return _toPbLite(wirePlan, state, serializer, 1)
+
+
+def _encodeMessage(wirePlan, data, serializer, out, depth):
+	"""
+	Appends the binary encoding of the fields in PbLite list C{data}, a
+	message at nesting C{depth}, to C{list} C{out}, checking it like
+	L{PbLiteSerializer} C{serializer} would.
+	"""
+	maxDepth = serializer.maxDepth
+	if depth > maxDepth:
+		raise PbDecodeError("Messages are nested more than %d deep" % (maxDepth,))
+	omitUnset = serializer.omitUnset
+	base64Bytes = serializer.base64Bytes
+	descriptor = wirePlan.plan.descriptor
+	if not isinstance(data, (list, tuple)):
+		raise PbDecodeError("Expected a list for message %s but found "
+			"a %r" % (descriptor.full_name, type(data)))
+	length = len(data)
+	append = out.append
+	for wireField in wirePlan.fields:
+		fieldPlan = wireField.fieldPlan
+		tag = fieldPlan[0]
+		if tag < length:
+			value = data[tag]
+		elif omitUnset:
+			value = None
+		else:
+			raise PbDecodeError("For message %s expected index %r but it "
+				"was missing." % (descriptor.full_name, tag))
+		if value is None and omitUnset:
+			if fieldPlan[6].label == LABEL_REQUIRED:
+				raise PbDecodeError("For message %s required field at "
+					"index %r was missing." % (descriptor.full_name, tag))
+			continue
+		if fieldPlan[2] == KIND_MESSAGE:
+			childPlan = _getWirePlan(fieldPlan[5])
+			if fieldPlan[3]:
+				values = _getList(value)
+			else:
+				values = (value,)
+			for value in values:
+				if wireField.endTagBytes is not None:
+					append(wireField.tagBytes)
+					_encodeMessage(childPlan, value, serializer, out, depth + 1)
+					append(wireField.endTagBytes)
+				else:
+					childOut = []
+					_encodeMessage(
+							childPlan, value, serializer, childOut, depth + 1)
+					body = ''.join(childOut)
+					append(wireField.tagBytes)
+					append(_encodeVarint(len(body)))
+					append(body)
+			continue
+		if base64Bytes:
+			check = wireField.base64Check
+		else:
+			check = wireField.check
+		encode = wireField.encode
+		if not fieldPlan[3]:
+			append(wireField.tagBytes)
+			append(encode(check(value)))
+		elif wireField.packed:
+			values = _getList(value)
+			if values:
+				body = ''.join([encode(check(value)) for value in values])
+				append(wireField.tagBytes)
+				append(_encodeVarint(len(body)))
+				append(body)
+		else:
+			tagBytes = wireField.tagBytes
+			for value in _getList(value):
+				append(tagBytes)
+				append(encode(check(value)))
+
+
+def pbLiteToWire(descriptor, data, serializer=None):
+	"""
+	Returns the binary protobuf C{str} for PbLite list C{data}, a message
+	of the type described by C{descriptor}, as it would be after
+	C{serializer.deserialize} (with C{serializer} a default
+	L{PbLiteSerializer} if C{None}).
+	"""
+	if serializer is None:
+		serializer = PbLiteSerializer()
+	out = []
+	_encodeMessage(_getWirePlan(_getPlan(descriptor)), data, serializer, out, 1)
+	return ''.join(out)
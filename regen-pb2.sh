@@ -1,6 +1,8 @@
 #!/bin/sh -e
 
 # This script uses `protoc` from the open-source protobuf to
-# regenerate the protojson/alltypes_pb2.py file.
+# regenerate the protojson/alltypes_pb2.py and protojson/benchmark_pb2.py
+# files.
 
 protoc -I=protojson --python_out=protojson protojson/alltypes.proto
+protoc -I=protojson --python_out=protojson protojson/benchmark.proto